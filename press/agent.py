@@ -15,7 +15,7 @@ import requests
 from frappe.utils.password import get_decrypted_password
 from requests.exceptions import HTTPError
 
-from press.utils import get_mariadb_root_password, log_error, sanitize_config
+from press.utils import get_mariadb_root_password, http_pool, log_error, sanitize_config
 
 if TYPE_CHECKING:
 	from io import BufferedReader
@@ -28,6 +28,26 @@ if TYPE_CHECKING:
 	from press.press.doctype.site.site import Site
 	from press.press.doctype.site_backup.site_backup import SiteBackup
 
+# Connections kept alive per agent, per worker process
+AGENT_POOL_MAXSIZE = 2
+# Seconds for which agent password and CA bundle are cached in-process
+AGENT_CREDENTIALS_TTL = 60
+
+
+def get_agent_verify() -> str | bool:
+	"""CA bundle used to verify agent certificates (cached in-process)"""
+	return http_pool.get_cached_value(
+		("agent_verify", frappe.local.site), _get_agent_verify, ttl=AGENT_CREDENTIALS_TTL
+	)
+
+
+def _get_agent_verify() -> str | bool:
+	intermediate_ca = frappe.db.get_value("Press Settings", "Press Settings", "backbone_intermediate_ca")
+	if frappe.conf.developer_mode and intermediate_ca:
+		root_ca = frappe.db.get_value("Certificate Authority", intermediate_ca, "parent_authority")
+		return frappe.get_doc("Certificate Authority", root_ca).certificate_file
+	return True
+
 
 class Agent:
 	if TYPE_CHECKING:
@@ -855,15 +875,9 @@ class Agent:
 		return self.request("POST", path, data, raises=raises)
 
 	def _make_req(self, method, path, data, files, agent_job_id):
-		password = get_decrypted_password(self.server_type, self.server, "agent_password")
-		headers = {"Authorization": f"bearer {password}", "X-Agent-Job-Id": agent_job_id}
+		headers = {"Authorization": f"bearer {self.password}", "X-Agent-Job-Id": agent_job_id}
 		url = f"https://{self.server}:{self.port}/agent/{path}"
-		intermediate_ca = frappe.db.get_value("Press Settings", "Press Settings", "backbone_intermediate_ca")
-		if frappe.conf.developer_mode and intermediate_ca:
-			root_ca = frappe.db.get_value("Certificate Authority", intermediate_ca, "parent_authority")
-			verify = frappe.get_doc("Certificate Authority", root_ca).certificate_file
-		else:
-			verify = True
+		verify = get_agent_verify()
 		if files:
 			file_objects = {
 				key: value
@@ -872,8 +886,40 @@ class Agent:
 				for key, value in files.items()
 			}
 			file_objects["json"] = json.dumps(data).encode()
-			return requests.request(method, url, headers=headers, files=file_objects, verify=verify)
-		return requests.request(method, url, headers=headers, json=data, verify=verify, timeout=(10, 30))
+			return http_pool.request(
+				self.session,
+				method,
+				url,
+				stats_key="agent",
+				headers=headers,
+				files=file_objects,
+				verify=verify,
+			)
+		return http_pool.request(
+			self.session,
+			method,
+			url,
+			stats_key="agent",
+			headers=headers,
+			json=data,
+			verify=verify,
+			timeout=(10, 30),
+		)
+
+	@property
+	def session(self) -> requests.Session:
+		return http_pool.get_session(
+			("agent", frappe.local.site, self.server_type, self.server, self.port),
+			pool_maxsize=AGENT_POOL_MAXSIZE,
+		)
+
+	@property
+	def password(self) -> str:
+		return http_pool.get_cached_value(
+			("agent_password", frappe.local.site, self.server_type, self.server),
+			lambda: get_decrypted_password(self.server_type, self.server, "agent_password"),
+			ttl=AGENT_CREDENTIALS_TTL,
+		)
 
 	def request(self, method, path, data=None, files=None, agent_job=None, raises=True):
 		self.raise_if_past_requests_have_failed()
@@ -941,10 +987,11 @@ class Agent:
 
 	def raw_request(self, method, path, data=None, raises=True, timeout=None):
 		url = f"https://{self.server}:{self.port}/agent/{path}"
-		password = get_decrypted_password(self.server_type, self.server, "agent_password")
-		headers = {"Authorization": f"bearer {password}"}
+		headers = {"Authorization": f"bearer {self.password}"}
 		timeout = timeout or (10, 30)
-		response = requests.request(method, url, headers=headers, json=data, timeout=timeout)
+		response = http_pool.request(
+			self.session, method, url, stats_key="agent", headers=headers, json=data, timeout=timeout
+		)
 		json_response = response.json()
 		if raises:
 			response.raise_for_status()
@@ -1131,6 +1178,17 @@ Response: {reason or getattr(result, "text", "Unknown")}
 			return [status]
 		return status
 
+	def get_jobs_changed_since(self, cursor: int | None = None, limit: int = 500):
+		"""
+		Return jobs whose status changed after `cursor`
+
+		Response is of the form {"cursor": int, "jobs": [...], "has_more": bool}
+		Without a cursor only the current cursor of the agent is returned
+		"""
+		if cursor is None:
+			return self.get("jobs/changes")
+		return self.get(f"jobs/changes?since={cursor}&limit={limit}")
+
 	def get_jobs_id(self, agent_job_ids):
 		return self.get(f"agent-jobs/{agent_job_ids}")
 
@@ -12,7 +12,7 @@ import frappe
 import requests
 import sqlparse
 from elasticsearch import Elasticsearch
-from elasticsearch_dsl import A, Search
+from elasticsearch_dsl import A, MultiSearch, Search
 from frappe.utils import (
 	convert_utc_to_timezone,
 	flt,
@@ -25,13 +25,15 @@ from pytz import timezone as pytz_timezone
 from press.agent import Agent
 from press.api.site import protected
 from press.press.doctype.site_plan.site_plan import get_plan_config
+from press.press.doctype.site_usage_rollup.site_usage_rollup import get_usage_from_rollup
 from press.press.report.binary_log_browser.binary_log_browser import (
 	get_data as get_binary_log_data,
 )
 from press.press.report.mariadb_slow_queries.mariadb_slow_queries import execute, normalize_query
+from press.utils import http_pool
 
 if TYPE_CHECKING:
-	from elasticsearch_dsl.response import AggResponse
+	from elasticsearch_dsl.response import AggResponse, Response
 	from elasticsearch_dsl.response.aggs import FieldBucket, FieldBucketData
 
 	class Dataset(TypedDict):
@@ -67,6 +69,8 @@ class AggType(Enum):
 	AVERAGE_DURATION = "average_duration"
 
 
+_elasticsearch_clients: dict[tuple[str, str], Elasticsearch] = {}
+
 TIMESPAN_TIMEGRAIN_MAP: Final[dict[str, tuple[int, int]]] = {
 	"1h": (60 * 60, 60),
 	"6h": (6 * 60 * 60, 5 * 60),
@@ -81,6 +85,7 @@ class StackedGroupByChart:
 	to_s_divisor: float = 1e6
 	normalize_slow_logs: bool = False
 	group_by_field: str
+	duration_field: str
 	MAX_NO_OF_PATHS: int = 10
 
 	def __init__(
@@ -96,9 +101,6 @@ class StackedGroupByChart:
 		if not self.log_server:
 			return
 
-		self.url = f"https://{self.log_server}/elasticsearch"
-		self.password = str(get_decrypted_password("Log Server", self.log_server, "kibana_password"))
-
 		self.name = name
 		self.agg_type = agg_type
 		self.resource_type = resource_type
@@ -110,7 +112,7 @@ class StackedGroupByChart:
 		self.setup_search_aggs()
 
 	def setup_search_filters(self):
-		es = Elasticsearch(self.url, basic_auth=("frappe", self.password))
+		es = get_elasticsearch_client(self.log_server)
 		self.start, self.end = get_rounded_boundaries(self.timespan, self.timegrain, self.timezone)
 		self.search = (
 			Search(using=es, index="filebeat-*")
@@ -129,6 +131,16 @@ class StackedGroupByChart:
 	def setup_search_aggs(self):
 		if not self.group_by_field:
 			frappe.throw("Group by field not set")
+
+		# Histogram of all documents, used to compute the Other bucket in the same request
+		self.search.aggs.bucket("total_histogram", self.histogram_of_method())
+		if AggType(self.agg_type) is AggType.DURATION:
+			self.search.aggs["total_histogram"].metric("sum_of_duration", self.sum_of_duration())
+		elif AggType(self.agg_type) is AggType.AVERAGE_DURATION:
+			self.search.aggs["total_histogram"].metric("sum_of_duration", self.sum_of_duration()).metric(
+				"count_of_duration", self.count_of_duration()
+			)
+
 		if AggType(self.agg_type) is AggType.COUNT:
 			self.search.aggs.bucket(
 				"method_path",
@@ -158,8 +170,10 @@ class StackedGroupByChart:
 				field=self.group_by_field,
 				size=self.MAX_NO_OF_PATHS,
 				order={"outside_avg": "desc"},
-			).bucket("histogram_of_method", self.histogram_of_method()).bucket(
+			).bucket("histogram_of_method", self.histogram_of_method()).metric(
 				"avg_of_duration", self.avg_of_duration()
+			).metric("sum_of_duration", self.sum_of_duration()).metric(
+				"count_of_duration", self.count_of_duration()
 			)
 			self.search.aggs["method_path"].bucket("outside_avg", self.avg_of_duration())
 
@@ -176,33 +190,49 @@ class StackedGroupByChart:
 		return A("value_count", field=self.group_by_field)
 
 	def sum_of_duration(self):
-		raise NotImplementedError
+		return A("sum", field=self.duration_field)
 
 	def avg_of_duration(self):
-		raise NotImplementedError
-
-	def exclude_top_k_data(self, datasets: list[Dataset]):
-		raise NotImplementedError
-
-	def get_other_bucket(self, datasets: list[Dataset], labels):
-		# filters present in search already, clear out aggs and response
-		self.search.aggs._params = {}
-		del self.search._response
+		return A("avg", field=self.duration_field)
 
-		self.exclude_top_k_data(datasets)
-		self.search.aggs.bucket("histogram_of_method", self.histogram_of_method())
-
-		if AggType(self.agg_type) is AggType.COUNT:
-			self.search.aggs["histogram_of_method"].bucket("path_count", self.count_of_values())
-		elif AggType(self.agg_type) is AggType.DURATION:
-			self.search.aggs["histogram_of_method"].bucket("sum_of_duration", self.sum_of_duration())
-		elif AggType(self.agg_type) is AggType.AVERAGE_DURATION:
-			self.search.aggs["histogram_of_method"].bucket("avg_of_duration", self.avg_of_duration())
+	def count_of_duration(self):
+		return A("value_count", field=self.duration_field)
 
-		aggs = self.search.execute().aggregations
+	def get_other_bucket(self, aggs: AggResponse, labels) -> Dataset:
+		"""Histogram of everything outside the top k paths: totals minus the top k paths"""
+		doc_counts, sums, counts = self.get_histogram_totals(aggs.total_histogram.buckets, labels)
+		path_bucket: PathBucket
+		for path_bucket in aggs.method_path.buckets:
+			path_totals = self.get_histogram_totals(path_bucket.histogram_of_method.buckets, labels)
+			for totals, path_values in zip((doc_counts, sums, counts), path_totals):
+				for index, value in enumerate(path_values):
+					totals[index] = max(totals[index] - value, 0)
+
+		agg_type = AggType(self.agg_type)
+		if agg_type is AggType.COUNT:
+			values = doc_counts
+		elif agg_type is AggType.DURATION:
+			values = [value / self.to_s_divisor for value in sums]
+		else:
+			values = [
+				(total / count / self.to_s_divisor) if count else 0 for total, count in zip(sums, counts)
+			]
+		return {"path": "Other", "values": values, "stack": "path"}
 
-		aggs.key = "Other"  # Set custom key Other bucket
-		return self.get_histogram_chart(aggs, labels)
+	def get_histogram_totals(self, buckets: list[HistBucket], labels: list[datetime]):
+		"""Document count, sum and count of duration for each label"""
+		doc_counts, sums, counts = [0] * len(labels), [0.0] * len(labels), [0] * len(labels)
+		for hist_bucket in buckets:
+			label = get_datetime(hist_bucket.key_as_string)
+			if label not in labels:
+				continue
+			index = labels.index(label)
+			doc_counts[index] = hist_bucket.doc_count
+			if sum_of_duration := getattr(hist_bucket, "sum_of_duration", None):
+				sums[index] = flt(sum_of_duration.value)
+			if count_of_duration := getattr(hist_bucket, "count_of_duration", None):
+				counts[index] = count_of_duration.value
+		return doc_counts, sums, counts
 
 	def get_histogram_chart(
 		self,
@@ -232,8 +262,8 @@ class StackedGroupByChart:
 			)
 		return path_data
 
-	def get_stacked_histogram_chart(self):
-		aggs: AggResponse = self.search.execute().aggregations
+	def get_stacked_histogram_chart(self, response: Response | None = None):
+		aggs: AggResponse = (response or self.search.execute()).aggregations
 
 		timegrain_delta = timedelta(seconds=self.timegrain)
 		labels = [
@@ -247,7 +277,7 @@ class StackedGroupByChart:
 			datasets.append(self.get_histogram_chart(path_bucket, labels))
 
 		if len(datasets) >= self.MAX_NO_OF_PATHS:
-			datasets.append(self.get_other_bucket(datasets, labels))
+			datasets.append(self.get_other_bucket(aggs, labels))
 
 		if self.normalize_slow_logs:
 			datasets = normalize_datasets(datasets)
@@ -255,31 +285,23 @@ class StackedGroupByChart:
 		labels = [label.replace(tzinfo=None) for label in labels]
 		return {"datasets": datasets, "labels": labels}
 
-	def run(self):
-		log_server = frappe.db.get_single_value("Press Settings", "log_server")
-		if not log_server:
+	@property
+	def is_runnable(self) -> bool:
+		return bool(self.log_server)
+
+	def run(self, response: Response | None = None):
+		"""Build the chart, from `response` if the search was already executed elsewhere"""
+		if not self.is_runnable:
 			return {"datasets": [], "labels": []}
-		return self.get_stacked_histogram_chart()
+		return self.get_stacked_histogram_chart(response)
 
 
 class RequestGroupByChart(StackedGroupByChart):
+	duration_field = "json.duration"
+
 	def __init__(self, name, agg_type, resource_type, timezone, timespan, timegrain):
 		super().__init__(name, agg_type, resource_type, timezone, timespan, timegrain)
 
-	def sum_of_duration(self):
-		return A("sum", field="json.duration")
-
-	def avg_of_duration(self):
-		return A("avg", field="json.duration")
-
-	def exclude_top_k_data(self, datasets):
-		if ResourceType(self.resource_type) is ResourceType.SITE:
-			for path in list(map(lambda x: x["path"], datasets)):
-				self.search = self.search.exclude("match_phrase", json__request__path=path)
-		elif ResourceType(self.resource_type) is ResourceType.SERVER:
-			for path in list(map(lambda x: x["path"], datasets)):
-				self.search = self.search.exclude("match_phrase", json__site=path)
-
 	def setup_search_filters(self):
 		super().setup_search_filters()
 		self.search = self.search.filter("match_phrase", json__transaction_type="request").exclude(
@@ -294,23 +316,11 @@ class RequestGroupByChart(StackedGroupByChart):
 
 
 class BackgroundJobGroupByChart(StackedGroupByChart):
+	duration_field = "json.duration"
+
 	def __init__(self, name, agg_type, resource_type, timezone, timespan, timegrain):
 		super().__init__(name, agg_type, resource_type, timezone, timespan, timegrain)
 
-	def sum_of_duration(self):
-		return A("sum", field="json.duration")
-
-	def avg_of_duration(self):
-		return A("avg", field="json.duration")
-
-	def exclude_top_k_data(self, datasets):
-		if ResourceType(self.resource_type) is ResourceType.SITE:
-			for path in list(map(lambda x: x["path"], datasets)):
-				self.search = self.search.exclude("match_phrase", json__job__method=path)
-		elif ResourceType(self.resource_type) is ResourceType.SERVER:
-			for path in list(map(lambda x: x["path"], datasets)):
-				self.search = self.search.exclude("match_phrase", json__site=path)
-
 	def setup_search_filters(self):
 		super().setup_search_filters()
 		self.search = self.search.filter("match_phrase", json__transaction_type="job")
@@ -324,6 +334,7 @@ class BackgroundJobGroupByChart(StackedGroupByChart):
 
 class SlowLogGroupByChart(StackedGroupByChart):
 	to_s_divisor = 1e9
+	duration_field = "event.duration"
 	database_name = None
 
 	def __init__(
@@ -339,20 +350,6 @@ class SlowLogGroupByChart(StackedGroupByChart):
 		super().__init__(name, agg_type, resource_type, timezone, timespan, timegrain)
 		self.normalize_slow_logs = normalize_slow_logs
 
-	def sum_of_duration(self):
-		return A("sum", field="event.duration")
-
-	def avg_of_duration(self):
-		return A("avg", field="event.duration")
-
-	def exclude_top_k_data(self, datasets):
-		if ResourceType(self.resource_type) is ResourceType.SITE:
-			for path in list(map(lambda x: x["path"], datasets)):
-				self.search = self.search.exclude("match_phrase", mysql__slowlog__query=path)
-		elif ResourceType(self.resource_type) is ResourceType.SERVER:
-			for path in list(map(lambda x: x["path"], datasets)):
-				self.search = self.search.exclude("match_phrase", mysql__slowlog__current_user=path)
-
 	def setup_search_filters(self):
 		super().setup_search_filters()
 		self.search = self.search.exclude(
@@ -368,10 +365,16 @@ class SlowLogGroupByChart(StackedGroupByChart):
 			self.search = self.search.filter("match", agent__name=self.name)
 			self.group_by_field = "mysql.slowlog.current_user"
 
-	def run(self):
+	@property
+	def is_runnable(self) -> bool:
 		if not self.database_name and ResourceType(self.resource_type) is ResourceType.SITE:
+			return False
+		return super().is_runnable
+
+	def run(self, response: Response | None = None):
+		if not self.is_runnable:
 			return {"datasets": [], "labels": []}
-		res = super().run()
+		res = super().run(response)
 		if ResourceType(self.resource_type) is not ResourceType.SERVER:
 			return res
 		for path_data in res["datasets"]:
@@ -412,30 +415,41 @@ def get(name, timezone, duration="7d"):
 @redis_cache(ttl=10 * 60)
 def get_advanced_analytics(name, timezone, duration="7d"):
 	timespan, timegrain = TIMESPAN_TIMEGRAIN_MAP[duration]
-
-	job_data = get_usage(name, "job", timezone, timespan, timegrain)
-
-	return {
-		"request_count_by_path": get_request_by_(name, "count", timezone, timespan, timegrain),
-		"request_duration_by_path": get_request_by_(name, "duration", timezone, timespan, timegrain),
-		"average_request_duration_by_path": get_request_by_(
-			name, "average_duration", timezone, timespan, timegrain
-		),
-		"background_job_count_by_method": get_background_job_by_method(
-			name, "count", timezone, timespan, timegrain
-		),
-		"background_job_duration_by_method": get_background_job_by_method(
-			name, "duration", timezone, timespan, timegrain
-		),
-		"average_background_job_duration_by_method": get_background_job_by_method(
-			name, "average_duration", timezone, timespan, timegrain
+	site, args = ResourceType.SITE, (timezone, timespan, timegrain)
+
+	charts: dict[str, StackedGroupByChart] = {
+		"request_count_by_path": RequestGroupByChart(name, "count", site, *args),
+		"request_duration_by_path": RequestGroupByChart(name, "duration", site, *args),
+		"average_request_duration_by_path": RequestGroupByChart(name, "average_duration", site, *args),
+		"background_job_count_by_method": BackgroundJobGroupByChart(name, "count", site, *args),
+		"background_job_duration_by_method": BackgroundJobGroupByChart(name, "duration", site, *args),
+		"average_background_job_duration_by_method": BackgroundJobGroupByChart(
+			name, "average_duration", site, *args
 		),
-		"slow_logs_by_count": get_slow_logs(name, "count", timezone, timespan, timegrain),
-		"slow_logs_by_duration": get_slow_logs(name, "duration", timezone, timespan, timegrain),
-		"job_count": [{"value": r.count, "date": r.date} for r in job_data],
-		"job_cpu_time": [{"value": r.duration, "date": r.date} for r in job_data],
+		"slow_logs_by_count": SlowLogGroupByChart(name, "count", site, *args),
+		"slow_logs_by_duration": SlowLogGroupByChart(name, "duration", site, *args),
 	}
 
+	# Run all charts and job usage in a single _msearch request
+	searches = {key: chart.search for key, chart in charts.items() if chart.is_runnable}
+	job_data = None
+	if frappe.db.get_single_value("Press Settings", "log_server"):
+		job_data = get_usage_from_rollup(name, "job", timezone, timespan, timegrain)
+		if job_data is None:
+			searches["job_usage"] = get_usage_search(name, "job", timespan, timegrain)
+	responses = execute_searches(searches)
+
+	analytics = {key: chart.run(responses.get(key)) for key, chart in charts.items()}
+	if "job_usage" in responses:
+		job_data = parse_usage(responses["job_usage"].to_dict(), timezone)
+	if job_data is not None:
+		analytics["job_count"] = [{"value": r.count, "date": r.date} for r in job_data]
+		analytics["job_cpu_time"] = [{"value": r.duration, "date": r.date} for r in job_data]
+	else:
+		analytics["job_count"] = analytics["job_cpu_time"] = []
+
+	return analytics
+
 
 def get_more_request_detail_fn_names():
 	return {
@@ -622,9 +636,22 @@ def get_usage(site, type, timezone, timespan, timegrain):
 	if not log_server:
 		return {"datasets": [], "labels": []}
 
-	url = f"https://{log_server}/elasticsearch/filebeat-*/_search"
-	password = get_decrypted_password("Log Server", log_server, "kibana_password")
+	usage = get_usage_from_rollup(site, type, timezone, timespan, timegrain)
+	if usage is not None:
+		return usage
+
+	search = get_usage_search(site, type, timespan, timegrain)
+	response = search.using(get_elasticsearch_client(log_server)).execute()
+	return parse_usage(response.to_dict(), timezone)
 
+
+def get_usage_search(site, type, timespan, timegrain, since: int | None = None) -> Search:
+	"""Pass `since` (epoch millis) to search from an absolute time instead of the last `timespan` seconds"""
+	timestamp_range = (
+		{"gte": since, "lte": "now", "format": "epoch_millis"}
+		if since
+		else {"gte": f"now-{timespan}s", "lte": "now"}
+	)
 	query = {
 		"aggs": {
 			"date_histogram": {
@@ -645,14 +672,15 @@ def get_usage(site, type, timezone, timespan, timegrain):
 				"filter": [
 					{"match_phrase": {"json.transaction_type": type}},
 					{"match_phrase": {"json.site": site}},
-					{"range": {"@timestamp": {"gte": f"now-{timespan}s", "lte": "now"}}},
+					{"range": {"@timestamp": timestamp_range}},
 				]
 			}
 		},
 	}
+	return Search.from_dict(query).index("filebeat-*")
 
-	response = requests.post(url, json=query, auth=("frappe", password)).json()
 
+def parse_usage(response: dict, timezone):
 	buckets = []
 
 	if not response.get("aggregations"):
@@ -675,6 +703,32 @@ def get_usage(site, type, timezone, timespan, timegrain):
 	return buckets
 
 
+def get_elasticsearch_client(log_server: str | None = None) -> Elasticsearch:
+	"""Client for the log server, shared within the process so connections are pooled and reused"""
+	log_server = log_server or frappe.db.get_single_value("Press Settings", "log_server")
+	password = http_pool.get_cached_value(
+		("log_server_password", frappe.local.site, log_server),
+		lambda: str(get_decrypted_password("Log Server", log_server, "kibana_password")),
+	)
+	key = (log_server, password)
+	if key not in _elasticsearch_clients:
+		_elasticsearch_clients[key] = Elasticsearch(
+			f"https://{log_server}/elasticsearch", basic_auth=("frappe", password)
+		)
+	return _elasticsearch_clients[key]
+
+
+def execute_searches(searches: dict[str, Search]) -> dict[str, Response]:
+	"""Execute searches in a single _msearch request, returns responses keyed the same as searches"""
+	if not searches:
+		return {}
+
+	multi_search = MultiSearch(using=get_elasticsearch_client(), index="filebeat-*")
+	for search in searches.values():
+		multi_search = multi_search.add(search)
+	return dict(zip(searches, multi_search.execute()))
+
+
 def get_current_cpu_usage(site):
 	try:
 		log_server = frappe.db.get_single_value("Press Settings", "log_server")
@@ -706,72 +760,55 @@ def get_current_cpu_usage(site):
 		return 0
 
 
-def get_current_cpu_usage_for_sites_on_server(server):
+def get_current_cpu_usage_for_sites_on_server(server, page_size=500):
+	"""Latest request counter of every site on the server, paged with a composite aggregation"""
 	result = {}
 	with suppress(Exception):
-		log_server = frappe.db.get_single_value("Press Settings", "log_server")
-		if not log_server:
+		if not frappe.db.get_single_value("Press Settings", "log_server"):
 			return result
 
-		url = f"https://{log_server}/elasticsearch/filebeat-*/_search"
-		password = get_decrypted_password("Log Server", log_server, "kibana_password")
-
 		query = {
-			"aggs": {
-				"0": {
-					"terms": {"field": "json.site", "size": 1000},
-					"aggs": {
-						"usage": {
-							"filter": {"exists": {"field": "json.request.counter"}},
-							"aggs": {
-								"counter": {
-									"top_metrics": {
-										"metrics": {"field": "json.request.counter"},
-										"size": 1,
-										"sort": {"@timestamp": "desc"},
-									}
-								}
-							},
+			"bool": {
+				"filter": [
+					{"term": {"json.transaction_type": {"value": "request"}}},
+					{"term": {"agent.name": {"value": server}}},
+					{"range": {"@timestamp": {"gte": "now-1d"}}},
+				]
+			}
+		}
+		composite = {"size": page_size, "sources": [{"site": {"terms": {"field": "json.site"}}}]}
+		usage = {
+			"usage": {
+				"filter": {"exists": {"field": "json.request.counter"}},
+				"aggs": {
+					"counter": {
+						"top_metrics": {
+							"metrics": {"field": "json.request.counter"},
+							"size": 1,
+							"sort": {"@timestamp": "desc"},
 						}
-					},
-				}
-			},
-			"size": 0,
-			"query": {
-				"bool": {
-					"filter": [
-						{
-							"bool": {
-								"filter": [
-									{
-										"bool": {
-											"should": [
-												{"term": {"json.transaction_type": {"value": "request"}}}
-											],
-											"minimum_should_match": 1,
-										}
-									},
-									{
-										"bool": {
-											"should": [{"term": {"agent.name": {"value": server}}}],
-											"minimum_should_match": 1,
-										}
-									},
-								]
-							}
-						},
-						{"range": {"@timestamp": {"gte": "now-1d"}}},
-					]
-				}
-			},
+					}
+				},
+			}
 		}
 
-		response = requests.post(url, json=query, auth=("frappe", password)).json()
-		for row in response["aggregations"]["0"]["buckets"]:
-			site = row["key"]
-			metric = row["usage"]["counter"]["top"]
-			if metric:
-				result[site] = metric[0]["metrics"]["json.request.counter"]
+		client = get_elasticsearch_client()
+		while True:
+			response = client.search(
+				index="filebeat-*",
+				size=0,
+				query=query,
+				aggs={"sites": {"composite": composite, "aggs": usage}},
+			)
+			sites = response["aggregations"]["sites"]
+			for row in sites["buckets"]:
+				metric = row["usage"]["counter"]["top"]
+				if metric:
+					result[row["key"]["site"]] = metric[0]["metrics"]["json.request.counter"]
+
+			if not sites["buckets"] or not sites.get("after_key"):
+				break
+			composite["after"] = sites["after_key"]
 	return result
 
 
@@ -55,6 +55,7 @@ def upcoming_invoice():
 	invoice = team.get_upcoming_invoice()
 
 	if invoice:
+		invoice.apply_pending_usage(save=False)
 		upcoming_invoice = invoice.as_dict()
 		upcoming_invoice.formatted = make_formatted_doc(invoice, ["Currency"])
 	else:
@@ -420,8 +421,10 @@ def finalize_invoices():
 
 @frappe.whitelist()
 def unpaid_invoices():
+	from press.press.doctype.invoice.invoice import add_pending_usage_to_totals
+
 	team = get_current_team()
-	return frappe.db.get_all(
+	invoices = frappe.db.get_all(
 		"Invoice",
 		{
 			"team": team,
@@ -431,6 +434,7 @@ def unpaid_invoices():
 		["name", "status", "period_end", "currency", "amount_due", "total"],
 		order_by="creation asc",
 	)
+	return add_pending_usage_to_totals(invoices)
 
 
 @frappe.whitelist()
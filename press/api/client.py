@@ -4,14 +4,18 @@
 from __future__ import annotations
 
 import inspect
+import json
 import typing
+from contextlib import contextmanager, suppress
 
 import frappe
 from frappe.client import set_value as _set_value
+from frappe.handler import is_valid_http_method
 from frappe.handler import run_doc_method as _run_doc_method
 from frappe.model import child_table_fields, default_fields
 from frappe.model.base_document import get_controller
-from frappe.utils import cstr
+from frappe.query_builder.functions import Count
+from frappe.utils import cint, cstr, get_datetime
 from pypika.queries import QueryBuilder
 
 from press.exceptions import TeamHeaderNotInRequestError
@@ -90,6 +94,9 @@ ALLOWED_DOCTYPES_FOR_SUPPORT = [
 
 whitelisted_methods = set()
 
+LIST_COUNT_CACHE_TTL = 60
+MAX_BATCH_REQUESTS = 50
+
 
 @frappe.whitelist()
 def get_list(
@@ -101,7 +108,17 @@ def get_list(
 	limit: int = 20,
 	parent: str | None = None,
 	debug: bool = False,
+	after: str | None = None,
+	with_count: bool = False,
 ):
+	"""
+	List records of `doctype` visible to the current team
+
+	Pass `after` (the `next_cursor` of the previous page, or "" for the first
+	page) to paginate with keyset predicates instead of offsets. The cursor of
+	the next page is set in `frappe.response.next_cursor`. `with_count` sets an
+	approximate total in `frappe.response.total_count`.
+	"""
 	if filters is None:
 		filters = {}
 
@@ -117,12 +134,14 @@ def get_list(
 	if meta.istable and not (filters.get("parenttype") and filters.get("parent")):
 		frappe.throw("parenttype and parent are required to get child records")
 
-	apply_team_filter = not (
-		filters.get("skip_team_filter_for_system_user_and_support_agent")
-		and (frappe.local.system_user() or has_role("Press Support Agent"))
-	)
-	if apply_team_filter and meta.has_field("team"):
-		valid_filters.team = frappe.local.team().name
+	apply_team_filter(meta, filters, valid_filters)
+	if with_count:
+		frappe.response["total_count"] = get_list_count(doctype, meta, filters, valid_filters)
+
+	order_key = None
+	if after is not None:
+		order_key = get_order_key(meta, order_by)
+		start, order_by = 0, None
 
 	query = get_list_query(
 		doctype,
@@ -134,6 +153,9 @@ def get_list(
 		limit,
 		order_by,
 	)
+	if order_key:
+		query = apply_keyset_pagination(query, doctype, order_key, after)
+
 	filters = frappe._dict(filters or {})
 	list_args = dict(
 		fields=fields,
@@ -144,7 +166,23 @@ def get_list(
 		parent=parent,
 		debug=debug,
 	)
-	query = apply_custom_filters(doctype, query, **list_args)
+	result = run_list_query(apply_custom_filters(doctype, query, **list_args), debug)
+	if order_key:
+		frappe.response["next_cursor"] = get_next_cursor(result, order_key, limit)
+	return result
+
+
+def apply_team_filter(meta: "Meta", filters: dict, valid_filters: frappe._dict):
+	if filters.get("skip_team_filter_for_system_user_and_support_agent") and (
+		frappe.local.system_user() or has_role("Press Support Agent")
+	):
+		return
+
+	if meta.has_field("team"):
+		valid_filters.team = frappe.local.team().name
+
+
+def run_list_query(query, debug=False) -> list:
 	if isinstance(query, QueryBuilder):
 		return query.run(as_dict=1, debug=debug)
 
@@ -154,6 +192,72 @@ def get_list(
 	return []
 
 
+def get_order_key(meta: "Meta", order_by: str | None) -> tuple[str, str]:
+	"""Field and direction of `order_by`, which has to be a single column for keyset pagination"""
+	order_by = order_by or f"{meta.sort_field or 'creation'} {meta.sort_order or 'desc'}"
+	parts = order_by.replace("`", "").split()
+	fieldname = parts[0].split(".")[-1] if parts else ""
+	direction = parts[1].lower() if len(parts) == 2 else "asc"
+	if (
+		"," in order_by
+		or len(parts) > 2
+		or direction not in ("asc", "desc")
+		or not (fieldname in default_fields or meta.has_field(fieldname))
+	):
+		frappe.throw("Cursor pagination needs order_by on a single field of the doctype")
+	return fieldname, direction
+
+
+def apply_keyset_pagination(query: QueryBuilder, doctype: str, order_key: tuple[str, str], after: str):
+	"""Seek past the `after` cursor, with name as the tie breaker for duplicate order values"""
+	fieldname, direction = order_key
+	DocType = frappe.qb.DocType(doctype)
+	field = DocType[fieldname]
+	order = frappe.qb.desc if direction == "desc" else frappe.qb.asc
+
+	query = query.select(DocType.name, field).orderby(field, order=order).orderby(DocType.name, order=order)
+	if not after:
+		return query
+
+	try:
+		value, name = json.loads(after)
+	except (TypeError, ValueError):
+		frappe.throw("Invalid cursor")
+
+	if direction == "desc":
+		return query.where((field < value) | ((field == value) & (DocType.name < name)))
+	return query.where((field > value) | ((field == value) & (DocType.name > name)))
+
+
+def get_next_cursor(result: list, order_key: tuple[str, str], limit: int) -> str | None:
+	if not result or len(result) < cint(limit):
+		return None
+
+	last = result[-1]
+	return json.dumps([last.get(order_key[0]), last.get("name")], default=str)
+
+
+def get_list_count(doctype: str, meta: "Meta", filters: dict, valid_filters: frappe._dict) -> int | None:
+	"""
+	Approximate number of records for `get_list`, cached for a minute per user and filters
+
+	Only the permitted filters, team and role permissions are applied, controller
+	hooks are not. So counts are only given for doctypes scoped by team.
+	"""
+	if not valid_filters.get("team"):
+		return None
+
+	key = "client_list_count:" + frappe.generate_hash(
+		json.dumps([doctype, frappe.session.user, filters, valid_filters], default=str, sort_keys=True)
+	)
+	count = frappe.cache.get_value(key)
+	if count is None:
+		query = get_list_query(doctype, meta, filters, valid_filters, ["name"], 0, None, None)
+		count = frappe.qb.from_(query).select(Count("*")).run()[0][0]
+		frappe.cache.set_value(key, count, expires_in_sec=LIST_COUNT_CACHE_TTL)
+	return count
+
+
 def get_list_query(
 	doctype: str,
 	meta: "Meta",
@@ -205,7 +309,7 @@ def get(doctype, name):
 
 	check_permissions(doctype)
 	try:
-		doc = frappe.get_doc(doctype, name)
+		doc = get_request_doc(doctype, name)
 	except frappe.DoesNotExistError:
 		controller = get_controller(doctype)
 		if hasattr(controller, "on_not_found"):
@@ -237,6 +341,63 @@ def get(doctype, name):
 	return _doc
 
 
+@frappe.whitelist(methods=["POST"])
+def batch(requests: list):
+	"""
+	Run the `list`, `get` and `count` requests of a dashboard page in one round trip
+
+	Each request has an `id`, a `type` and the arguments of that endpoint, e.g.
+	`{"id": "backups", "type": "list", "doctype": "Site Backup", "filters": {"site": "..."}}`.
+	Results are keyed by id. Failed requests have an `error` instead of `data`.
+	"""
+	if len(requests) > MAX_BATCH_REQUESTS:
+		frappe.throw(f"At most {MAX_BATCH_REQUESTS} requests can be batched together")
+
+	doctypes = {request.get("doctype") for request in requests}
+	for doctype in doctypes:
+		check_permissions(doctype)
+
+	results = {}
+	with request_context(), permitted_doctypes(doctypes):
+		for request in requests:
+			results[request.get("id")] = run_batch_request(frappe._dict(request))
+	return results
+
+
+def run_batch_request(request: frappe._dict) -> dict:
+	handler = {"list": get_list, "get": get, "count": get_count}.get(request.type)
+	if not handler:
+		return {"error": {"type": "ValidationError", "message": f"Invalid request type {request.type}"}}
+
+	args = {key: value for key, value in request.items() if key not in ("id", "type")}
+	if unknown := set(args) - set(inspect.signature(handler).parameters):
+		return {"error": {"type": "ValidationError", "message": f"Invalid arguments {', '.join(unknown)}"}}
+
+	message_log = getattr(frappe.local, "message_log", [])
+	logged = len(message_log)
+	try:
+		result = {"data": handler(**args)}
+	except (frappe.ValidationError, frappe.PermissionError) as e:
+		# The error is returned with the request, don't show it again as a message
+		del message_log[logged:]
+		return {"error": {"type": type(e).__name__, "message": cstr(e)}}
+
+	for key in ("next_cursor", "total_count"):
+		if key in frappe.response:
+			result[key] = frappe.response.pop(key)
+	return result
+
+
+def get_count(doctype: str, filters: dict | None = None) -> int | None:
+	filters = filters or {}
+	check_permissions(doctype)
+
+	meta = frappe.get_meta(doctype)
+	valid_filters = validate_filters(doctype, filters)
+	apply_team_filter(meta, filters, valid_filters)
+	return get_list_count(doctype, meta, filters, valid_filters)
+
+
 @frappe.whitelist(methods=["POST", "PUT"])
 def insert(doc=None):
 	if not doc or not doc.get("doctype"):
@@ -301,16 +462,83 @@ def delete(doctype: str, name: str):
 @frappe.whitelist()
 def run_doc_method(dt: str, dn: str, method: str, args: dict | None = None):
 	check_permissions(dt)
-	check_document_access(dt, dn)
-	check_dashboard_actions(dt, dn, method)
-
-	_run_doc_method(
-		dt=dt,
-		dn=dn,
-		method=method,
-		args=fix_args(method, args),
-	)
-	frappe.response.docs = [get(dt, dn)]
+	with request_context():
+		check_document_access(dt, dn)
+		check_dashboard_actions(dt, dn, method)
+
+		doc = get_request_doc(dt, dn)
+		run_method(doc, method, fix_args(method, args))
+		forget_request_doc_if_changed(doc)
+		frappe.response.docs = [get(dt, dn)]
+
+
+def run_method(doc, method: str, args):
+	"""Same as `frappe.handler.run_doc_method`, but on an already loaded document"""
+	if not doc.has_permission("read"):
+		raise_not_permitted()
+
+	with suppress(ValueError):
+		args = frappe.parse_json(args)
+
+	method_obj = getattr(doc, method)
+	fn = getattr(method_obj, "__func__", method_obj)
+	frappe.is_whitelisted(fn)
+	is_valid_http_method(fn)
+
+	fnargs = list(inspect.signature(method_obj).parameters)
+	if not fnargs or (len(fnargs) == 1 and fnargs[0] == "self"):
+		response = doc.run_method(method)
+	elif "args" in fnargs or not isinstance(args, dict):
+		response = doc.run_method(method, args)
+	else:
+		response = doc.run_method(method, **args)
+
+	if response:
+		frappe.response["message"] = response
+
+
+@contextmanager
+def request_context():
+	"""Share loaded documents between the permission checks, the action and the response of a request"""
+	previous = getattr(frappe.local, "press_request_docs", None)
+	frappe.local.press_request_docs = {}
+	try:
+		yield
+	finally:
+		frappe.local.press_request_docs = previous
+
+
+@contextmanager
+def permitted_doctypes(doctypes: set[str]):
+	"""Skip `check_permissions` of `doctypes` within the context, the caller has already checked them"""
+	previous = getattr(frappe.local, "press_permitted_doctypes", None)
+	frappe.local.press_permitted_doctypes = set(doctypes)
+	try:
+		yield
+	finally:
+		frappe.local.press_permitted_doctypes = previous
+
+
+def get_request_doc(doctype: str, name: str):
+	docs = getattr(frappe.local, "press_request_docs", None)
+	if docs is None:
+		return frappe.get_doc(doctype, name)
+
+	key = (doctype, cstr(name))
+	if key not in docs:
+		docs[key] = frappe.get_doc(doctype, name)
+	return docs[key]
+
+
+def forget_request_doc_if_changed(doc):
+	"""Drop the shared document if the action changed it behind its back, e.g. with `frappe.db.set_value`"""
+	docs = getattr(frappe.local, "press_request_docs", None)
+	if not docs:
+		return
+
+	modified = frappe.db.get_value(doc.doctype, doc.name, "modified")
+	if not modified or get_datetime(modified) != get_datetime(doc.modified):
+		docs.pop((doc.doctype, cstr(doc.name)), None)
 
 
 @frappe.whitelist()
@@ -366,12 +594,12 @@ def check_document_access(doctype: str, name: str):
 	team = ""
 	meta = frappe.get_meta(doctype)
 	if meta.has_field("team"):
-		team = frappe.db.get_value(doctype, name, "team")
+		team = get_document_field(doctype, name, "team")
 	elif meta.has_field("bench"):
-		bench = frappe.db.get_value(doctype, name, "bench")
+		bench = get_document_field(doctype, name, "bench")
 		team = frappe.db.get_value("Bench", bench, "team")
 	elif meta.has_field("group"):
-		group = frappe.db.get_value(doctype, name, "group")
+		group = get_document_field(doctype, name, "group")
 		team = frappe.db.get_value("Release Group", group, "team")
 	else:
 		return
@@ -382,8 +610,19 @@ def check_document_access(doctype: str, name: str):
 	raise_not_permitted()
 
 
+def get_document_field(doctype: str, name: str, fieldname: str):
+	# Within a request the document is needed anyway, load it once for the check and the action
+	if getattr(frappe.local, "press_request_docs", None) is None:
+		return frappe.db.get_value(doctype, name, fieldname)
+
+	try:
+		return get_request_doc(doctype, name).get(fieldname)
+	except frappe.DoesNotExistError:
+		return None
+
+
 def check_dashboard_actions(doctype, name, method):
-	doc = frappe.get_doc(doctype, name)
+	doc = get_request_doc(doctype, name)
 	method_obj = getattr(doc, method)
 	fn = getattr(method_obj, "__func__", method_obj)
 
@@ -482,6 +721,13 @@ def is_allowed_table_field(doctype, field):
 
 
 def check_permissions(doctype):
+	if doctype in (getattr(frappe.local, "press_permitted_doctypes", None) or ()):
+		return True
+
+	return validate_doctype_access(doctype)
+
+
+def validate_doctype_access(doctype):
 	if doctype not in ALLOWED_DOCTYPES:
 		raise_not_permitted()
 
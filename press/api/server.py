@@ -3,12 +3,13 @@
 
 from __future__ import annotations
 
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from datetime import timezone as tz
 from typing import TYPE_CHECKING
 
 import frappe
-import requests
 from frappe.utils import convert_utc_to_timezone, flt
 from frappe.utils.caching import redis_cache
 from frappe.utils.password import get_decrypted_password
@@ -17,7 +18,7 @@ from press.api.bench import all as all_benches
 from press.api.site import protected
 from press.press.doctype.site_plan.plan import Plan
 from press.press.doctype.team.team import get_child_team_members
-from press.utils import get_current_team
+from press.utils import get_current_team, http_pool
 
 if TYPE_CHECKING:
 	from press.press.doctype.cluster.cluster import Cluster
@@ -31,6 +32,8 @@ def poly_get_doc(doctypes, name):
 
 
 MOUNTPOINT_REGEX = "(/|/opt/volumes/mariadb|/opt/volumes/benches)"
+PROMETHEUS_QUERY_WORKERS = 8
+PROMETHEUS_QUERY_TIMEOUT = 30
 
 
 @frappe.whitelist()
@@ -210,12 +213,7 @@ def usage(name):
 		),
 	}
 
-	result = {}
-	for usage_type, query in query_map.items():
-		response = prometheus_query(query[0], query[1], "Asia/Kolkata", 120, 120)["datasets"]
-		if response:
-			result[usage_type] = response[0]["values"][-1]
-	return result
+	return get_last_values(query_map)
 
 
 @protected(["Server", "Database Server"])
@@ -235,12 +233,7 @@ def total_resource(name):
 		),
 	}
 
-	result = {}
-	for usage_type, query in query_map.items():
-		response = prometheus_query(query[0], query[1], "Asia/Kolkata", 120, 120)["datasets"]
-		if response:
-			result[usage_type] = response[0]["values"][-1]
-	return result
+	return get_last_values(query_map)
 
 
 def calculate_swap(name):
@@ -270,21 +263,37 @@ def calculate_swap(name):
 		),
 	}
 
-	result = {}
-	for usage_type, query in query_map.items():
-		response = prometheus_query(query[0], query[1], "Asia/Kolkata", 120, 120)["datasets"]
-		if response:
-			result[usage_type] = response[0]["values"][-1]
-	return result
+	return get_last_values(query_map)
 
 
 @frappe.whitelist()
 @protected(["Server", "Database Server"])
-@redis_cache(ttl=10 * 60)
 def analytics(name, query, timezone, duration):
+	return get_analytics(name, [query], timezone, duration)[query]
+
+
+@frappe.whitelist()
+@protected(["Server", "Database Server"])
+def batch_analytics(name, queries, timezone, duration):
+	"""Data of several charts of the server, keyed by query"""
+	return get_analytics(name, frappe.parse_json(queries), timezone, duration)
+
+
+def get_analytics(name, queries, timezone, duration):
 	timespan, timegrain = get_timespan_timegrain(duration)
+	analytics_query_map = get_analytics_query_map(name, timegrain)
+	query_map = {}
+	for query in queries:
+		if query not in analytics_query_map:
+			frappe.throw(f"Invalid query {query}")
+		query_map[query] = analytics_query_map[query]
 
-	query_map = {
+	# Each chart fails on its own, the rest of the dashboard still loads
+	return prometheus_queries(query_map, timezone, timespan, timegrain, cache=True, raise_exception=False)
+
+
+def get_analytics_query_map(name, timegrain):
+	return {
 		"cpu": (
 			f"""sum by (mode)(rate(node_cpu_seconds_total{{instance="{name}", job="node"}}[{timegrain}s])) * 100""",
 			lambda x: x["mode"],
@@ -347,8 +356,6 @@ avg by (instance) (
 		),
 	}
 
-	return prometheus_query(query_map[query][0], query_map[query][1], timezone, timespan, timegrain)
-
 
 @frappe.whitelist()
 @protected(["Server", "Database Server"])
@@ -372,44 +379,136 @@ def get_slow_logs_by_site(name, query, timezone, duration, normalize=False):
 	return get_slow_logs(name, query, timezone, timespan, timegrain, ResourceType.SERVER, normalize)
 
 
+def get_last_values(query_map):
+	"""Last value of the first dataset of each query, for current usage"""
+	result = {}
+	for usage_type, response in prometheus_queries(query_map, "Asia/Kolkata", 120, 120).items():
+		if response["datasets"]:
+			result[usage_type] = response["datasets"][0]["values"][-1]
+	return result
+
+
 def prometheus_query(query, function, timezone, timespan, timegrain):
+	return prometheus_queries({"query": (query, function)}, timezone, timespan, timegrain)["query"]
+
+
+def prometheus_queries(query_map, timezone, timespan, timegrain, cache=False, raise_exception=True):
+	"""
+	Run range queries of `query_map` concurrently, results are keyed the same as `query_map`.
+
+	With `cache`, the window is aligned to `timegrain` and raw results of each
+	window are cached in redis for a timegrain, so every dashboard (and
+	timezone) looking at the same server shares them.
+
+	Without `raise_exception`, a query that fails gets an empty result with an
+	`error` instead, and isn't cached.
+	"""
 	monitor_server = frappe.db.get_single_value("Press Settings", "monitor_server")
 	if not monitor_server:
-		return {"datasets": [], "labels": []}
+		return {key: {"datasets": [], "labels": []} for key in query_map}
+
+	end = datetime.utcnow().replace(tzinfo=tz.utc).timestamp()
+	if cache:
+		end = end // timegrain * timegrain
+	start = end - timespan
+
+	results, pending = get_cached_prometheus_results(query_map, start, end, timegrain, cache)
+	errors = {}
+	outcomes = fetch_prometheus_ranges(monitor_server, pending, start, end, timegrain)
+	for key, (result, error) in outcomes.items():
+		if error:
+			if raise_exception:
+				raise error
+			results[key], errors[key] = [], f"Failed to fetch data: {error}"
+			continue
+		results[key] = result
+		if cache:
+			frappe.cache.set_value(pending[key][1], result, expires_in_sec=timegrain)
+
+	formatted = {
+		key: format_prometheus_result(results[key], function, timezone)
+		for key, (_, function) in query_map.items()
+	}
+	for key, error in errors.items():
+		formatted[key]["error"] = error
+	return formatted
+
+
+def fetch_prometheus_ranges(monitor_server, queries, start, end, timegrain) -> dict[str, tuple]:
+	"""Run `queries` concurrently, returns (result, exception) of each query"""
+	if not queries:
+		return {}
 
 	url = f"https://{monitor_server}/prometheus/api/v1/query_range"
-	password = get_decrypted_password("Monitor Server", monitor_server, "grafana_password")
-
-	end = datetime.utcnow().replace(tzinfo=tz.utc)
-	start = frappe.utils.add_to_date(end, seconds=-timespan)
-	query = {
-		"query": query,
-		"start": start.timestamp(),
-		"end": end.timestamp(),
-		"step": f"{timegrain}s",
-	}
+	password = http_pool.get_cached_value(
+		("monitor_server_password", frappe.local.site, monitor_server),
+		lambda: str(get_decrypted_password("Monitor Server", monitor_server, "grafana_password")),
+	)
+	session = http_pool.get_session(("prometheus", monitor_server), PROMETHEUS_QUERY_WORKERS)
+
+	# Workers only make HTTP requests, database and cache stay on this thread
+	with ThreadPoolExecutor(max_workers=min(len(queries), PROMETHEUS_QUERY_WORKERS)) as executor:
+		futures = {
+			key: executor.submit(
+				fetch_prometheus_range, session, url, ("frappe", password), query, start, end, timegrain
+			)
+			for key, (query, _) in queries.items()
+		}
+
+	outcomes = {}
+	for key, future in futures.items():
+		try:
+			outcomes[key] = (future.result(), None)
+		except Exception as e:
+			outcomes[key] = (None, e)
+	return outcomes
+
+
+def get_cached_prometheus_results(query_map, start, end, timegrain, cache) -> tuple[dict, dict]:
+	"""Cached results of queries, and (query, cache key) of queries that have to be run"""
+	results, pending = {}, {}
+	for key, (query, _) in query_map.items():
+		cache_key = get_prometheus_cache_key(query, start, end, timegrain)
+		result = frappe.cache.get_value(cache_key) if cache else None
+		if result is None:
+			pending[key] = (query, cache_key)
+		else:
+			results[key] = result
+	return results, pending
+
+
+def get_prometheus_cache_key(query, start, end, timegrain):
+	window = f"{query}:{int(start)}:{int(end)}:{timegrain}"
+	return f"prometheus_query:{hashlib.sha1(window.encode()).hexdigest()}"
+
+
+def fetch_prometheus_range(session, url, auth, query, start, end, timegrain) -> list[dict]:
+	params = {"query": query, "start": start, "end": end, "step": f"{timegrain}s"}
+	response = session.get(url, params=params, auth=auth, timeout=PROMETHEUS_QUERY_TIMEOUT)
+	response.raise_for_status()
+	return response.json()["data"]["result"]
 
-	response = requests.get(url, params=query, auth=("frappe", password)).json()
 
+def format_prometheus_result(result, function, timezone):
 	datasets = []
 	labels = []
 
-	if not response["data"]["result"]:
+	if not result:
 		return {"datasets": datasets, "labels": labels}
 
-	for timestamp, _ in response["data"]["result"][0]["values"]:
+	for timestamp, _ in result[0]["values"]:
 		labels.append(
 			convert_utc_to_timezone(
 				datetime.fromtimestamp(timestamp, tz=tz.utc).replace(tzinfo=None), timezone
 			)
 		)
 
-	for index in range(len(response["data"]["result"])):
+	for index in range(len(result)):
 		dataset = {
-			"name": function(response["data"]["result"][index]["metric"]),
+			"name": function(result[index]["metric"]),
 			"values": [],
 		}
-		for _, value in response["data"]["result"][index]["values"]:
+		for _, value in result[index]["values"]:
 			dataset["values"].append(flt(value, 2))
 		datasets.append(dataset)
 
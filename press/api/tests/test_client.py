@@ -0,0 +1,139 @@
+# Copyright (c) 2026, Frappe and Contributors
+# See license.txt
+
+import unittest
+from unittest.mock import Mock, patch
+
+import frappe
+
+from press.api.client import batch, get, get_list, run_doc_method, validate_doctype_access
+from press.press.doctype.agent_job.agent_job import AgentJob
+from press.press.doctype.site.site import SITE_DASHBOARD_CONTEXT_KEY
+from press.press.doctype.site.test_site import create_test_site
+from press.press.doctype.site_activity.site_activity import log_site_activity
+from press.press.doctype.team.test_team import create_test_press_admin_team
+
+
+class TestAPIClient(unittest.TestCase):
+	def setUp(self):
+		self.team = create_test_press_admin_team()
+
+	def tearDown(self):
+		frappe.db.rollback()
+		frappe.set_user("Administrator")
+		frappe.cache.delete_value(SITE_DASHBOARD_CONTEXT_KEY)
+
+	@patch.object(AgentJob, "enqueue_http_request", new=Mock())
+	def test_run_doc_method_loads_document_once(self):
+		site = create_test_site(team=self.team.name)
+		frappe.set_user(self.team.user)
+
+		with patch.object(frappe, "get_doc", wraps=frappe.get_doc) as get_doc:
+			run_doc_method("Site", site.name, "reinstall")
+
+		site_loads = [c for c in get_doc.call_args_list if c.args == ("Site", site.name)]
+		self.assertEqual(len(site_loads), 1)
+		self.assertEqual(frappe.response.docs[0].name, site.name)
+		self.assertEqual(frappe.response.docs[0].status, "Pending")
+		self.assertIsNone(getattr(frappe.local, "press_request_docs", None))
+
+	def test_get_site_query_count(self):
+		site = create_test_site(team=self.team.name)
+		frappe.set_user(self.team.user)
+		# Warm up the shared dashboard context and plan cache
+		get("Site", site.name)
+
+		with patch.object(frappe.db, "sql", wraps=frappe.db.sql) as sql:
+			doc = get("Site", site.name)
+
+		self.assertEqual(doc.name, site.name)
+		self.assertEqual(doc.group_title, frappe.db.get_value("Release Group", site.group, "title"))
+
+		# Related documents used to be read with a query (or two) each, they
+		# now come from the single joined query or the shared cached context
+		related_tables = (
+			"`tabRelease Group`",
+			"`tabServer`",
+			"`tabProxy Server`",
+			"`tabAccount Request`",
+			"`tabSite Domain`",
+			"`tabTLS Certificate`",
+			"`tabSite Update`",
+			"`tabFrappe Version`",
+			"`tabCluster`",
+			"`tabSite Plan`",
+		)
+		queries = [str(c.args[0]) for c in sql.call_args_list if c.args]
+		related_queries = [query for query in queries if any(table in query for table in related_tables)]
+		self.assertEqual(len(related_queries), 1)
+		self.assertIn("`tabTLS Certificate`", related_queries[0])
+
+	def test_get_list_with_cursor(self):
+		site = create_test_site(team=self.team.name)
+		for _ in range(5):
+			log_site_activity(site.name, "Backup")
+		frappe.set_user(self.team.user)
+
+		filters = {"site": site.name}
+		expected = [row.name for row in get_list("Site Activity", filters=filters, order_by="creation desc")]
+
+		names, cursor = [], ""
+		while cursor is not None:
+			frappe.response.pop("next_cursor", None)
+			names += [
+				row.name
+				for row in get_list(
+					"Site Activity",
+					filters=filters,
+					order_by="creation desc",
+					limit=2,
+					after=cursor,
+					with_count=True,
+				)
+			]
+			cursor = frappe.response.get("next_cursor")
+
+		self.assertEqual(names, expected)
+		self.assertEqual(frappe.response.get("total_count"), len(expected))
+		self.assertRaises(
+			frappe.ValidationError, get_list, "Site Activity", order_by="action, creation", after=""
+		)
+
+	def test_batch(self):
+		site = create_test_site(team=self.team.name)
+		log_site_activity(site.name, "Backup")
+		frappe.set_user(self.team.user)
+
+		with patch("press.api.client.validate_doctype_access", wraps=validate_doctype_access) as validate:
+			results = batch(
+				[
+					{"id": "site", "type": "get", "doctype": "Site", "name": site.name},
+					{
+						"id": "activities",
+						"type": "list",
+						"doctype": "Site Activity",
+						"filters": {"site": site.name},
+					},
+					{
+						"id": "count",
+						"type": "count",
+						"doctype": "Site Activity",
+						"filters": {"site": site.name},
+					},
+					{"id": "missing", "type": "get", "doctype": "Site", "name": "missing.frappe.cloud"},
+					{"id": "invalid", "type": "list", "doctype": "Site", "unknown": 1},
+				]
+			)
+
+		self.assertEqual(results["site"]["data"].name, site.name)
+		self.assertEqual(
+			[row.name for row in results["activities"]["data"]],
+			[row.name for row in get_list("Site Activity", filters={"site": site.name})],
+		)
+		self.assertEqual(results["count"]["data"], len(results["activities"]["data"]))
+		self.assertEqual(results["missing"]["error"]["type"], "DoesNotExistError")
+		self.assertIn("error", results["invalid"])
+		# Permissions are validated once per doctype, not again for every request
+		self.assertEqual(validate.call_count, 2)
+
+		self.assertRaises(frappe.PermissionError, batch, [{"id": "users", "type": "list", "doctype": "User"}])
@@ -6,10 +6,11 @@ from __future__ import annotations
 from unittest.mock import MagicMock, Mock, patch
 
 import frappe
+import requests
 from frappe.model.naming import make_autoname
 from frappe.tests.utils import FrappeTestCase
 
-from press.api.server import all, change_plan, new
+from press.api.server import all, analytics, batch_analytics, change_plan, new
 from press.press.doctype.ansible_play.test_ansible_play import create_test_ansible_play
 from press.press.doctype.cluster.cluster import Cluster
 from press.press.doctype.cluster.test_cluster import create_test_cluster
@@ -25,6 +26,7 @@ from press.press.doctype.virtual_machine_image.virtual_machine_image import (
 	VirtualMachineImage,
 )
 from press.runner import Ansible
+from press.utils import http_pool
 from press.utils.test import foreground_enqueue_doc
 
 
@@ -342,3 +344,53 @@ class TestAPIServerList(FrappeTestCase):
 			all(server_filter={"server_type": "", "tag": "test_tag"}),
 			[self.app_server_dict],
 		)
+
+
+@patch("press.api.server.get_decrypted_password", new=Mock(return_value="password"))
+class TestAPIServerAnalytics(FrappeTestCase):
+	def setUp(self):
+		frappe.db.set_single_value("Press Settings", "monitor_server", "monitor.frappe.cloud")
+		http_pool.clear_cached_values()
+		self.result = [
+			{"metric": {"mode": "idle"}, "values": [[1700000000, "10.123"], [1700000120, "20"]]},
+		]
+
+	def tearDown(self):
+		frappe.db.rollback()
+		frappe.cache.delete_keys("prometheus_query:")
+
+	def test_batch_analytics_queries_once_per_window(self):
+		server = "f1-analytics.frappe.cloud"
+		with patch("press.api.server.fetch_prometheus_range", return_value=self.result) as fetch:
+			charts = batch_analytics(server, ["cpu", "memory"], "Asia/Kolkata", "1 Hour")
+			self.assertEqual(fetch.call_count, 2)
+
+			# Same window is served from cache, regardless of timezone
+			cpu = analytics(server, "cpu", "UTC", "1 Hour")
+			self.assertEqual(fetch.call_count, 2)
+
+		self.assertEqual(set(charts), {"cpu", "memory"})
+		self.assertEqual(charts["cpu"]["datasets"], [{"name": "idle", "values": [10.12, 20]}])
+		self.assertEqual(charts["memory"]["datasets"][0]["name"], "Used")
+		self.assertEqual(len(cpu["labels"]), 2)
+
+		self.assertRaises(frappe.ValidationError, batch_analytics, server, ["unknown"], "UTC", "1 Hour")
+
+	def test_failed_query_fails_only_its_chart(self):
+		server = "f1-analytics.frappe.cloud"
+
+		def fetch_prometheus_range(session, url, auth, query, *args):
+			if "node_memory" in query:
+				raise requests.exceptions.HTTPError("503 Server Error")
+			return self.result
+
+		with patch("press.api.server.fetch_prometheus_range", side_effect=fetch_prometheus_range) as fetch:
+			charts = batch_analytics(server, ["cpu", "memory"], "UTC", "1 Hour")
+			self.assertEqual(charts["cpu"]["datasets"], [{"name": "idle", "values": [10.12, 20]}])
+			self.assertNotIn("error", charts["cpu"])
+			self.assertEqual(charts["memory"]["datasets"], [])
+			self.assertIn("503 Server Error", charts["memory"]["error"])
+
+			# Failures aren't cached, the next load queries the failed chart again
+			batch_analytics(server, ["cpu", "memory"], "UTC", "1 Hour")
+			self.assertEqual(fetch.call_count, 3)
@@ -167,6 +167,18 @@ doc_events = {
 	"Marketplace App Subscription": {
 		"on_update": "press.press.doctype.storage_integration_subscription.storage_integration_subscription.create_after_insert",
 	},
+	"Frappe Version": {
+		"on_update": "press.press.doctype.site.site.clear_site_dashboard_context",
+		"on_trash": "press.press.doctype.site.site.clear_site_dashboard_context",
+	},
+	"Cluster": {
+		"on_update": "press.press.doctype.site.site.clear_site_dashboard_context",
+		"on_trash": "press.press.doctype.site.site.clear_site_dashboard_context",
+	},
+	"Site Plan": {
+		"on_update": "press.press.doctype.site.site.clear_site_dashboard_context",
+		"on_trash": "press.press.doctype.site.site.clear_site_dashboard_context",
+	},
 }
 
 # Scheduled Tasks
@@ -268,6 +280,7 @@ scheduler_events = {
 			"press.press.doctype.site_migration.site_migration.run_scheduled_migrations",
 			"press.press.doctype.version_upgrade.version_upgrade.run_scheduled_upgrades",
 			"press.press.doctype.subscription.subscription.create_usage_records",
+			"press.press.doctype.site_usage_rollup.site_usage_rollup.rollup_site_usage",
 			"press.press.doctype.virtual_machine.virtual_machine.sync_virtual_machines",
 			"press.press.doctype.mariadb_stalk.mariadb_stalk.fetch_stalks",
 			"press.press.doctype.database_server.database_server.monitor_disk_performance",
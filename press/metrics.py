@@ -8,9 +8,18 @@ from prometheus_client import (
 	Gauge,
 	generate_latest,
 )
+from prometheus_client.core import HistogramMetricFamily
 from werkzeug.wrappers import Response
 
 
+class StaticCollector:
+	def __init__(self, metrics):
+		self.metrics = metrics
+
+	def collect(self):
+		return self.metrics
+
+
 class MetricsRenderer:
 	def __init__(self, path, status_code=None):
 		self.path = path
@@ -31,6 +40,18 @@ class MetricsRenderer:
 		for row in rows:
 			c.labels(row[status_field]).set(row.count)
 
+	def get_agent_job_callback_durations(self):
+		from press.press.doctype.agent_job.agent_job import get_callback_duration_histogram
+
+		histogram = HistogramMetricFamily(
+			"press_agent_job_callback_duration_seconds",
+			"Time spent processing agent job updates",
+			labels=["job_type"],
+		)
+		for job_type, values in get_callback_duration_histogram().items():
+			histogram.add_metric([job_type], buckets=values["buckets"], sum_value=values["sum"])
+		self.registry.register(StaticCollector([histogram]))
+
 	def metrics(self):
 		suspended_builds = Gauge(
 			"press_builds_suspended", "Are docker builds suspended", registry=self.registry
@@ -67,6 +88,7 @@ class MetricsRenderer:
 		self.get_status(
 			"press_agent_job_total", "Agent Job", filters={"status": ("!=", "Success")}
 		)
+		self.get_agent_job_callback_durations()
 
 		return generate_latest(self.registry).decode("utf-8")
 
@@ -19,20 +19,28 @@ from frappe.utils import (
 	get_datetime,
 	now_datetime,
 )
+from requests.exceptions import HTTPError
 
 from press.agent import Agent, AgentCallbackException, AgentRequestSkippedException
 from press.api.client import is_owned_by_team
 from press.press.doctype.agent_job_type.agent_job_type import (
 	get_retryable_job_types_and_max_retry_count,
 )
-from press.press.doctype.site_database_user.site_database_user import SiteDatabaseUser
 from press.press.doctype.site_migration.site_migration import (
 	get_ongoing_migration,
 	process_site_migration_job_update,
 )
-from press.utils import has_role, log_error, timer
+from press.utils import bulk_update, chunk, has_role, log_error, timer
 
 AGENT_LOG_KEY = "agent-jobs"
+CALLBACK_DURATION_KEY = "agent_job_callback_duration"
+CALLBACK_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+AGENT_JOB_POLL_CURSOR_KEY = "agent_job_poll_cursor"
+# Pending jobs are polled by id once in this interval (seconds) in delta polling mode,
+# to pick up jobs whose callbacks failed or changes that were missed
+AGENT_JOB_RECONCILE_INTERVAL = 10 * 60
+# Maximum number of change pages fetched from an agent in a single poll
+AGENT_JOB_CHANGES_MAX_PAGES = 5
 
 
 class AgentJob(Document):
@@ -423,16 +431,19 @@ def publish_update(job):
 		)
 
 
-def suspend_sites():
-	"""Suspend sites if they have exceeded database or disk limits"""
+def suspend_sites(sites: list[str] | None = None):
+	"""Suspend sites if they have exceeded database or disk limits, pass `sites` to only check those"""
 
 	if not frappe.db.get_single_value("Press Settings", "enforce_storage_limits"):
 		return
 
 	free_teams = frappe.get_all("Team", filters={"free_account": True, "enabled": True}, pluck="name")
+	filters = {"status": "Active", "free": False, "team": ("not in", free_teams)}
+	if sites is not None:
+		filters["name"] = ("in", sites)
 	active_sites = frappe.get_all(
 		"Site",
-		filters={"status": "Active", "free": False, "team": ("not in", free_teams)},
+		filters=filters,
 		fields=["name", "team", "current_database_usage", "current_disk_usage"],
 	)
 
@@ -457,12 +468,197 @@ def poll_random_jobs(agent, pending_ids):
 	return agent.get_jobs_status(random_pending_ids)
 
 
+def is_delta_polling_enabled() -> bool:
+	return bool(cint(frappe.get_cached_value("Press Settings", None, "agent_job_delta_polling")))
+
+
+@timer
+def poll_changed_jobs(agent, pending_ids) -> tuple[list[dict], int] | None:
+	"""
+	Poll jobs changed on the agent since the cursor stored for the server
+
+	Returns polled jobs and the cursor to store once they are handled.
+	Returns None if the agent doesn't support delta polling.
+	"""
+	if frappe.cache.get_value(f"agent_job_delta_polling_unsupported:{agent.server}"):
+		return None
+
+	cursor = frappe.cache.hget(AGENT_JOB_POLL_CURSOR_KEY, agent.server)
+	polled_jobs = {}
+	try:
+		for _ in range(AGENT_JOB_CHANGES_MAX_PAGES):
+			changes = agent.get_jobs_changed_since(cursor)
+			if not isinstance(changes, dict) or "cursor" not in changes:
+				raise ValueError("Invalid response for job changes")
+
+			for polled_job in changes.get("jobs") or []:
+				polled_jobs[polled_job["id"]] = polled_job
+
+			first_poll = cursor is None
+			cursor = changes["cursor"]
+			if first_poll or not changes.get("has_more"):
+				break
+	except (HTTPError, ValueError):
+		# Older agents, poll pending jobs by id for a while
+		frappe.cache.set_value(
+			f"agent_job_delta_polling_unsupported:{agent.server}", 1, expires_in_sec=60 * 60
+		)
+		return None
+
+	for polled_job in poll_jobs_due_for_reconciliation(agent, pending_ids, first_poll):
+		polled_jobs.setdefault(polled_job["id"], polled_job)
+
+	pending_ids = set(pending_ids)
+	return [job for job_id, job in polled_jobs.items() if job_id in pending_ids], cursor
+
+
+def poll_jobs_due_for_reconciliation(agent, pending_ids, force=False) -> list[dict]:
+	"""Poll all pending jobs by id, at most once every AGENT_JOB_RECONCILE_INTERVAL"""
+	key = f"agent_job_poll_reconciled:{agent.server}"
+	if not force and frappe.cache.get_value(key):
+		return []
+
+	frappe.cache.set_value(key, 1, expires_in_sec=AGENT_JOB_RECONCILE_INTERVAL)
+	polled_jobs = []
+	for ids in chunk(pending_ids, 100):
+		polled_jobs.extend(job for job in agent.get_jobs_status(ids) or [] if job)
+	return polled_jobs
+
+
 @timer
 def handle_polled_jobs(polled_jobs, pending_jobs):
+	"""
+	Apply job and step updates of all polled jobs in bulk, then process callbacks per job
+
+	Updates of jobs that are still running are committed before their callbacks run.
+	A finished job is written in the same transaction as its callbacks, so it stays
+	pending and is polled again until they succeed.
+
+	Jobs whose callbacks depend on another job (`get_pair_jobs`) are handled one
+	at a time in their own transaction, after locking the document they update.
+	"""
+	pending_jobs = {job.job_id: job for job in pending_jobs}
+	batched, isolated = [], []
 	for polled_job in polled_jobs:
-		if not polled_job:
+		job = polled_job and pending_jobs.get(polled_job["id"])
+		if not job:
+			continue
+		if job.get("job_type") in get_pair_jobs():
+			isolated.append((polled_job, job))
+		else:
+			batched.append((polled_job, job))
+
+	if batched:
+		updates = get_polled_job_updates(batched)
+		apply_polled_job_updates({name: update for name, update in updates.items() if not update.finished})
+		frappe.db.commit()
+		for polled_job, job in batched:
+			process_polled_job_updates(polled_job, job, updates[job.name])
+
+	for polled_job, job in isolated:
+		handle_polled_job(polled_job=polled_job, job=job)
+
+
+def get_polled_job_updates(polled_jobs) -> dict[str, frappe._dict]:
+	"""Diff polled jobs against their pending steps with one query, keyed by job name"""
+	steps = frappe.get_all(
+		"Agent Job Step",
+		fields=["name", "status", "step_name", "agent_job"],
+		filters={
+			"agent_job": ("in", [job.name for _, job in polled_jobs]),
+			"status": ("in", ["Pending", "Running"]),
+		},
+	)
+	steps_by_job = {}
+	for step in steps:
+		steps_by_job.setdefault(step.agent_job, {}).setdefault(step.step_name, step)
+
+	updates = {}
+	for polled_job, job in polled_jobs:
+		job_steps = steps_by_job.get(job.name, {})
+		step_updates, running_steps = get_polled_step_updates(polled_job, job_steps)
+		updates[job.name] = frappe._dict(
+			job=get_job_update(polled_job) if job.status != polled_job["status"] else None,
+			steps=step_updates,
+			previous_steps={
+				step.name: step.status for step in job_steps.values() if step.name in step_updates
+			},
+			running_steps=running_steps,
+			finished=polled_job["status"] in ("Success", "Failure", "Undelivered"),
+		)
+	return updates
+
+
+def apply_polled_job_updates(updates: dict[str, frappe._dict]):
+	"""Write job and step changes of polled jobs in a few queries, without committing"""
+	bulk_update("Agent Job", {name: update.job for name, update in updates.items() if update.job})
+	bulk_update(
+		"Agent Job Step",
+		{step: values for update in updates.values() for step, values in update.steps.items()},
+	)
+
+	# Some callbacks rely on step statuses, e.g. archive_site
+	# so update step status before callbacks are processed
+	skip_pending_steps([name for name, update in updates.items() if update.finished])
+
+
+def get_polled_step_updates(polled_job, steps: dict) -> tuple[dict, list]:
+	"""Return updates for steps whose status changed and the steps that are now running"""
+	updates, running = {}, []
+	for polled_step in polled_job["steps"]:
+		step = steps.get(polled_step["name"])
+		if not step:
 			continue
-		handle_polled_job(pending_jobs=pending_jobs, polled_job=polled_job)
+		if step.status != polled_step["status"]:
+			updates[step.name] = get_step_update(polled_step)
+		if polled_step["status"] == "Running":
+			running.append(step)
+	return updates, running
+
+
+def process_polled_job_updates(polled_job, job, update: frappe._dict):
+	"""
+	Run callbacks of a job polled by `handle_polled_jobs`
+
+	Updates of a finished job are written here, so they are rolled back with its callbacks.
+	"""
+	try:
+		if update.finished:
+			apply_polled_job_updates({job.name: update})
+		populate_output_cache(polled_job, job, update.running_steps)
+		process_job_updates(job.name, polled_job)
+		frappe.db.commit()
+		publish_update(job.name)
+	except AgentCallbackException:
+		# Rollback changes made by callbacks and revert the job,
+		# so it is polled and its callbacks are retried
+		frappe.db.rollback()
+		revert_polled_job_updates(job, update)
+		frappe.db.set_value("Agent Job", job.name, "callback_failure_count", job.callback_failure_count + 1)
+		frappe.db.commit()
+	except Exception:
+		log_error(
+			"Agent Job Poll Exception",
+			job=job,
+			polled=polled_job,
+			reference_doctype="Agent Job",
+			reference_name=job.name,
+		)
+		frappe.db.rollback()
+		revert_polled_job_updates(job, update)
+		frappe.db.commit()
+
+
+def revert_polled_job_updates(job, update: frappe._dict):
+	"""Restore status of a running job and its steps, committed before callbacks ran"""
+	if update.finished:
+		# Never committed, already undone by the rollback
+		return
+	if update.job:
+		frappe.db.set_value("Agent Job", job.name, "status", job.status)
+	bulk_update(
+		"Agent Job Step", {step: {"status": status} for step, status in update.previous_steps.items()}
+	)
 
 
 def add_timer_data_to_monitor(server):
@@ -482,7 +678,7 @@ def poll_pending_jobs_server(server):
 
 	pending_jobs = frappe.get_all(
 		"Agent Job",
-		fields=["name", "job_id", "status", "callback_failure_count"],
+		fields=["name", "job_id", "status", "callback_failure_count", "job_type"],
 		filters={
 			"status": ("in", ["Pending", "Running"]),
 			"job_id": ("!=", 0),
@@ -498,14 +694,18 @@ def poll_pending_jobs_server(server):
 		return
 
 	pending_ids = [j.job_id for j in pending_jobs]
-	polled_jobs = poll_random_jobs(agent, pending_ids)
+	changes = poll_changed_jobs(agent, pending_ids) if is_delta_polling_enabled() else None
+	if changes:
+		polled_jobs, cursor = changes
+	else:
+		polled_jobs, cursor = poll_random_jobs(agent, pending_ids), None
 
-	if not polled_jobs:
-		retry_undelivered_jobs(server)
-		add_timer_data_to_monitor(server.server)
-		return
+	if polled_jobs:
+		handle_polled_jobs(polled_jobs, pending_jobs)
 
-	handle_polled_jobs(polled_jobs, pending_jobs)
+	if cursor is not None:
+		# Advance the cursor only after changes are handled
+		frappe.cache.hset(AGENT_JOB_POLL_CURSOR_KEY, server.server, cursor)
 
 	retry_undelivered_jobs(server)
 	add_timer_data_to_monitor(server.server)
@@ -555,14 +755,15 @@ def handle_polled_job(polled_job, pending_jobs=None, job=None):
 		frappe.db.rollback()
 
 
-def populate_output_cache(polled_job, job):
+def populate_output_cache(polled_job, job, steps=None):
 	if not cint(frappe.get_cached_value("Press Settings", None, "realtime_job_updates")):
 		return
-	steps = frappe.get_all(
-		"Agent Job Step",
-		filters={"agent_job": job.name, "status": "Running"},
-		fields=["name", "step_name"],
-	)
+	if steps is None:
+		steps = frappe.get_all(
+			"Agent Job Step",
+			filters={"agent_job": job.name, "status": "Running"},
+			fields=["name", "step_name"],
+		)
 	for step in steps:
 		polled_step = find(polled_job["steps"], lambda x: x["name"] == step.step_name)
 		if polled_step:
@@ -603,7 +804,7 @@ def filter_request_failures(servers):
 
 def poll_pending_jobs():
 	filters = {"status": ("in", ["Pending", "Running", "Undelivered"])}
-	if random.random() > 0.1:
+	if not is_delta_polling_enabled() and random.random() > 0.1:
 		# Experimenting with fewer polls (only for backup jobs)
 		# Reduce poll frequency for Backup Site jobs
 		# TODO: Replace this with something deterministic
@@ -713,20 +914,20 @@ def lock_doc_updated_by_job(job_name):
 
 
 def update_job(job_name, job):
+	frappe.db.set_value("Agent Job", job_name, get_job_update(job))
+
+
+def get_job_update(job) -> dict:
 	job_data = json.dumps(job["data"], indent=4, sort_keys=True)
-	frappe.db.set_value(
-		"Agent Job",
-		job_name,
-		{
-			"start": job["start"],
-			"end": job["end"],
-			"duration": job["duration"],
-			"status": job["status"],
-			"data": job_data,
-			"output": job["data"].get("output"),
-			"traceback": job["data"].get("traceback"),
-		},
-	)
+	return {
+		"start": job["start"],
+		"end": job["end"],
+		"duration": job["duration"],
+		"status": job["status"],
+		"data": job_data,
+		"output": job["data"].get("output"),
+		"traceback": job["data"].get("traceback"),
+	}
 
 
 def update_steps(job_name, job):
@@ -753,6 +954,10 @@ def update_steps(job_name, job):
 
 
 def update_step(step_name, step):
+	frappe.db.set_value("Agent Job Step", step_name, get_step_update(step))
+
+
+def get_step_update(step) -> dict:
 	step_data = json.dumps(step["data"], indent=4, sort_keys=True)
 
 	output = None
@@ -761,27 +966,27 @@ def update_step(step_name, step):
 		traceback = to_str(step["data"].get("traceback", ""))
 		output = to_str(step["data"].get("output", ""))
 
-	frappe.db.set_value(
-		"Agent Job Step",
-		step_name,
-		{
-			"start": step["start"],
-			"end": step["end"],
-			"duration": step["duration"],
-			"status": step["status"],
-			"data": step_data,
-			"output": output,
-			"traceback": traceback,
-		},
-	)
+	return {
+		"start": step["start"],
+		"end": step["end"],
+		"duration": step["duration"],
+		"status": step["status"],
+		"data": step_data,
+		"output": output,
+		"traceback": traceback,
+	}
 
 
-def skip_pending_steps(job_name):
-	frappe.db.sql(
-		"""UPDATE  `tabAgent Job Step` SET  status = 'Skipped'
-		WHERE status = 'Pending' AND agent_job = %s""",
-		job_name,
-	)
+def skip_pending_steps(job_names: str | list[str]):
+	if isinstance(job_names, str):
+		job_names = [job_names]
+	if not job_names:
+		return
+
+	agent_job_step = frappe.qb.DocType("Agent Job Step")
+	frappe.qb.update(agent_job_step).set(agent_job_step.status, "Skipped").where(
+		(agent_job_step.status == "Pending") & (agent_job_step.agent_job.isin(job_names))
+	).run()
 
 
 def get_next_retry_at(job_retry_count):
@@ -942,172 +1147,21 @@ def update_job_ids_for_delivered_jobs(delivered_jobs):
 		)
 
 
-def process_job_updates(job_name: str, response_data: dict | None = None):  # noqa: C901
+def process_job_updates(job_name: str, response_data: dict | None = None):
 	job: "AgentJob" = frappe.get_doc("Agent Job", job_name)
 	start = now_datetime()
 
 	try:
+		from press.press.doctype.agent_job.agent_job_callbacks import run_callbacks
 		from press.press.doctype.agent_job.agent_job_notifications import (
 			send_job_failure_notification,
 		)
-		from press.press.doctype.app_patch.app_patch import AppPatch
-		from press.press.doctype.bench.bench import (
-			Bench,
-			process_add_ssh_user_job_update,
-			process_archive_bench_job_update,
-			process_new_bench_job_update,
-			process_remove_ssh_user_job_update,
-		)
-		from press.press.doctype.code_server.code_server import (
-			process_archive_code_server_job_update,
-			process_new_code_server_job_update,
-			process_start_code_server_job_update,
-			process_stop_code_server_job_update,
-		)
-		from press.press.doctype.deploy_candidate_build.deploy_candidate_build import DeployCandidateBuild
-		from press.press.doctype.physical_backup_restoration.physical_backup_restoration import (
-			process_job_update as process_physical_backup_restoration_job_update,
-		)
-		from press.press.doctype.physical_backup_restoration.physical_backup_restoration import (
-			process_physical_backup_restoration_deactivate_site_job_update,
-		)
-		from press.press.doctype.proxy_server.proxy_server import (
-			process_update_nginx_job_update,
-		)
-		from press.press.doctype.server.server import process_new_server_job_update
-		from press.press.doctype.site.erpnext_site import (
-			process_setup_erpnext_site_job_update,
-		)
-		from press.press.doctype.site.site import (
-			process_add_domain_job_update,
-			process_archive_site_job_update,
-			process_complete_setup_wizard_job_update,
-			process_create_user_job_update,
-			process_fetch_database_table_schema_job_update,
-			process_install_app_site_job_update,
-			process_migrate_site_job_update,
-			process_move_site_to_bench_job_update,
-			process_new_site_job_update,
-			process_reinstall_site_job_update,
-			process_rename_site_job_update,
-			process_restore_job_update,
-			process_restore_tables_job_update,
-			process_uninstall_app_site_job_update,
-		)
-		from press.press.doctype.site_backup.site_backup import process_backup_site_job_update
-		from press.press.doctype.site_backup.site_backup import (
-			process_deactivate_site_job_update as process_site_backup_deactivate_site_job_update,
-		)
-		from press.press.doctype.site_domain.site_domain import (
-			process_add_domain_to_upstream_job_update,
-			process_new_host_job_update,
-		)
-		from press.press.doctype.site_update.site_update import (
-			process_activate_site_job_update,
-			process_deactivate_site_job_update,
-			process_update_site_job_update,
-			process_update_site_recover_job_update,
-		)
 
 		site_migration = get_ongoing_migration(job.site)
 		if site_migration:
 			process_site_migration_job_update(job, site_migration)
-		elif job.job_type == "Add Upstream to Proxy":
-			process_new_server_job_update(job)
-		elif job.job_type == "New Bench":
-			process_new_bench_job_update(job)
-		elif job.job_type == "Archive Bench":
-			process_archive_bench_job_update(job)
-		elif job.job_type == "New Site":
-			process_new_site_job_update(job)
-		elif job.job_type == "New Site from Backup":
-			process_new_site_job_update(job)
-			process_restore_job_update(job, force=True)
-		elif job.job_type == "Restore Site":
-			process_restore_job_update(job)
-		elif job.job_type == "Reinstall Site":
-			process_reinstall_site_job_update(job)
-		elif job.job_type == "Migrate Site":
-			process_migrate_site_job_update(job)
-		elif job.job_type == "Install App on Site":
-			process_install_app_site_job_update(job)
-		elif job.job_type == "Uninstall App from Site":
-			process_uninstall_app_site_job_update(job)
-		elif job.job_type == "Add Site to Upstream":
-			process_new_site_job_update(job)
-		elif job.job_type == "Add Code Server to Upstream" or job.job_type == "Setup Code Server":
-			process_new_code_server_job_update(job)
-		elif job.job_type == "Start Code Server":
-			process_start_code_server_job_update(job)
-		elif job.job_type == "Stop Code Server":
-			process_stop_code_server_job_update(job)
-		elif job.job_type == "Archive Code Server" or job.job_type == "Remove Code Server from Upstream":
-			process_archive_code_server_job_update(job)
-		elif job.job_type in ["Backup Site", "Physical Backup Database"]:
-			process_backup_site_job_update(job)
-		elif job.job_type == "Archive Site" or job.job_type == "Remove Site from Upstream":
-			process_archive_site_job_update(job)
-		elif job.job_type == "Add Host to Proxy":
-			process_new_host_job_update(job)
-		elif job.job_type == "Add Domain to Upstream":
-			process_add_domain_to_upstream_job_update(job)
-		elif job.job_type == "Update Site Migrate" or job.job_type == "Update Site Pull":
-			process_update_site_job_update(job)
-		elif (
-			job.job_type == "Recover Failed Site Migrate"
-			or job.job_type == "Recover Failed Site Pull"
-			or job.job_type == "Recover Failed Site Update"
-		):
-			process_update_site_recover_job_update(job)
-		elif job.job_type == "Rename Site" or job.job_type == "Rename Site on Upstream":
-			process_rename_site_job_update(job)
-		elif job.job_type == "Setup ERPNext":
-			process_setup_erpnext_site_job_update(job)
-		elif job.job_type == "Restore Site Tables":
-			process_restore_tables_job_update(job)
-		elif job.job_type == "Add User to Proxy":
-			process_add_ssh_user_job_update(job)
-		elif job.job_type == "Remove User from Proxy":
-			process_remove_ssh_user_job_update(job)
-		elif job.job_type == "Add User to ProxySQL" or job.job_type == "Remove User from ProxySQL":
-			if job.reference_doctype == "Site Database User":
-				SiteDatabaseUser.process_job_update(job)
-		elif job.job_type == "Reload NGINX":
-			process_update_nginx_job_update(job)
-		elif job.job_type == "Move Site to Bench":
-			process_move_site_to_bench_job_update(job)
-		elif job.job_type == "Patch App":
-			AppPatch.process_patch_app(job)
-		elif job.job_type == "Run Remote Builder":
-			DeployCandidateBuild.process_run_build(job, response_data)
-		elif job.job_type == "Create User":
-			process_create_user_job_update(job)
-		elif job.job_type == "Complete Setup Wizard":
-			process_complete_setup_wizard_job_update(job)
-		elif job.job_type == "Update Bench In Place":
-			Bench.process_update_inplace(job)
-		elif job.job_type == "Recover Update In Place":
-			Bench.process_recover_update_inplace(job)
-		elif job.job_type == "Fetch Database Table Schema":
-			process_fetch_database_table_schema_job_update(job)
-		elif job.job_type in [
-			"Create Database User",
-			"Remove Database User",
-			"Modify Database User Permissions",
-		]:
-			SiteDatabaseUser.process_job_update(job)
-		elif job.job_type == "Physical Restore Database":
-			process_physical_backup_restoration_job_update(job)
-		elif job.job_type == "Deactivate Site" and job.reference_doctype == "Site Update":
-			process_deactivate_site_job_update(job)
-		elif job.job_type == "Activate Site" and job.reference_doctype == "Site Update":
-			process_activate_site_job_update(job)
-		elif job.job_type == "Deactivate Site" and job.reference_doctype == "Site Backup":
-			process_site_backup_deactivate_site_job_update(job)
-		elif job.job_type == "Deactivate Site" and job.reference_doctype == "Physical Backup Restoration":
-			process_physical_backup_restoration_deactivate_site_job_update(job)
-		elif job.job_type == "Add Domain":
-			process_add_domain_job_update(job)
+		else:
+			run_callbacks(job, response_data)
 
 		# send failure notification if job failed
 		if job.status == "Failure":
@@ -1143,10 +1197,43 @@ def log_update(job, start, exception=None):
 			data["exception"] = exception
 		serialized = json.dumps(data, sort_keys=True, default=str, separators=(",", ":"))
 		frappe.cache().rpush(AGENT_LOG_KEY, serialized)
+		record_callback_duration(job.job_type, data["duration"])
 	except Exception:
 		traceback.print_exc()
 
 
+def record_callback_duration(job_type: str, duration: float):
+	"""Count the callback in its duration bucket, per job type"""
+	bucket = next((str(b) for b in CALLBACK_DURATION_BUCKETS if duration <= b), "+Inf")
+	key = frappe.cache.make_key(CALLBACK_DURATION_KEY)
+	pipeline = frappe.cache.pipeline()
+	pipeline.hincrby(key, f"{job_type}|{bucket}", 1)
+	pipeline.hincrbyfloat(key, f"{job_type}|sum", duration)
+	pipeline.execute()
+
+
+def get_callback_duration_histogram() -> dict[str, dict]:
+	"""
+	Callback durations per job type as cumulative histogram buckets
+
+	{job_type: {"buckets": [("0.05", count), ..., ("+Inf", count)], "sum": seconds, "count": count}}
+	"""
+	raw = frappe.cache.hgetall(frappe.cache.make_key(CALLBACK_DURATION_KEY)) or {}
+	counts: dict[str, dict[str, float]] = {}
+	for field, value in raw.items():
+		job_type, _, bucket = frappe.safe_decode(field).rpartition("|")
+		counts.setdefault(job_type, {})[bucket] = float(value)
+
+	histogram = {}
+	for job_type, values in counts.items():
+		buckets, total = [], 0
+		for bucket in [*map(str, CALLBACK_DURATION_BUCKETS), "+Inf"]:
+			total += values.get(bucket, 0)
+			buckets.append((bucket, total))
+		histogram[job_type] = {"buckets": buckets, "sum": values.get("sum", 0), "count": total}
+	return histogram
+
+
 def update_job_step_status():
 	from frappe.query_builder.custom import GROUP_CONCAT
 
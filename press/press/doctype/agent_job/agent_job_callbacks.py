@@ -0,0 +1,149 @@
+# Copyright (c) 2026, Frappe and contributors
+# For license information, please see license.txt
+
+"""
+Registry of callbacks that process Agent Job updates.
+
+Callbacks are keyed by job type, or by (job type, reference doctype) for job
+types that are handled differently depending on the document that created
+them. Callbacks are referenced by their dotted path, they are imported on first
+use and cached for the lifetime of the process.
+
+Callbacks are called with the Agent Job, and with the polled response as
+`response_data` if they accept it.
+"""
+
+from __future__ import annotations
+
+import importlib
+import inspect
+import typing
+
+if typing.TYPE_CHECKING:
+	from collections.abc import Callable
+
+	from press.press.doctype.agent_job.agent_job import AgentJob
+
+SITE = "press.press.doctype.site.site"
+BENCH = "press.press.doctype.bench.bench"
+CODE_SERVER = "press.press.doctype.code_server.code_server"
+SITE_BACKUP = "press.press.doctype.site_backup.site_backup"
+SITE_DOMAIN = "press.press.doctype.site_domain.site_domain"
+SITE_UPDATE = "press.press.doctype.site_update.site_update"
+SITE_DATABASE_USER = "press.press.doctype.site_database_user.site_database_user.SiteDatabaseUser"
+PHYSICAL_BACKUP_RESTORATION = "press.press.doctype.physical_backup_restoration.physical_backup_restoration"
+
+CALLBACKS: dict[str | tuple[str, str], tuple[str, ...]] = {
+	"Add Upstream to Proxy": ("press.press.doctype.server.server.process_new_server_job_update",),
+	"New Bench": (f"{BENCH}.process_new_bench_job_update",),
+	"Archive Bench": (f"{BENCH}.process_archive_bench_job_update",),
+	"New Site": (f"{SITE}.process_new_site_job_update",),
+	"New Site from Backup": (
+		f"{SITE}.process_new_site_job_update",
+		"press.press.doctype.agent_job.agent_job_callbacks.process_new_site_from_backup_restore_job_update",
+	),
+	"Restore Site": (f"{SITE}.process_restore_job_update",),
+	"Reinstall Site": (f"{SITE}.process_reinstall_site_job_update",),
+	"Migrate Site": (f"{SITE}.process_migrate_site_job_update",),
+	"Install App on Site": (f"{SITE}.process_install_app_site_job_update",),
+	"Uninstall App from Site": (f"{SITE}.process_uninstall_app_site_job_update",),
+	"Add Site to Upstream": (f"{SITE}.process_new_site_job_update",),
+	"Add Code Server to Upstream": (f"{CODE_SERVER}.process_new_code_server_job_update",),
+	"Setup Code Server": (f"{CODE_SERVER}.process_new_code_server_job_update",),
+	"Start Code Server": (f"{CODE_SERVER}.process_start_code_server_job_update",),
+	"Stop Code Server": (f"{CODE_SERVER}.process_stop_code_server_job_update",),
+	"Archive Code Server": (f"{CODE_SERVER}.process_archive_code_server_job_update",),
+	"Remove Code Server from Upstream": (f"{CODE_SERVER}.process_archive_code_server_job_update",),
+	"Backup Site": (f"{SITE_BACKUP}.process_backup_site_job_update",),
+	"Physical Backup Database": (f"{SITE_BACKUP}.process_backup_site_job_update",),
+	"Archive Site": (f"{SITE}.process_archive_site_job_update",),
+	"Remove Site from Upstream": (f"{SITE}.process_archive_site_job_update",),
+	"Add Host to Proxy": (f"{SITE_DOMAIN}.process_new_host_job_update",),
+	"Add Domain to Upstream": (f"{SITE_DOMAIN}.process_add_domain_to_upstream_job_update",),
+	"Update Site Migrate": (f"{SITE_UPDATE}.process_update_site_job_update",),
+	"Update Site Pull": (f"{SITE_UPDATE}.process_update_site_job_update",),
+	"Recover Failed Site Migrate": (f"{SITE_UPDATE}.process_update_site_recover_job_update",),
+	"Recover Failed Site Pull": (f"{SITE_UPDATE}.process_update_site_recover_job_update",),
+	"Recover Failed Site Update": (f"{SITE_UPDATE}.process_update_site_recover_job_update",),
+	"Rename Site": (f"{SITE}.process_rename_site_job_update",),
+	"Rename Site on Upstream": (f"{SITE}.process_rename_site_job_update",),
+	"Setup ERPNext": ("press.press.doctype.site.erpnext_site.process_setup_erpnext_site_job_update",),
+	"Restore Site Tables": (f"{SITE}.process_restore_tables_job_update",),
+	"Add User to Proxy": (f"{BENCH}.process_add_ssh_user_job_update",),
+	"Remove User from Proxy": (f"{BENCH}.process_remove_ssh_user_job_update",),
+	("Add User to ProxySQL", "Site Database User"): (f"{SITE_DATABASE_USER}.process_job_update",),
+	("Remove User from ProxySQL", "Site Database User"): (f"{SITE_DATABASE_USER}.process_job_update",),
+	"Reload NGINX": ("press.press.doctype.proxy_server.proxy_server.process_update_nginx_job_update",),
+	"Move Site to Bench": (f"{SITE}.process_move_site_to_bench_job_update",),
+	"Patch App": ("press.press.doctype.app_patch.app_patch.AppPatch.process_patch_app",),
+	"Run Remote Builder": (
+		"press.press.doctype.deploy_candidate_build.deploy_candidate_build.DeployCandidateBuild.process_run_build",
+	),
+	"Create User": (f"{SITE}.process_create_user_job_update",),
+	"Complete Setup Wizard": (f"{SITE}.process_complete_setup_wizard_job_update",),
+	"Update Bench In Place": (f"{BENCH}.Bench.process_update_inplace",),
+	"Recover Update In Place": (f"{BENCH}.Bench.process_recover_update_inplace",),
+	"Fetch Database Table Schema": (f"{SITE}.process_fetch_database_table_schema_job_update",),
+	"Create Database User": (f"{SITE_DATABASE_USER}.process_job_update",),
+	"Remove Database User": (f"{SITE_DATABASE_USER}.process_job_update",),
+	"Modify Database User Permissions": (f"{SITE_DATABASE_USER}.process_job_update",),
+	"Physical Restore Database": (f"{PHYSICAL_BACKUP_RESTORATION}.process_job_update",),
+	("Deactivate Site", "Site Update"): (f"{SITE_UPDATE}.process_deactivate_site_job_update",),
+	("Activate Site", "Site Update"): (f"{SITE_UPDATE}.process_activate_site_job_update",),
+	("Deactivate Site", "Site Backup"): (f"{SITE_BACKUP}.process_deactivate_site_job_update",),
+	("Deactivate Site", "Physical Backup Restoration"): (
+		f"{PHYSICAL_BACKUP_RESTORATION}.process_physical_backup_restoration_deactivate_site_job_update",
+	),
+	"Add Domain": (f"{SITE}.process_add_domain_job_update",),
+}
+
+# Resolved callbacks, along with whether they accept `response_data`
+_resolved: dict[str, tuple[Callable, bool]] = {}
+
+
+def run_callbacks(job: AgentJob, response_data: dict | None = None):
+	for callback, accepts_response_data in get_callbacks(job):
+		if accepts_response_data:
+			callback(job, response_data=response_data)
+		else:
+			callback(job)
+
+
+def get_callbacks(job: AgentJob) -> list[tuple[Callable, bool]]:
+	paths = CALLBACKS.get((job.job_type, job.reference_doctype)) or CALLBACKS.get(job.job_type) or ()
+	return [resolve(path) for path in paths]
+
+
+def resolve(path: str) -> tuple[Callable, bool]:
+	if path not in _resolved:
+		callback = import_attribute(path)
+		accepts_response_data = "response_data" in inspect.signature(callback).parameters
+		_resolved[path] = (callback, accepts_response_data)
+	return _resolved[path]
+
+
+def import_attribute(path: str):
+	"""Import `path` which can point to a module level function or an attribute of a class in the module"""
+	parts = path.split(".")
+	for index in range(len(parts) - 1, 0, -1):
+		module = ".".join(parts[:index])
+		try:
+			attribute = importlib.import_module(module)
+		except ModuleNotFoundError as e:
+			if e.name != module:
+				raise
+			continue
+		for part in parts[index:]:
+			attribute = getattr(attribute, part)
+		return attribute
+	raise ImportError(f"Could not import {path}")
+
+
+def process_new_site_from_backup_restore_job_update(job: AgentJob):
+	from press.press.doctype.site.site import process_restore_job_update
+
+	process_restore_job_update(job, force=True)
+
+
+def clear_cache():
+	_resolved.clear()
@@ -14,7 +14,14 @@ import responses
 from frappe.model.naming import make_autoname
 
 from press.agent import Agent
-from press.press.doctype.agent_job.agent_job import AgentJob, lock_doc_updated_by_job
+from press.press.doctype.agent_job.agent_job import (
+	AGENT_JOB_POLL_CURSOR_KEY,
+	AgentCallbackException,
+	AgentJob,
+	handle_polled_jobs,
+	lock_doc_updated_by_job,
+	poll_pending_jobs_server,
+)
 from press.press.doctype.site.test_site import create_test_bench, create_test_site
 from press.press.doctype.team.test_team import create_test_press_admin_team
 from press.utils.test import foreground_enqueue, foreground_enqueue_doc
@@ -274,3 +281,90 @@ class TestAgentJob(unittest.TestCase):
 		self.assertEqual(in_execution_job.name, job.name)
 
 		frappe.db.set_single_value("Press Settings", "disable_agent_job_deduplication", True)
+
+	@patch("press.press.doctype.agent_job.agent_job.retry_undelivered_jobs", new=Mock())
+	@patch("press.press.doctype.agent_job.agent_job.is_delta_polling_enabled", new=lambda: True)
+	@patch("press.press.doctype.agent_job.agent_job.handle_polled_jobs")
+	def test_delta_polling_handles_only_changed_pending_jobs(self, mock_handle_polled_jobs):
+		site = create_test_site()
+		job = frappe.get_last_doc("Agent Job", {"job_type": "New Site", "site": site.name})
+		job.db_set({"status": "Pending", "job_id": 42})
+
+		frappe.cache.hset(AGENT_JOB_POLL_CURSOR_KEY, job.server, 10)
+		frappe.cache.set_value(f"agent_job_poll_reconciled:{job.server}", 1, expires_in_sec=60)
+		changes = {
+			"cursor": 12,
+			"jobs": [{"id": 42, "status": "Success"}, {"id": 7, "status": "Success"}],
+			"has_more": False,
+		}
+		with patch.object(Agent, "get_jobs_changed_since", return_value=changes) as mock_changes:
+			poll_pending_jobs_server(frappe._dict(server=job.server, server_type=job.server_type))
+
+		mock_changes.assert_called_once_with(10)
+		polled_jobs = mock_handle_polled_jobs.call_args[0][0]
+		self.assertEqual([polled_job["id"] for polled_job in polled_jobs], [42])
+		self.assertEqual(frappe.cache.hget(AGENT_JOB_POLL_CURSOR_KEY, job.server), 12)
+		frappe.cache.hdel(AGENT_JOB_POLL_CURSOR_KEY, job.server)
+
+	@patch("press.press.doctype.agent_job.agent_job.publish_update", new=Mock())
+	@patch("press.press.doctype.agent_job.agent_job.process_job_updates")
+	def test_handle_polled_jobs_applies_updates_in_bulk(self, mock_process_job_updates):
+		job, polled_job, pending_job = create_test_polled_job(43, "Success")
+		handle_polled_jobs([polled_job], [pending_job])
+
+		self.assertEqual(frappe.db.get_value("Agent Job", job.name, "status"), "Success")
+		self.assertEqual(frappe.db.get_value("Agent Job", job.name, "output"), "done")
+		self.assertEqual(
+			set(frappe.get_all("Agent Job Step", {"agent_job": job.name}, pluck="status")), {"Success"}
+		)
+		mock_process_job_updates.assert_called_once_with(job.name, polled_job)
+
+	@patch("press.press.doctype.agent_job.agent_job.publish_update", new=Mock())
+	def test_finished_job_is_polled_again_if_callbacks_dont_complete(self):
+		job, polled_job, pending_job = create_test_polled_job(44, "Success")
+		step_statuses = frappe.get_all("Agent Job Step", {"agent_job": job.name}, pluck="status")
+
+		# Worker is killed while callbacks run, nothing after the bulk updates is committed
+		with patch(
+			"press.press.doctype.agent_job.agent_job.process_job_updates", side_effect=KeyboardInterrupt
+		), self.assertRaises(KeyboardInterrupt):
+			handle_polled_jobs([polled_job], [pending_job])
+		frappe.db.rollback()
+
+		self.assertEqual(frappe.db.get_value("Agent Job", job.name, "status"), "Running")
+		self.assertEqual(
+			frappe.get_all("Agent Job Step", {"agent_job": job.name}, pluck="status"), step_statuses
+		)
+
+		with patch("press.press.doctype.agent_job.agent_job.process_job_updates") as mock_process_job_updates:
+			handle_polled_jobs([polled_job], [pending_job])
+		mock_process_job_updates.assert_called_once_with(job.name, polled_job)
+		self.assertEqual(frappe.db.get_value("Agent Job", job.name, "status"), "Success")
+
+	@patch("press.press.doctype.agent_job.agent_job.publish_update", new=Mock())
+	def test_failed_callback_reverts_running_job(self):
+		job, polled_job, pending_job = create_test_polled_job(45, "Running", from_status="Pending")
+		step_statuses = frappe.get_all("Agent Job Step", {"agent_job": job.name}, pluck="status")
+
+		with patch(
+			"press.press.doctype.agent_job.agent_job.process_job_updates",
+			side_effect=AgentCallbackException,
+		):
+			handle_polled_jobs([polled_job], [pending_job])
+
+		self.assertEqual(frappe.db.get_value("Agent Job", job.name, "status"), "Pending")
+		self.assertEqual(frappe.db.get_value("Agent Job", job.name, "callback_failure_count"), 1)
+		self.assertEqual(
+			frappe.get_all("Agent Job Step", {"agent_job": job.name}, pluck="status"), step_statuses
+		)
+
+	def test_all_registered_callbacks_resolve(self):
+		from press.press.doctype.agent_job.agent_job_callbacks import CALLBACKS, resolve
+
+		for paths in CALLBACKS.values():
+			for path in paths:
+				callback, _ = resolve(path)
+				self.assertTrue(callable(callback), path)
+
+		_, accepts_response_data = resolve(CALLBACKS["Run Remote Builder"][0])
+		self.assertTrue(accepts_response_data)
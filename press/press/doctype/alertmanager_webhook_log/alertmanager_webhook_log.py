@@ -9,6 +9,7 @@ from typing import TYPE_CHECKING
 import frappe
 from frappe.core.utils import find
 from frappe.model.document import Document
+from frappe.query_builder.functions import Count
 from frappe.utils import get_url_to_form
 from frappe.utils.background_jobs import enqueue_doc
 from frappe.utils.data import add_to_date
@@ -53,11 +54,15 @@ class AlertmanagerWebhookLog(Document):
 	if TYPE_CHECKING:
 		from frappe.types import DF
 
+		from press.press.doctype.alertmanager_webhook_log_instance.alertmanager_webhook_log_instance import (
+			AlertmanagerWebhookLogInstance,
+		)
 		from press.press.doctype.alertmanager_webhook_log_reaction_job.alertmanager_webhook_log_reaction_job import (
 			AlertmanagerWebhookLogReactionJob,
 		)
 
 		alert: DF.Link
+		alert_instances: DF.Table[AlertmanagerWebhookLogInstance]
 		combined_alerts: DF.Int
 		common_labels: DF.Code
 		external_url: DF.Data
@@ -78,6 +83,9 @@ class AlertmanagerWebhookLog(Document):
 		table = frappe.qb.DocType("Alertmanager Webhook Log")
 		frappe.db.delete(table, filters=(table.modified < (Now() - Interval(days=days))))
 
+		instance = frappe.qb.DocType("Alertmanager Webhook Log Instance")
+		frappe.db.delete(instance, filters=(instance.timestamp < (Now() - Interval(days=days))))
+
 	def validate(self):
 		self.parsed = json.loads(self.payload)
 		self.alert = self.parsed["groupLabels"].get("alertname")
@@ -96,6 +104,31 @@ class AlertmanagerWebhookLog(Document):
 
 		self.payload = json.dumps(self.parsed, indent=2, sort_keys=True)
 
+		if self.is_new():
+			self.set_alert_instances()
+
+	def set_alert_instances(self):
+		"""Normalise alerts in the payload so that instances can be queried without parsing payloads"""
+		timestamp = frappe.utils.now_datetime()
+		seen = set()
+		for alert in self.parsed["alerts"]:
+			labels = alert["labels"]
+			instance = labels.get("instance")
+			if not instance or instance in seen:
+				continue
+			seen.add(instance)
+			self.append(
+				"alert_instances",
+				{
+					"alert": self.alert,
+					"scope": self.incident_scope,
+					"instance": instance,
+					"status": (alert.get("status") or self.status).capitalize(),
+					"timestamp": timestamp,
+					"labels": json.dumps(labels, indent=2, sort_keys=True),
+				},
+			)
+
 	@property
 	def incident_scope(self):
 		return self.parsed_group_labels.get(INCIDENT_SCOPE)
@@ -142,48 +175,36 @@ class AlertmanagerWebhookLog(Document):
 		return {}
 
 	def react(self):
-		for instance in self.get_instances_from_alerts_payload(self.payload):
+		for instance in self.get_instances():
 			reaction_job = self.react_for_instance(instance)
 			if reaction_job:
 				self.append("reaction_jobs", reaction_job)
 		self.save()
 
-	def get_instances_from_alerts_payload(self, payload: str) -> set[str]:
-		instances = []
-		payload = json.loads(payload)
-		instances.extend([alert["labels"]["instance"] for alert in payload["alerts"]])  # sites
-		return set(instances)
+	def get_instances(self) -> list[str]:
+		return [row.instance for row in self.alert_instances]  # sites
 
 	def get_labels_for_instance(self, instance: str) -> dict:
-		# Find first alert that matches the instance
-		payload = json.loads(self.payload)
-		alert = find(payload["alerts"], lambda x: x["labels"]["instance"] == instance)
-		if alert:
-			return alert["labels"]
+		row = find(self.alert_instances, lambda x: x.instance == instance)
+		if row:
+			return json.loads(row.labels)
 		return {}
 
-	def get_past_alert_instances(self):
-		past_alerts = frappe.get_all(
-			self.doctype,
-			fields=["payload"],
-			filters={
-				"alert": self.alert,
-				"severity": self.severity,
-				"status": self.status,
-				"group_key": ("like", f"%{self.incident_scope}%"),
-				"modified": [
-					">",
-					add_to_date(frappe.utils.now(), hours=-self.get_repeat_interval()),
-				],
-			},
-			group_by="group_key",
-			ignore_ifnull=True,
-		)  # get site down alerts grouped by benches
-
-		instances = []
-		for alert in past_alerts:
-			instances.extend(self.get_instances_from_alerts_payload(alert["payload"]))
-		return set(instances)
+	def get_past_alert_instance_count(self) -> int:
+		"""Number of distinct instances this alert fired for in the scope, within the repeat interval"""
+		table = frappe.qb.DocType("Alertmanager Webhook Log Instance")
+		since = add_to_date(frappe.utils.now_datetime(), hours=-self.get_repeat_interval())
+		return (
+			frappe.qb.from_(table)
+			.select(Count(table.instance).distinct())
+			.where(
+				(table.alert == self.alert)
+				& (table.scope == self.incident_scope)
+				& (table.status == self.status)
+				& (table.timestamp > since)
+			)
+			.run()[0][0]
+		)
 
 	def total_instances(self) -> int:
 		return frappe.db.count(
@@ -201,8 +222,7 @@ class AlertmanagerWebhookLog(Document):
 		if find(rule.ignore_on_clusters, lambda x: x.cluster == cluster):
 			return
 
-		instances = self.get_past_alert_instances()
-		if len(instances) > min(0.4 * self.total_instances(), 15):
+		if self.get_past_alert_instance_count() > min(0.4 * self.total_instances(), 15):
 			self.create_incident()
 
 	def get_repeat_interval(self):
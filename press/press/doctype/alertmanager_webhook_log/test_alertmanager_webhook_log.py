@@ -87,4 +87,22 @@ def create_test_alertmanager_webhook_log(
 
 
 class TestAlertmanagerWebhookLog(unittest.TestCase):
-	pass
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_alert_instances_are_normalised_on_insert(self):
+		alert = create_test_prometheus_alert_rule()
+		site = create_test_site()
+		log = create_test_alertmanager_webhook_log(alert=alert, site=site)
+
+		self.assertEqual(len(log.alert_instances), 1)
+		row = log.alert_instances[0]
+		self.assertEqual(row.instance, site.name)
+		self.assertEqual(row.scope, site.server)
+		self.assertEqual(row.status, "Firing")
+		self.assertEqual(log.get_labels_for_instance(site.name)["bench"], site.bench)
+
+		site2 = create_test_site(server=site.server)
+		create_test_alertmanager_webhook_log(alert=alert, site=site2)
+		create_test_alertmanager_webhook_log(alert=alert, site=site2, status="resolved")
+		self.assertEqual(log.get_past_alert_instance_count(), 2)
@@ -0,0 +1,35 @@
+# Copyright (c) 2026, Frappe and contributors
+# For license information, please see license.txt
+from __future__ import annotations
+
+import frappe
+from frappe.model.document import Document
+
+
+class AlertmanagerWebhookLogInstance(Document):
+	# begin: auto-generated types
+	# This code is auto-generated. Do not modify anything in this block.
+
+	from typing import TYPE_CHECKING
+
+	if TYPE_CHECKING:
+		from frappe.types import DF
+
+		alert: DF.Link | None
+		instance: DF.Data | None
+		labels: DF.Code | None
+		parent: DF.Data
+		parentfield: DF.Data
+		parenttype: DF.Data
+		scope: DF.Data | None
+		status: DF.Literal["Firing", "Resolved"]
+		timestamp: DF.Datetime | None
+	# end: auto-generated types
+
+	pass
+
+
+def on_doctype_update():
+	# Incident detection counts distinct instances of an alert in a scope over a recent window
+	frappe.db.add_index("Alertmanager Webhook Log Instance", ["alert", "scope", "status", "timestamp"])
+	frappe.db.add_index("Alertmanager Webhook Log Instance", ["timestamp"])
@@ -1,10 +1,12 @@
 # Copyright (c) 2020, Frappe and contributors
 # For license information, please see license.txt
 
+import fcntl
 import os
 import shlex
 import shutil
 import subprocess
+from contextlib import contextmanager, suppress
 from datetime import datetime
 from typing import Optional, TypedDict
 
@@ -121,39 +123,47 @@ class AppRelease(Document):
 		if self.cloned and not force:
 			return
 
+		fetch_args = self.prepare_clone(force)
+		try:
+			output = fetch_release(**fetch_args)
+		except subprocess.CalledProcessError as e:
+			self.handle_clone_error(e, fetch_args["url"])
+		self.finish_clone(output)
+
+	def prepare_clone(self, force: bool = False) -> dict:
+		"""Sets up the clone directory, returns the arguments for `fetch_release`"""
 		self._set_prepared_clone_directory(self.cloned and force)
 		self._set_code_server_url()
-		self._clone_repo()
+
+		source: "AppSource" = frappe.get_doc("App Source", self.source)
+		return dict(
+			store=get_source_store(self.app, self.source),
+			url=source.get_repo_url(),
+			branch=source.branch,
+			hash=self.hash,
+			clone_directory=self.clone_directory,
+		)
+
+	def finish_clone(self, output: str, syntax_error: Optional[str] = None):  # noqa
+		self.output = output
 		self.cloned = True
-		self.validate_repo()
+		self.validate_repo(syntax_error)
 		self.save(ignore_permissions=True)
 
-	def validate_repo(self):
+	def validate_repo(self, syntax_error: Optional[str] = None):  # noqa
 		if self.invalid_release or not self.clone_directory or not os.path.isdir(self.clone_directory):
 			return
 
-		if (syntax_error := check_python_syntax(self.clone_directory)) or (
-			syntax_error := check_pyproject_syntax(self.clone_directory)
-		):
+		if syntax_error is None:
+			syntax_error = get_syntax_error(self.clone_directory)
+
+		if syntax_error:
 			self.set_invalid(syntax_error)
 
 	def set_invalid(self, reason: str):
 		self.invalid_release = True
 		self.invalidation_reason = reason
 
-	def run(self, command):
-		try:
-			return run(command, self.clone_directory)
-		except Exception as e:
-			self.cleanup()
-			log_error(
-				"App Release Command Exception",
-				command=command,
-				output=e.output.decode(),
-				doc=self,
-			)
-			raise e
-
 	def set_clone_directory(self):
 		clone_directory = frappe.db.get_single_value("Press Settings", "clone_directory")
 		self.clone_directory = os.path.join(clone_directory, self.app, self.source, self.hash[:10])
@@ -173,31 +183,23 @@ class AppRelease(Document):
 		)
 		self.code_server_url = code_server_url
 
-	def _clone_repo(self):
-		source: "AppSource" = frappe.get_doc("App Source", self.source)
-		url = source.get_repo_url()
-
-		self.output = ""
-		self.output += self.run("git init")
-		self.output += self.run(f"git checkout -B {source.branch}")
-		origin_exists = self.run("git remote").strip() == "origin"
-		if origin_exists:
-			self.output += self.run(f"git remote set-url origin {url}")
-		else:
-			self.output += self.run(f"git remote add origin {url}")
-		self.output += self.run("git config credential.helper ''")
-
-		try:
-			self.output += self.run(f"git fetch --depth 1 origin {self.hash}")
-		except subprocess.CalledProcessError as e:
-			stdout = e.stdout.decode("utf-8")
-
-			if not (
-				"fatal: could not read Username for 'https://github.com'" in stdout
-				or "Repository not found." in stdout
-			):
-				raise e
+	def handle_clone_error(self, e: subprocess.CalledProcessError, url: str):
+		# The url may have an access token, keep it out of logs and tracebacks
+		e.cmd = [arg.replace(url, "<repository url>") for arg in e.cmd]
+		output = e.output.decode("utf-8").replace(url, "<repository url>")
+		e.output = output.encode()
+		self.cleanup()
+		log_error(
+			"App Release Command Exception",
+			command=shlex.join(e.cmd),
+			output=output,
+			doc=self,
+		)
 
+		if (
+			"fatal: could not read Username for 'https://github.com'" in output
+			or "Repository not found." in output
+		):
 			"""
 			Do not edit without updating deploy_notifications.py
 
@@ -209,10 +211,9 @@ class AppRelease(Document):
 			- If token is not received _get_repo_url throws
 			- Hence token was received, but app still cannot be cloned
 			"""
-			raise Exception("Repository could not be fetched", self.app)  # noqa
+			raise Exception("Repository could not be fetched", self.app)
 
-		self.output += self.run(f"git checkout {self.hash}")
-		self.output += self.run(f"git reset --hard {self.hash}")
+		raise e
 
 	def _get_repo_url(self, source: "AppSource") -> str:
 		if not source.github_installation_id:
@@ -232,9 +233,19 @@ class AppRelease(Document):
 	@frappe.whitelist()
 	def cleanup(self):
 		self.on_trash()
+		self.remove_from_store()
 		self.cloned = False
 		self.save(ignore_permissions=True)
 
+	def remove_from_store(self):
+		"""Let objects used only by this release be garbage collected from the store of the source"""
+		store = get_source_store_path(self.app, self.source)
+		if not os.path.exists(store):
+			return
+
+		with suppress(subprocess.CalledProcessError), lock_source_store(store):
+			run(f"git update-ref -d {get_release_ref(self.hash)}", store)
+
 	def create_release_differences(self):
 		releases = frappe.db.sql(
 			"""
@@ -399,6 +410,82 @@ def get_prepared_clone_directory(
 	return hash_directory
 
 
+def get_source_store_path(app: str, source: str) -> str:
+	clone_directory: str = frappe.db.get_single_value("Press Settings", "clone_directory")
+	return os.path.join(clone_directory, app, source, "store.git")
+
+
+def get_source_store(app: str, source: str) -> str:
+	"""
+	Bare repository with the objects of all cloned releases of `source`
+
+	Each release is kept alive by a ref, so releases of the same source share
+	objects and only new objects are fetched for a new release.
+	"""
+	store = get_source_store_path(app, source)
+	if os.path.exists(os.path.join(store, "HEAD")):
+		return store
+
+	with lock_source_store(store):
+		if not os.path.exists(os.path.join(store, "HEAD")):
+			run("git init --bare", store)
+			run("git config credential.helper ''", store)
+	return store
+
+
+@contextmanager
+def lock_source_store(store: str):
+	"""
+	Hold an exclusive lock on the store while writing to it
+
+	Builds of different release groups write to the store of a source at the same time,
+	and git fails right away instead of waiting if its own lock files (e.g. shallow.lock)
+	are taken. Works across threads and processes on the same host.
+	"""
+	os.makedirs(store, exist_ok=True)
+	with open(os.path.join(store, "press.lock"), "w") as lock:
+		fcntl.flock(lock, fcntl.LOCK_EX)
+		try:
+			yield
+		finally:
+			fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def get_release_ref(hash: str) -> str:
+	return f"refs/releases/{hash}"
+
+
+def fetch_release(store: str, url: str, branch: str, hash: str, clone_directory: str) -> str:
+	"""
+	Fetch commit `hash` into the store of its source and check it out in `clone_directory`
+
+	Only runs git, without touching the database, so it can be called outside
+	the main thread. Only objects missing from the store are fetched from the remote.
+	"""
+	with lock_source_store(store):
+		output = run(f"git fetch --depth 1 {url} +{hash}:{get_release_ref(hash)}", store)
+
+	# The clone is copied into build contexts, so it gets its own objects instead of alternates
+	output += run("git init", clone_directory)
+	output += run(f"git checkout -B {branch}", clone_directory)
+	output += run(f"git fetch --depth 1 file://{store} {hash}", clone_directory)
+	output += run(f"git checkout {hash}", clone_directory)
+	output += run(f"git reset --hard {hash}", clone_directory)
+	return output
+
+
+def add_release_to_store(store: str, release: AppReleaseDict):
+	"""Make sure the commit of `release` is in the store, releases cloned before the store are fetched locally"""
+	try:
+		run(f"git cat-file -e {release['hash']}^{{commit}}", store)
+	except subprocess.CalledProcessError:
+		with lock_source_store(store):
+			run(
+				f"git fetch --depth 1 file://{release['clone_directory']} +{release['hash']}:{get_release_ref(release['hash'])}",
+				store,
+			)
+
+
 def get_changed_files_between_hashes(
 	source: str, deployed_hash: str, update_hash: str
 ) -> Optional[tuple[list[str], AppReleasePair]]:  # noqa
@@ -422,26 +509,12 @@ def get_changed_files_between_hashes(
 		release_doc: AppRelease = frappe.get_doc("App Release", release["name"])
 		release_doc._clone()
 
-	cwd = deployed_release["clone_directory"]
-
-	"""
-	Setting remote and fetching alters .git contents, hence it has to be
-	restored to before the commands had been run. Without this layer will
-	be rebuilt.
-	"""
-
-	# Save repo state
-	run("cp -r .git .git.bak", cwd)
-
-	# Calculate diff against local remote
-	run(f"git remote add -f diff_temp {update_release['clone_directory']}", cwd)
-	run(f"git fetch --depth 1 diff_temp {update_hash}", cwd)
-	diff = run(f"git diff --name-only {deployed_hash} {update_hash}", cwd)
-
-	# Restore repo state
-	run("rm -rf .git", cwd)
-	run("mv .git.bak .git", cwd)
+	# Diff in the store of the source, so the .git of the clones isn't touched
+	store = get_source_store(frappe.db.get_value("App Source", source, "app"), source)
+	for release in [deployed_release, update_release]:
+		add_release_to_store(store, release)
 
+	diff = run(f"git diff --name-only {deployed_hash} {update_hash}", store)
 	return diff.splitlines(), dict(old=deployed_release, new=update_release)
 
 
@@ -480,6 +553,10 @@ def run(command, cwd):
 	return subprocess.check_output(shlex.split(command), stderr=subprocess.STDOUT, cwd=cwd).decode()
 
 
+def get_syntax_error(dirpath: str) -> str:
+	return check_python_syntax(dirpath) or check_pyproject_syntax(dirpath)
+
+
 def check_python_syntax(dirpath: str) -> str:
 	"""
 	Script `compileall` will compile all the Python files
@@ -25,6 +25,7 @@ from press.press.doctype.bench_shell_log.bench_shell_log import (
 	create_bench_shell_log,
 )
 from press.press.doctype.site.site import Site
+from press.press.doctype.site_update.site_update import on_bench_status_change
 from press.utils import SupervisorProcess, flatten, log_error, parse_supervisor_status
 from press.utils.webhook import create_webhook_event
 
@@ -354,6 +355,8 @@ class Bench(Document):
 
 	def on_update(self):
 		self.update_bench_config()
+		if self.has_value_changed("status"):
+			on_bench_status_change(self.name)
 		if self.has_value_changed("status") and self.team != "Administrator":
 			create_webhook_event("Bench Status Update", self, self.team)
 
@@ -1012,6 +1015,7 @@ def process_new_bench_job_update(job):
 		return
 
 	frappe.db.set_value("Bench", job.bench, "status", updated_status)
+	on_bench_status_change(job.bench)
 	if bench.team != "Administrator":
 		bench.status = updated_status  # just to ensure the status got changed in webhook payload, reload_doc is costly here
 		create_webhook_event("Bench Status Update", bench, bench.team)
@@ -1077,6 +1081,7 @@ def process_archive_bench_job_update(job):
 
 	if updated_status != bench.status:
 		frappe.db.set_value("Bench", job.bench, "status", updated_status)
+		on_bench_status_change(job.bench)
 		is_ssh_proxy_setup = frappe.db.get_value("Bench", job.bench, "is_ssh_proxy_setup")
 		if updated_status == "Archived" and is_ssh_proxy_setup:
 			frappe.get_doc("Bench", job.bench).remove_ssh_user()
@@ -0,0 +1,153 @@
+"""
+Build context packaging.
+
+The build context is a gzipped tarball of the build directory. Apps make up
+almost all of it and rarely change between builds, so each app release is
+archived once into a content-addressed part. The context of a build is the
+concatenation of the gzipped parts:
+
+- the build directory without apps (Dockerfile, config files, keys)
+- one part per app release, reused across builds
+- the end of archive marker
+
+Concatenated gzip members decompress into a single stream, so the uploaded
+file is a regular `.tar.gz` for the build server.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import tarfile
+import time
+from collections.abc import Callable, Iterable
+
+CONTEXT_CACHE_DIRECTORY = ".context"
+CONTEXT_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+APP_DIRECTORIES = ("apps", "app_updates")
+COMPRESS_LEVEL = 5
+
+TarFilter = Callable[[tarfile.TarInfo], tarfile.TarInfo | None]
+
+
+def link_or_copy(source: str, target: str):
+	try:
+		os.link(source, target)
+	except OSError:
+		# Cross device or unsupported file system
+		shutil.copy2(source, target)
+
+
+def link_tree(source: str, target: str):
+	"""Same as `shutil.copytree`, but files are hardlinked instead of copied when possible"""
+	shutil.copytree(source, target, symlinks=True, copy_function=link_or_copy)
+
+
+def get_cache_directory(build_directory: str) -> str:
+	cache_directory = os.path.join(build_directory, CONTEXT_CACHE_DIRECTORY)
+	os.makedirs(cache_directory, exist_ok=True)
+	return cache_directory
+
+
+def get_release_part(
+	cache_directory: str,
+	release: str,
+	source: str,
+	arcname: str,
+	filter: TarFilter | None = None,
+) -> str:
+	"""Path to the archived part of `source` (clone of `release`), archiving it if it isn't cached"""
+	key = f"{release}:{arcname}:{filter.__name__ if filter else ''}"
+	path = os.path.join(cache_directory, f"{hashlib.sha256(key.encode()).hexdigest()}.tar.gz")
+	if os.path.exists(path):
+		# Keep parts used by recent builds around
+		os.utime(path)
+		return path
+
+	temporary_path = f"{path}.{os.getpid()}.tmp"
+	try:
+		with open(temporary_path, "wb") as file:
+			write_part(file, source, arcname, filter)
+		os.replace(temporary_path, path)
+	finally:
+		if os.path.exists(temporary_path):
+			os.remove(temporary_path)
+	return path
+
+
+def write_part(
+	file: io.IOBase,
+	source: str,
+	arcname: str,
+	filter: TarFilter | None = None,
+	exclude: Iterable[str] = (),
+):
+	"""Write gzipped tar entries of `source` to `file`, without the end of archive marker"""
+	exclude = set(exclude)
+
+	def _filter(tarinfo: tarfile.TarInfo):
+		parts = tarinfo.name.split("/")
+		if len(parts) > 1 and parts[0] == "." and parts[1] in exclude:
+			return None
+		return filter(tarinfo) if filter else tarinfo
+
+	with gzip.GzipFile(fileobj=file, mode="wb", compresslevel=COMPRESS_LEVEL, mtime=0) as gz:
+		tar = tarfile.open(fileobj=gz, mode="w")  # noqa: SIM115
+		tar.add(source, arcname=arcname, filter=_filter)
+		# Not closing the tarfile skips the end of archive marker, which is added once after all parts
+
+
+def get_end_part() -> bytes:
+	buffer = io.BytesIO()
+	with gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) as gz:
+		gz.write(tarfile.NUL * tarfile.BLOCKSIZE * 2)
+	return buffer.getvalue()
+
+
+def cleanup_cache_directory(build_directory: str):
+	"""Remove parts that no build has used for a while"""
+	cache_directory = os.path.join(build_directory, CONTEXT_CACHE_DIRECTORY)
+	if not os.path.isdir(cache_directory):
+		return
+
+	threshold = time.time() - CONTEXT_CACHE_MAX_AGE
+	for entry in os.scandir(cache_directory):
+		if entry.stat().st_mtime < threshold:
+			os.remove(entry.path)
+
+
+class BuildContextReader(io.RawIOBase):
+	"""Reads parts (bytes or file paths) one after the other, as if they were a single file"""
+
+	name = "build_context.tar.gz"
+
+	def __init__(self, parts: list[bytes | str]):
+		self.parts = list(parts)
+		self.current: io.IOBase | None = None
+
+	def readable(self):
+		return True
+
+	def readinto(self, buffer) -> int:
+		while True:
+			if self.current is None:
+				if not self.parts:
+					return 0
+				part = self.parts.pop(0)
+				self.current = io.BytesIO(part) if isinstance(part, bytes) else open(part, "rb")  # noqa: SIM115
+
+			size = self.current.readinto(buffer)
+			if size:
+				return size
+
+			self.current.close()
+			self.current = None
+
+	def close(self):
+		if self.current:
+			self.current.close()
+			self.current = None
+		super().close()
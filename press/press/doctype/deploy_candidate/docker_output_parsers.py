@@ -324,3 +324,37 @@ class UploadStepUpdater:
 		self.dc.save(ignore_version=True, ignore_permissions=True)
 		if commit:
 			frappe.db.commit()
+
+
+class BuildStepWriter:
+	"""
+	Buffers updates to build steps that progress concurrently (e.g. app
+	clones) and writes them with a single save of the Deploy Candidate Build,
+	at most once every `interval` seconds.
+
+	Only to be used from the thread that owns the database connection.
+	"""
+
+	def __init__(self, dc: "DeployCandidateBuild", interval: float = 1.0) -> None:
+		self.dc = dc
+		self.interval = interval
+		self.last_updated = now_datetime()
+		self.pending = False
+
+	def update(self, step: "DeployCandidateBuildStep | None", **values):
+		if not step:
+			return
+
+		step.update(values)
+		self.pending = True
+
+		if (now_datetime() - self.last_updated).total_seconds() >= self.interval:
+			self.flush()
+
+	def flush(self):
+		if not self.pending:
+			return
+
+		self.dc.save(ignore_version=True, ignore_permissions=True)
+		self.pending = False
+		self.last_updated = now_datetime()
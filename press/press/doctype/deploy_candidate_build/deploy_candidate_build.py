@@ -5,13 +5,17 @@ from __future__ import annotations
 
 import contextlib
 import glob
+import io
 import json
 import os
+import queue
 import re
 import shutil
-import tarfile
+import subprocess
 import tempfile
+import time
 import typing
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from enum import Enum
 from functools import cached_property
@@ -26,16 +30,29 @@ from frappe.utils import rounded
 from tenacity import retry, stop_after_attempt, wait_fixed
 
 from press.agent import Agent
+from press.press.doctype.app_release.app_release import fetch_release, get_syntax_error
+from press.press.doctype.deploy_candidate.build_context import (
+	APP_DIRECTORIES,
+	BuildContextReader,
+	cleanup_cache_directory,
+	get_cache_directory,
+	get_end_part,
+	get_release_part,
+	link_tree,
+	write_part,
+)
 from press.press.doctype.deploy_candidate.deploy_notifications import (
 	create_build_failed_notification,
 )
 from press.press.doctype.deploy_candidate.docker_output_parsers import (
+	BuildStepWriter,
 	DockerBuildOutputParser,
 	UploadStepUpdater,
 )
 from press.press.doctype.deploy_candidate.utils import (
+	PackageManagerFiles,
 	get_build_server,
-	get_package_manager_files,
+	get_package_manager_files_from_repo,
 	is_suspended,
 	load_pyproject,
 )
@@ -47,7 +64,6 @@ if typing.TYPE_CHECKING:
 	from rq.job import Job
 
 	from press.press.doctype.agent_job.agent_job import AgentJob
-	from press.press.doctype.app_release.app_release import AppRelease
 	from press.press.doctype.deploy_candidate.deploy_candidate import DeployCandidate
 	from press.press.doctype.deploy_candidate_app.deploy_candidate_app import (
 		DeployCandidateApp,
@@ -57,6 +73,8 @@ if typing.TYPE_CHECKING:
 # build_duration, pending_duration are Time fields, >= 1 day is invalid
 MAX_DURATION = timedelta(hours=23, minutes=59, seconds=59)
 DISTUTILS_SUPPORTED_VERSION = semantic_version.SimpleSpec("<3.12")
+# Apps cloned, copied and inspected at the same time while preparing the build context
+CLONE_WORKERS = 4
 
 
 class Status(Enum):
@@ -399,69 +417,131 @@ class DeployCandidateBuild(Document):
 
 		return load_pyproject(app, pyproject_path)
 
-	def _clone_release_and_update_step(self, release, step):
-		step.cached = False
-		step.status = "Running"
-		start_time = now()
-		self.save(ignore_version=True)
-
-		release: AppRelease = frappe.get_doc("App Release", release, for_update=True)
-		release._clone(force=True)
-
-		step.duration = get_duration(start_time)
-		step.output = release.output
-		step.status = "Success"
-		return release.clone_directory
-
-	def _clone_app(self, app: DeployCandidateApp):
+	def _get_clone_job(self, app: DeployCandidateApp) -> frappe._dict:
+		"""Everything a clone worker needs, the release is locked and prepared here if it has to be cloned"""
 		step = self.get_step("clone", app.app)
+		step.command = f"git clone {app.app}"
+		job = frappe._dict(app=app.app, release=app.release, step=step, release_doc=None, fetch_args=None)
+
 		source, cloned = frappe.get_value("App Release", app.release, ["clone_directory", "cloned"])
+		if not (cloned and os.path.exists(source)):
+			job.release_doc = frappe.get_doc("App Release", app.release, for_update=True)
+			job.fetch_args = job.release_doc.prepare_clone(force=True)
+			source = job.release_doc.clone_directory
 
-		step.command = f"git clone {app.app}"
+		job.source = source
+		job.target = os.path.join(self.build_directory, "apps", app.app)
+		if app.pullable_release:
+			job.pullable_release = app.pullable_release
+			job.pullable_source = frappe.get_value("App Release", app.pullable_release, "clone_directory")
+		return job
 
-		if cloned and os.path.exists(source):
-			step.cached = True
-			step.status = "Success"
+	def _run_clone_job(self, job: frappe._dict, events: queue.Queue):
+		"""
+		Clones (if needed), copies and inspects an app. Runs in a worker thread,
+		so only git, compileall and the file system are touched here.
+		"""
+		events.put(("start", job, None))
+		try:
+			if job.fetch_args:
+				start_time = time.monotonic()
+				job.output = fetch_release(**job.fetch_args)
+				job.syntax_error = get_syntax_error(job.source)
+				job.duration = float(rounded(time.monotonic() - start_time, 3))
+
+			link_tree(job.source, job.target)
+			if job.pullable_release:
+				# don't know why
+				link_tree(job.pullable_source, os.path.join(self.build_directory, "app_updates", job.app))
+
+			job.app_name = self._get_app_name(job.app)
+			job.pmf = get_package_manager_files_from_repo(job.app, job.target)
+		except Exception as e:
+			events.put(("error", job, e))
 		else:
-			source = self._clone_release_and_update_step(app.release, step)
+			events.put(("done", job, None))
 
-		target = os.path.join(self.build_directory, "apps", app.app)
-		shutil.copytree(source, target, symlinks=True)
+	def _update_clone_step(
+		self, writer: BuildStepWriter, event: str, job: frappe._dict, error: Exception | None
+	):
+		if event == "start" and job.release_doc:
+			writer.update(job.step, cached=False, status="Running")
 
-		if app.pullable_release:
-			source = frappe.get_value("App Release", app.pullable_release, "clone_directory")
-			target = os.path.join(self.build_directory, "app_updates", app.app)
-			# don't know why
-			shutil.copytree(source, target, symlinks=True)
+		elif event == "done" and job.release_doc:
+			job.release_doc.finish_clone(job.output, job.syntax_error)
+			writer.update(job.step, duration=job.duration, output=job.output, status="Success")
 
-		return target
+		elif event == "done":
+			writer.update(job.step, cached=True, status="Success")
 
-	def _clone_repositories(self):
-		repo_path_map = {}
+		elif event == "error":
+			writer.update(job.step, status="Failure")
+			writer.flush()
+			if job.release_doc and isinstance(error, subprocess.CalledProcessError):
+				job.release_doc.handle_clone_error(error, job.fetch_args["url"])
+			raise error
 
-		for app in self.candidate.apps:
-			repo_path_map[app.app] = self._clone_app(app)
-			app.app_name = self._get_app_name(app.app)
+	def _clone_repositories(self, writer: BuildStepWriter) -> PackageManagerFiles:
+		"""
+		Clones, copies and inspects apps in a bounded pool of workers.
 
-		return repo_path_map
+		The database connection belongs to this thread, so releases are loaded
+		before jobs are submitted, and workers report back through `events`.
+		Step updates are written together by a single buffered writer.
+		"""
+		jobs = [self._get_clone_job(app) for app in self.candidate.apps]
+		events = queue.Queue()
 
-	def _run_pre_build_validation(self, pmf):
+		executor = ThreadPoolExecutor(max_workers=CLONE_WORKERS)
+		try:
+			for job in jobs:
+				executor.submit(self._run_clone_job, job, events)
+
+			finished = 0
+			while finished < len(jobs):
+				event, job, error = events.get()
+				self._update_clone_step(writer, event, job, error)
+				finished += event == "done"
+		finally:
+			# Lets running jobs finish, so that no worker writes to the build directory after a failure
+			executor.shutdown(wait=True, cancel_futures=True)
+			writer.flush()
+
+		# (release, clone directory, path in build context) of every app, packaged separately
+		self.context_sources = []
+		pmf = {}
+		for app, job in zip(self.candidate.apps, jobs):
+			app.app_name = job.app_name
+			pmf[app.app] = job.pmf
+			self.context_sources.append((job.release, job.source, f"./apps/{app.app}"))
+			if job.pullable_release:
+				self.context_sources.append(
+					(job.pullable_release, job.pullable_source, f"./app_updates/{app.app}")
+				)
+
+		return pmf
+
+	def _run_pre_build_validation(self, pmf: PackageManagerFiles, writer: BuildStepWriter):
 		step = self.get_step("validate", "pre-build")
-		step.status = "Running"
+		writer.update(step, status="Running")
+		writer.flush()
 		start_time = now()
-		self.save(ignore_version=True)
 
 		try:
 			PreBuildValidations(self.candidate, pmf).validate()
 		except Exception as e:
-			step.output = str(e)
+			writer.update(step, output=str(e), status="Failure")
+			writer.flush()
 			# We need to raise to get traceback in `deploy notifications`
 			raise e
 
-		step.duration = get_duration(start_time)
-		step.output = "Pre-Build validations passed"
-		step.status = "Success"
-		self.save(ignore_version=True)
+		writer.update(
+			step,
+			duration=get_duration(start_time),
+			output="Pre-Build validations passed",
+			status="Success",
+		)
+		writer.flush()
 
 	def add_post_build_steps(self):
 		slugs = []
@@ -656,11 +736,11 @@ class DeployCandidateBuild(Document):
 	)
 	def upload_build_context_for_docker_build(
 		self,
-		context_filepath: str,
+		context_parts: list[bytes | str],
 		build_server: str,
 	):
 		agent = Agent(build_server)
-		with open(context_filepath, "rb") as file:
+		with io.BufferedReader(BuildContextReader(context_parts)) as file:
 			if upload_filename := agent.upload_build_context_for_docker_build(file, self.name):
 				return upload_filename
 
@@ -779,9 +859,9 @@ class DeployCandidateBuild(Document):
 		os.mkdir(self.build_directory)
 
 	def _prepare_build_context(self):
-		repo_path_map = self._clone_repositories()
-		pmf = get_package_manager_files(repo_path_map)
-		self._run_pre_build_validation(pmf)
+		writer = BuildStepWriter(self)
+		pmf = self._clone_repositories(writer)
+		self._run_pre_build_validation(pmf, writer)
 
 		"""
 		Due to dependencies mentioned in an apps pyproject.toml
@@ -827,7 +907,7 @@ class DeployCandidateBuild(Document):
 			lambda x: x.stage_slug == stage_slug and x.step_slug == step_slug,
 		)
 
-	def _upload_build_context(self, context_filepath: str, build_server: str):
+	def _upload_build_context(self, context_parts: list[bytes | str], build_server: str):
 		step = self.get_step("upload", "context") or frappe._dict()
 		step.status = "Running"
 		start_time = now()
@@ -835,7 +915,7 @@ class DeployCandidateBuild(Document):
 
 		try:
 			upload_filename = self.upload_build_context_for_docker_build(
-				context_filepath,
+				context_parts,
 				build_server,
 			)
 		except Exception:
@@ -847,38 +927,38 @@ class DeployCandidateBuild(Document):
 		self.save(ignore_version=True)
 		return upload_filename
 
-	def _package_build_context(self):
+	def _package_build_context(self) -> list[bytes | str]:
+		"""
+		Package the build directory as parts of a single `.tar.gz`, see `build_context`
+
+		App releases are archived once and reused by every build that includes them.
+		"""
 		step = self.get_step("package", "context") or frappe._dict()
 		step.status = "Running"
 		start_time = now()
 		self.save(ignore_version=True)
 
-		def fix_content_permission(tarinfo):
-			tarinfo.uid = 1000
-			tarinfo.gid = 1000
-			return tarinfo
+		content_filter = fix_content_permission if frappe.conf.developer_mode else None
+		base = io.BytesIO()
+		write_part(base, self.build_directory, ".", content_filter, exclude=APP_DIRECTORIES)
 
-		tmp_file_path = tempfile.mkstemp(suffix=".tar.gz")[1]
-		with tarfile.open(tmp_file_path, "w:gz", compresslevel=5) as tar:
-			if frappe.conf.developer_mode:
-				tar.add(self.build_directory, arcname=".", filter=fix_content_permission)
-			else:
-				tar.add(self.build_directory, arcname=".")
+		cache_directory = get_cache_directory(frappe.get_value("Press Settings", None, "build_directory"))
+		parts = [base.getvalue()]
+		for release, source, arcname in self.context_sources:
+			parts.append(get_release_part(cache_directory, release, source, arcname, content_filter))
+		parts.append(get_end_part())
 
 		step.status = "Success"
 		step.duration = get_duration(start_time)
 		self.save(ignore_version=True)
 
-		return tmp_file_path
+		return parts
 
 	def _package_and_upload_context(self):
-		context_filepath = self._package_build_context()
-		context_filename = self._upload_build_context(
-			context_filepath,
+		return self._upload_build_context(
+			self._package_build_context(),
 			self.build_server,
 		)
-		os.remove(context_filepath)
-		return context_filename
 
 	def _run_agent_jobs(self):
 		context_filename = self._package_and_upload_context()
@@ -1368,6 +1448,8 @@ def cleanup_build_directories():
 			frappe.db.rollback()
 			log_error(title="Deploy Candidate Build Cleanup Error", exception=e, doc=doc)
 
+	cleanup_cache_directory(frappe.get_value("Press Settings", None, "build_directory"))
+
 	# Delete all temporary files created by the build process
 	glob_path = os.path.join(tempfile.gettempdir(), f"{tempfile.gettempprefix()}*.tar.gz")
 	six_hours_ago = frappe.utils.add_to_date(None, hours=-6)
@@ -1396,6 +1478,12 @@ def correct_status(dcb_name: str):
 	dcb._stop_and_fail()
 
 
+def fix_content_permission(tarinfo):
+	tarinfo.uid = 1000
+	tarinfo.gid = 1000
+	return tarinfo
+
+
 def throw_no_build_server():
 	frappe.throw(
 		"Server not found to run builds. "
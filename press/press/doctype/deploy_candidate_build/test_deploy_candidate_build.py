@@ -1,9 +1,26 @@
 # Copyright (c) 2025, Frappe and Contributors
 # See license.txt
 
-# import frappe
+import io
+import os
+import tarfile
+import tempfile
+from unittest.mock import Mock
+
+import frappe
 from frappe.tests import IntegrationTestCase, UnitTestCase
 
+from press.press.doctype.deploy_candidate.build_context import (
+	APP_DIRECTORIES,
+	BuildContextReader,
+	get_cache_directory,
+	get_end_part,
+	get_release_part,
+	link_tree,
+	write_part,
+)
+from press.press.doctype.deploy_candidate.docker_output_parsers import BuildStepWriter
+
 # On IntegrationTestCase, the doctype test records and all
 # link-field test record dependencies are recursively loaded
 # Use these module variables to add/remove to/from that list
@@ -17,7 +34,60 @@ class UnitTestDeployCandidateBuild(UnitTestCase):
 	Use this class for testing individual functions and methods.
 	"""
 
-	pass
+	def test_build_context_parts_make_a_single_archive(self):
+		with tempfile.TemporaryDirectory() as root:
+			clone = os.path.join(root, "clone")
+			build = os.path.join(root, "build")
+			os.makedirs(os.path.join(clone, ".git"))
+			os.makedirs(build)
+			for path, content in [
+				(os.path.join(clone, "hooks.py"), "app_name = 'app'"),
+				(os.path.join(clone, ".git", "HEAD"), "ref: refs/heads/main"),
+				(os.path.join(build, "Dockerfile"), "FROM ubuntu"),
+			]:
+				with open(path, "w") as f:
+					f.write(content)
+
+			link_tree(clone, os.path.join(build, "apps", "app"))
+			self.assertEqual(os.stat(os.path.join(build, "apps", "app", "hooks.py")).st_nlink, 2)
+
+			base = io.BytesIO()
+			write_part(base, build, ".", exclude=APP_DIRECTORIES)
+			cache_directory = get_cache_directory(root)
+			part = get_release_part(cache_directory, "release", clone, "./apps/app")
+			self.assertEqual(get_release_part(cache_directory, "release", clone, "./apps/app"), part)
+
+			with io.BufferedReader(BuildContextReader([base.getvalue(), part, get_end_part()])) as file:
+				context = file.read()
+
+			with tarfile.open(fileobj=io.BytesIO(context), mode="r:gz") as tar:
+				self.assertCountEqual(
+					tar.getnames(),
+					[
+						".",
+						"./Dockerfile",
+						"./apps/app",
+						"./apps/app/hooks.py",
+						"./apps/app/.git",
+						"./apps/app/.git/HEAD",
+					],
+				)
+				self.assertEqual(tar.extractfile("./apps/app/hooks.py").read(), b"app_name = 'app'")
+
+	def test_build_step_writer_buffers_updates(self):
+		build = Mock()
+		writer = BuildStepWriter(build, interval=60)
+		steps = [frappe._dict(status="Pending"), frappe._dict(status="Pending")]
+
+		for step in steps:
+			writer.update(step, status="Running")
+		writer.update(None, status="Running")
+		build.save.assert_not_called()
+
+		writer.flush()
+		writer.flush()
+		build.save.assert_called_once()
+		self.assertEqual([step.status for step in steps], ["Running", "Running"])
 
 
 class IntegrationTestDeployCandidateBuild(IntegrationTestCase):
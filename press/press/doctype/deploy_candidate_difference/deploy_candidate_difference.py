@@ -8,6 +8,7 @@ from frappe.core.utils import find
 from frappe.model.document import Document
 
 from press.overrides import get_permission_query_conditions_for_doctype
+from press.press.doctype.site_update.site_update import on_deploy_candidate_difference_insert
 
 
 class DeployCandidateDifference(Document):
@@ -67,6 +68,9 @@ class DeployCandidateDifference(Document):
 
 		self.populate_apps_table()
 
+	def after_insert(self):
+		on_deploy_candidate_difference_insert(self.source)
+
 	def populate_apps_table(self):
 		source_candidate = frappe.get_doc("Deploy Candidate", self.source)
 		destination_candidate = frappe.get_doc("Deploy Candidate", self.destination)
@@ -11,6 +11,14 @@ from frappe.utils.data import fmt_money
 
 from press.api.billing import get_stripe
 from press.api.client import dashboard_whitelist
+from press.press.doctype.invoice_usage_ledger.invoice_usage_ledger import (
+	add_to_pending_usage,
+	clear_pending_usage,
+	get_invoices_with_pending_usage,
+	get_pending_usage,
+	get_usage_key,
+	link_usage_records,
+)
 from press.utils import log_error
 from press.utils.billing import (
 	convert_stripe_money,
@@ -171,6 +179,10 @@ class Invoice(Document):
 		return invoices
 
 	def get_doc(self, doc):
+		if self.apply_pending_usage(save=False):
+			for fieldname in self.dashboard_fields:
+				doc[fieldname] = self.get(fieldname)
+
 		doc.invoice_pdf = self.invoice_pdf or (self.currency == "USD" and self.get_pdf())
 		currency = frappe.get_value("Team", self.team, "currency")
 		price_field = "price_inr" if currency == "INR" else "price_usd"
@@ -234,6 +246,7 @@ class Invoice(Document):
 		if self.type == "Prepaid Credits":
 			return
 
+		self.apply_pending_usage()
 		self.calculate_values()
 
 		if self.total == 0:
@@ -551,41 +564,107 @@ class Invoice(Document):
 					item.description = "Prepaid Credits"
 
 	def add_usage_record(self, usage_record):
+		self.add_usage_records([usage_record])
+
+	def add_usage_records(self, usage_records):
+		"""Add usage records to this invoice, saving it at most once"""
 		if self.type != "Subscription":
 			return
-		# return if this usage_record is already accounted for in an invoice
-		if usage_record.invoice:
-			return
 
-		# return if this usage_record does not fall inside period of invoice
-		usage_record_date = getdate(usage_record.date)
+		# skip usage records already accounted for in an invoice or outside the period of this invoice
 		start = getdate(self.period_start)
 		end = getdate(self.period_end)
-		if not (start <= usage_record_date <= end):
+		usage_records = [
+			usage_record
+			for usage_record in usage_records
+			if not usage_record.invoice and start <= getdate(usage_record.date) <= end
+		]
+		if not usage_records:
 			return
 
-		invoice_item = self.get_invoice_item_for_usage_record(usage_record)
-		# if not found, create a new invoice item
-		if not invoice_item:
-			invoice_item = self.append(
-				"items",
-				{
-					"document_type": usage_record.document_type,
-					"document_name": usage_record.document_name,
-					"plan": usage_record.plan,
-					"quantity": 0,
-					"rate": usage_record.amount,
-					"site": usage_record.site,
-				},
+		if is_incremental_invoice_aggregation_enabled():
+			# Items and totals are updated when the invoice is finalized or read
+			add_to_pending_usage(
+				self.name, [usage_record for usage_record in usage_records if not usage_record.payout]
 			)
+			usage_records = [usage_record for usage_record in usage_records if usage_record.payout]
+			if not usage_records:
+				return
 
-		invoice_item.quantity = (invoice_item.quantity or 0) + 1
+		self.add_usage_records_to_items(usage_records)
+		self.save()
+		link_usage_records(self.name, usage_records)
+
+	def add_usage_records_to_items(self, usage_records):
+		items = self.get_items_by_usage_key()
+		for usage_record in usage_records:
+			key = get_usage_key(
+				usage_record.document_type,
+				usage_record.document_name,
+				usage_record.plan,
+				usage_record.amount,
+				usage_record.site,
+			)
+			# if not found, create a new invoice item
+			if key not in items:
+				items[key] = self.append_usage_item(usage_record, usage_record.amount)
+			items[key].quantity = (items[key].quantity or 0) + 1
+
+			if usage_record.payout:
+				self.payout += usage_record.payout
+
+	def get_items_by_usage_key(self) -> dict:
+		# later rows win, same as get_invoice_item_for_usage_record
+		return {
+			get_usage_key(row.document_type, row.document_name, row.plan, row.rate, row.site): row
+			for row in self.items
+		}
 
-		if usage_record.payout:
-			self.payout += usage_record.payout
+	def append_usage_item(self, usage, rate):
+		return self.append(
+			"items",
+			{
+				"document_type": usage.document_type,
+				"document_name": usage.document_name,
+				"plan": usage.plan,
+				"quantity": 0,
+				"rate": rate,
+				"site": usage.site,
+			},
+		)
 
-		self.save()
-		usage_record.db_set("invoice", self.name)
+	def apply_pending_usage(self, save=True) -> bool:
+		"""
+		Add usage pending in Invoice Usage Ledger to invoice items
+
+		With `save=False` only this instance is updated and totalled, the ledger
+		is left as it is. Returns True if there was pending usage.
+		"""
+		if self.type != "Subscription" or self.docstatus != 0 or self.is_new():
+			return False
+
+		if save:
+			# Lock the invoice before the ledger, same order as `add_to_pending_usage`
+			# so usage recorded concurrently either waits for this or lands before it
+			frappe.db.get_value("Invoice", self.name, "name", for_update=True)
+		pending = get_pending_usage(self.name, for_update=save)
+		if not pending:
+			return False
+
+		items = self.get_items_by_usage_key()
+		for usage in pending:
+			key = get_usage_key(usage.document_type, usage.document_name, usage.plan, usage.rate, usage.site)
+			if key not in items:
+				items[key] = self.append_usage_item(usage, usage.rate)
+			items[key].quantity = (items[key].quantity or 0) + usage.quantity
+
+		if save:
+			self.save()
+			clear_pending_usage([usage.name for usage in pending])
+		else:
+			self.validate_items()
+			self.calculate_values()
+		return True
 
 	def remove_usage_record(self, usage_record):
 		if self.type != "Subscription":
@@ -598,6 +677,9 @@ class Invoice(Document):
 		if usage_record.invoice != self.name:
 			return
 
+		# the usage record may still be pending in the ledger
+		self.apply_pending_usage()
+
 		invoice_item = self.get_invoice_item_for_usage_record(usage_record)
 		if not invoice_item:
 			return
@@ -610,19 +692,14 @@ class Invoice(Document):
 		usage_record.db_set("invoice", None)
 
 	def get_invoice_item_for_usage_record(self, usage_record):
-		invoice_item = None
-		for row in self.items:
-			conditions = (
-				row.document_type == usage_record.document_type
-				and row.document_name == usage_record.document_name
-				and row.plan == usage_record.plan
-				and row.rate == usage_record.amount
-			)
-			if row.document_type == "Marketplace App":
-				conditions = conditions and row.site == usage_record.site
-			if conditions:
-				invoice_item = row
-		return invoice_item
+		key = get_usage_key(
+			usage_record.document_type,
+			usage_record.document_name,
+			usage_record.plan,
+			usage_record.amount,
+			usage_record.site,
+		)
+		return self.get_items_by_usage_key().get(key)
 
 	def validate_items(self):
 		items_to_remove = []
@@ -1078,6 +1155,29 @@ def finalize_draft_invoice(invoice):
 		log_error("Invoice creation for next month failed", invoice=invoice.name)
 
 
+def is_incremental_invoice_aggregation_enabled() -> bool:
+	return bool(cint(frappe.get_cached_value("Press Settings", None, "incremental_invoice_aggregation")))
+
+
+def add_pending_usage_to_totals(invoices: list[dict]) -> list[dict]:
+	"""
+	Update `total` and `amount_due` of draft invoices in `invoices` with usage
+	pending in Invoice Usage Ledger, without writing to the invoices
+	"""
+	if not is_incremental_invoice_aggregation_enabled():
+		return invoices
+
+	drafts = [invoice.name for invoice in invoices if invoice.status == "Draft"]
+	pending = set(get_invoices_with_pending_usage(drafts))
+	for invoice in invoices:
+		if invoice.name in pending:
+			doc = frappe.get_doc("Invoice", invoice.name)
+			doc.apply_pending_usage(save=False)
+			invoice.total = doc.total
+			invoice.amount_due = doc.amount_due
+	return invoices
+
+
 def calculate_gst(amount):
 	return amount * 0.18
 
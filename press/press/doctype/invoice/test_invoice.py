@@ -44,6 +44,89 @@ class TestInvoice(unittest.TestCase):
 
 		self.assertEqual(invoice.amount_due, 60)
 
+	@patch("press.press.doctype.invoice.invoice.is_incremental_invoice_aggregation_enabled", new=lambda: True)
+	def test_incremental_invoice_aggregation(self):
+		invoice = frappe.get_doc(
+			doctype="Invoice",
+			team=self.team.name,
+			period_start=today(),
+			period_end=add_days(today(), 10),
+		).insert()
+
+		usage_records = []
+		for amount in [10, 20, 30]:
+			usage_record = frappe.get_doc(doctype="Usage Record", team=self.team.name, amount=amount)
+			usage_record.insert()
+			usage_record.submit()
+			usage_records.append(usage_record)
+
+		invoice.reload()
+		self.assertEqual(len(invoice.items), 0)
+		self.assertEqual(frappe.db.count("Invoice Usage Ledger", {"invoice": invoice.name}), 3)
+		self.assertEqual(usage_records[0].invoice, invoice.name)
+
+		# reads are totalled without touching the ledger
+		invoice.apply_pending_usage(save=False)
+		self.assertEqual(invoice.total, 60)
+		self.assertEqual(frappe.db.count("Invoice Usage Ledger", {"invoice": invoice.name}), 3)
+
+		usage_records[0].cancel()
+		invoice.reload()
+		self.assertEqual(len(invoice.items), 2)
+		self.assertEqual(invoice.total, 50)
+		self.assertEqual(frappe.db.count("Invoice Usage Ledger", {"invoice": invoice.name}), 0)
+
+		with patch.object(invoice, "create_stripe_invoice", return_value=None):
+			invoice.finalize_invoice()
+
+		self.assertEqual(invoice.amount_due, 50)
+
+	@patch("press.press.doctype.invoice.invoice.is_incremental_invoice_aggregation_enabled", new=lambda: True)
+	def test_unsettled_invoices_include_pending_usage(self):
+		from press.press.doctype.team.team import Team, has_unsettled_invoices
+
+		invoice = frappe.get_doc(
+			doctype="Invoice",
+			team=self.team.name,
+			period_start=today(),
+			period_end=add_days(today(), 10),
+		).insert()
+		self.assertFalse(has_unsettled_invoices(self.team.name))
+
+		# usage is recorded in the ledger without loading or locking the invoice
+		with patch.object(Team, "get_upcoming_invoice", side_effect=AssertionError):
+			for amount in [300, 400]:
+				usage_record = frappe.get_doc(doctype="Usage Record", team=self.team.name, amount=amount)
+				usage_record.insert()
+				usage_record.submit()
+				self.assertEqual(usage_record.invoice, invoice.name)
+
+		self.assertEqual(frappe.db.get_value("Invoice", invoice.name, "total"), 0)
+		self.assertTrue(has_unsettled_invoices(self.team.name))
+		self.assertEqual(frappe.db.count("Invoice Usage Ledger", {"invoice": invoice.name}), 2)
+
+	@patch("press.press.doctype.invoice.invoice.is_incremental_invoice_aggregation_enabled", new=lambda: True)
+	def test_usage_is_not_recorded_on_finalized_invoice(self):
+		from press.press.doctype.invoice_usage_ledger.invoice_usage_ledger import add_to_pending_usage
+
+		invoice = frappe.get_doc(
+			doctype="Invoice",
+			team=self.team.name,
+			period_start=today(),
+			period_end=add_days(today(), 10),
+		).insert()
+		frappe.get_doc(doctype="Usage Record", team=self.team.name, amount=10).insert().submit()
+
+		with patch.object(invoice, "create_stripe_invoice", return_value=None):
+			invoice.finalize_invoice()
+		self.assertEqual(invoice.docstatus, 1)
+
+		# Usage looked up against the draft before it was finalized stays unlinked
+		usage_record = frappe.get_doc(doctype="Usage Record", team=self.team.name, amount=20).insert()
+		self.assertFalse(add_to_pending_usage(invoice.name, [usage_record]))
+		self.assertIsNone(usage_record.invoice)
+		self.assertEqual(frappe.db.count("Invoice Usage Ledger", {"invoice": invoice.name}), 0)
+
 	def test_invoice_cancel_usage_record(self):
 		invoice = frappe.get_doc(
 			doctype="Invoice",
@@ -0,0 +1,149 @@
+# Copyright (c) 2026, Frappe and contributors
+# For license information, please see license.txt
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import TYPE_CHECKING
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, getdate
+
+if TYPE_CHECKING:
+	from press.press.doctype.usage_record.usage_record import UsageRecord
+
+
+class InvoiceUsageLedger(Document):
+	# begin: auto-generated types
+	# This code is auto-generated. Do not modify anything in this block.
+
+	from typing import TYPE_CHECKING
+
+	if TYPE_CHECKING:
+		from frappe.types import DF
+
+		document_name: DF.DynamicLink | None
+		document_type: DF.Link | None
+		invoice: DF.Link
+		plan: DF.Data | None
+		quantity: DF.Int
+		rate: DF.Currency
+		site: DF.Link | None
+	# end: auto-generated types
+
+	pass
+
+
+def get_usage_key(document_type, document_name, plan, rate, site) -> tuple:
+	"""Usage records with the same key are billed on the same invoice item"""
+	# Marketplace apps are billed per site, everything else is billed per document
+	return (
+		document_type,
+		document_name,
+		plan,
+		flt(rate),
+		site if document_type == "Marketplace App" else None,
+	)
+
+
+def record_usage(invoice: str, usage_record: UsageRecord):
+	"""Atomically add a usage record to the pending usage of the invoice, without loading the invoice"""
+	key = get_usage_key(
+		usage_record.document_type,
+		usage_record.document_name,
+		usage_record.plan,
+		usage_record.amount,
+		usage_record.site,
+	)
+	name = hashlib.sha1(json.dumps([invoice, *key], default=str).encode()).hexdigest()
+	frappe.db.sql(
+		"""
+		INSERT INTO `tabInvoice Usage Ledger`
+			(`name`, `invoice`, `document_type`, `document_name`, `plan`, `rate`, `site`, `quantity`,
+			`creation`, `modified`, `owner`, `modified_by`)
+		VALUES
+			(%(name)s, %(invoice)s, %(document_type)s, %(document_name)s, %(plan)s, %(rate)s, %(site)s, 1,
+			%(now)s, %(now)s, %(user)s, %(user)s)
+		ON DUPLICATE KEY UPDATE `quantity` = `quantity` + 1, `modified` = %(now)s
+		""",
+		{
+			"name": name,
+			"invoice": invoice,
+			"document_type": key[0],
+			"document_name": key[1],
+			"plan": key[2],
+			"rate": key[3],
+			"site": usage_record.site,
+			"now": frappe.utils.now_datetime(),
+			"user": frappe.session.user,
+		},
+	)
+
+
+def add_to_pending_usage(invoice: str, usage_records: list[UsageRecord]) -> bool:
+	"""
+	Record usage against a draft invoice and link the usage records to it, without loading the invoice
+
+	Holds a shared lock on the invoice row until the transaction ends, so the invoice
+	can't be finalized before the usage lands in the ledger. Returns False if the
+	invoice isn't a draft anymore. Usage records outside the invoice period are skipped.
+	"""
+	period = frappe.db.sql(
+		"""
+		SELECT `period_start`, `period_end` FROM `tabInvoice`
+		WHERE `name` = %s AND `docstatus` = 0
+		LOCK IN SHARE MODE
+		""",
+		invoice,
+	)
+	if not period:
+		return False
+
+	start, end = getdate(period[0][0]), getdate(period[0][1])
+	usage_records = [
+		usage_record
+		for usage_record in usage_records
+		if not usage_record.invoice and start <= getdate(usage_record.date) <= end
+	]
+	for usage_record in usage_records:
+		record_usage(invoice, usage_record)
+	link_usage_records(invoice, usage_records)
+	return True
+
+
+def link_usage_records(invoice: str, usage_records: list[UsageRecord]):
+	if not usage_records:
+		return
+	UsageRecord = frappe.qb.DocType("Usage Record")
+	frappe.qb.update(UsageRecord).set(UsageRecord.invoice, invoice).where(
+		UsageRecord.name.isin([usage_record.name for usage_record in usage_records])
+	).run()
+	for usage_record in usage_records:
+		usage_record.invoice = invoice
+
+
+def get_pending_usage(invoice: str, for_update: bool = False) -> list[dict]:
+	return frappe.get_all(
+		"Invoice Usage Ledger",
+		filters={"invoice": invoice, "quantity": (">", 0)},
+		fields=["name", "document_type", "document_name", "plan", "rate", "site", "quantity"],
+		order_by="creation asc",
+		for_update=for_update,
+	)
+
+
+def get_invoices_with_pending_usage(invoices: list[str]) -> list[str]:
+	if not invoices:
+		return []
+	return frappe.get_all(
+		"Invoice Usage Ledger",
+		filters={"invoice": ("in", invoices), "quantity": (">", 0)},
+		pluck="invoice",
+		distinct=True,
+	)
+
+
+def clear_pending_usage(names: list[str]):
+	if names:
+		frappe.db.delete("Invoice Usage Ledger", {"name": ("in", names)})
@@ -27,6 +27,7 @@ class PressSettings(Document):
 		from press.press.doctype.erpnext_app.erpnext_app import ERPNextApp
 
 		agent_github_access_token: DF.Data | None
+		agent_job_delta_polling: DF.Check
 		agent_repository_owner: DF.Data | None
 		agent_sentry_dsn: DF.Data | None
 		app_include_script: DF.Data | None
@@ -97,9 +98,11 @@ class PressSettings(Document):
 		hetzner_api_token: DF.Password | None
 		hybrid_cluster: DF.Link | None
 		hybrid_domain: DF.Link | None
+		incremental_invoice_aggregation: DF.Check
 		log_server: DF.Link | None
 		mailgun_api_key: DF.Data | None
 		max_allowed_screenshots: DF.Int
+		max_concurrent_backups_per_server: DF.Int
 		max_concurrent_physical_restorations: DF.Int
 		max_failed_backup_attempts_in_a_day: DF.Int
 		micro_debit_charge_inr: DF.Currency
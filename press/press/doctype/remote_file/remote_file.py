@@ -2,6 +2,7 @@
 # Copyright (c) 2020, Frappe and contributors
 # For license information, please see license.txt
 
+from __future__ import annotations
 
 import json
 import pprint
@@ -124,30 +125,55 @@ def poll_file_statuses_from_bucket(bucket):
 	frappe.db.commit()
 
 
-def delete_remote_backup_objects(remote_files):
-	"""Delete specified objects identified by keys in the backups bucket."""
-	remote_files = list(set([x for x in remote_files if x]))
-	if not remote_files:
-		return
+def delete_remote_backup_objects(remote_files) -> list[str]:
+	"""
+	Delete objects of specified Remote Files from their backup buckets.
 
-	buckets = {bucket: [] for bucket in frappe.get_all("Backup Bucket", pluck="name")}
-	buckets.update({frappe.db.get_single_value("Press Settings", "aws_s3_bucket"): []})
+	Only Remote Files with objects confirmed as deleted by S3 are marked as
+	Unavailable. Returns names of these Remote Files.
+	"""
+	from press.utils import chunk
 
-	[
-		buckets[bucket].append(file)
-		for file, bucket in frappe.db.get_values(
-			"Remote File",
-			{"name": ("in", remote_files), "status": "Available"},
-			["file_path", "bucket"],
-		)
-	]
+	buckets, remote_files_by_object = get_remote_backup_objects(remote_files)
+	if not buckets:
+		return []
 
-	delete_s3_files(buckets)
-	frappe.db.set_value(
-		"Remote File", {"name": ("in", remote_files)}, "status", "Unavailable"
-	)
+	deletion = delete_s3_files(buckets)
+	deleted_files = [name for obj in deletion.deleted for name in remote_files_by_object.get(obj, [])]
+	for files in chunk(deleted_files, 1000):
+		frappe.db.set_value("Remote File", {"name": ("in", files)}, "status", "Unavailable")
+
+	return deleted_files
+
+
+def plan_remote_backup_deletion(remote_files) -> S3ObjectDeletion:
+	"""
+	Dry run of `delete_remote_backup_objects`, nothing is deleted or marked.
+
+	Returns the S3ObjectDeletion with the objects and batches that would be deleted.
+	"""
+	buckets, _ = get_remote_backup_objects(remote_files)
+	return delete_s3_files(buckets, dry_run=True)
+
+
+def get_remote_backup_objects(remote_files) -> tuple[dict[str, list[str]], dict[tuple[str, str], list[str]]]:
+	"""Keys of available Remote Files by bucket, and Remote File names by (bucket, key)"""
+	from press.utils import chunk
 
-	return remote_files
+	remote_files = list(set([x for x in remote_files if x]))
+	default_bucket = frappe.db.get_single_value("Press Settings", "aws_s3_bucket")
+	buckets = {}
+	remote_files_by_object = {}
+	for files in chunk(remote_files, 1000):
+		for name, file_path, bucket in frappe.db.get_values(
+			"Remote File",
+			{"name": ("in", files), "status": "Available", "file_path": ("is", "set")},
+			["name", "file_path", "bucket"],
+		):
+			bucket = bucket or default_bucket
+			buckets.setdefault(bucket, []).append(file_path)
+			remote_files_by_object.setdefault((bucket, file_path), []).append(name)
+	return buckets, remote_files_by_object
 
 
 class RemoteFile(Document):
@@ -264,27 +290,177 @@ class RemoteFile(Document):
 			return int(self.file_size)
 
 
-def delete_s3_files(buckets):
+def delete_s3_files(buckets, dry_run=False) -> S3ObjectDeletion:
 	"""Delete specified files from s3 buckets"""
-	from boto3 import resource
-
-	from press.utils import chunk
+	deletion = S3ObjectDeletion(buckets, dry_run=dry_run)
+	deletion.run()
+	return deletion
+
+
+class S3ObjectDeletion:
+	"""
+	Deletes objects from S3 buckets with DeleteObjects requests of up to
+	`BATCH_SIZE` keys. Batches of all buckets are sent from a bounded pool of
+	threads, with at most twice as many batches in flight as there are workers.
+
+	Keys S3 couldn't delete because of throttling or server errors are retried
+	in a new batch with exponential backoff, up to `RETRIES` times. Other errors
+	(e.g. AccessDenied) are not retried. Only `deleted` (bucket, key) pairs are
+	confirmed by S3. Workers only talk to S3, responses are logged from the
+	calling thread.
+
+	A dry run only counts the `objects` and batches it would delete.
+	"""
+
+	BATCH_SIZE = 1000  # Most keys a DeleteObjects request accepts
+	WORKERS = 8
+	RETRIES = 3
+	BACKOFF = 1  # Seconds before the first retry, doubled for every retry after it
+	RETRYABLE_ERRORS = ("InternalError", "ServiceUnavailable", "SlowDown", "RequestTimeout", "Throttling")
+
+	def __init__(self, buckets: dict[str, list[str]], dry_run: bool = False, workers: int = WORKERS):
+		self.buckets = {bucket: keys for bucket, keys in buckets.items() if bucket and keys}
+		self.dry_run = dry_run
+		self.workers = workers
+
+		self.deleted: set[tuple[str, str]] = set()
+		self.failed: set[tuple[str, str]] = set()
+		self.stats = frappe._dict(
+			dry_run=dry_run, keys=0, deleted=0, failed=0, batches=0, retries=0, seconds=0, keys_per_second=0
+		)
 
-	press_settings = frappe.get_single("Press Settings")
-	for bucket_name in buckets.keys():
-		s3 = resource(
+	@property
+	def objects(self) -> list[tuple[str, str]]:
+		"""(bucket, key) pairs to delete"""
+		return [(bucket, key) for bucket, keys in self.buckets.items() for key in dict.fromkeys(keys)]
+
+	def run(self):
+		from time import monotonic
+
+		start = monotonic()
+		self.stats["keys"] = len(self.objects)
+		if self.dry_run:
+			self.stats["batches"] = sum(len(list(self.get_batches(bucket))) for bucket in self.buckets)
+			self.log()
+			return
+
+		self.delete_batches()
+		self.stats["deleted"] = len(self.deleted)
+		self.stats["failed"] = len(self.failed)
+		self.stats["seconds"] = round(monotonic() - start, 3)
+		self.stats["keys_per_second"] = round(self.stats["keys"] / max(self.stats["seconds"], 0.001), 1)
+		self.log()
+
+	def delete_batches(self):
+		import heapq
+		from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+		from time import monotonic, sleep
+
+		clients = {bucket: self.get_client(bucket) for bucket in self.buckets}
+		batches = ((bucket, keys, 0) for bucket in self.buckets for keys in self.get_batches(bucket))
+		# (retry at, bucket, keys, attempt) of batches waiting for their backoff
+		retries = []
+		in_flight = {}
+		with ThreadPoolExecutor(max_workers=self.workers) as executor:
+			while True:
+				while len(in_flight) < self.workers * 2 and (
+					batch := self.next_batch(batches, retries, monotonic())
+				):
+					future = executor.submit(self.delete_objects, clients[batch[0]], batch[0], batch[1])
+					in_flight[future] = batch
+					self.stats["batches"] += 1
+
+				if not in_flight and not retries:
+					break
+
+				timeout = max(retries[0][0] - monotonic(), 0) if retries else None
+				if not in_flight:
+					sleep(timeout)
+					continue
+
+				done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+				for future in done:
+					bucket, keys, attempt = in_flight.pop(future)
+					retry_keys = self.process_response(bucket, keys, future)
+					if retry_keys and attempt < self.RETRIES:
+						self.stats["retries"] += 1
+						retry_at = monotonic() + self.BACKOFF * 2**attempt
+						heapq.heappush(retries, (retry_at, bucket, retry_keys, attempt + 1))
+					else:
+						self.failed.update((bucket, key) for key in retry_keys)
+
+	@staticmethod
+	def next_batch(batches, retries: list, now: float) -> tuple | None:
+		"""Retries that are due go first, then new batches"""
+		import heapq
+
+		if retries and retries[0][0] <= now:
+			return heapq.heappop(retries)[1:]
+		return next(batches, None)
+
+	def log(self):
+		frappe.get_doc(
+			doctype="Remote Operation Log",
+			operation_type="Delete Files",
+			response=pprint.pformat(dict(self.stats)),
+		).insert()
+
+	def get_batches(self, bucket: str):
+		from press.utils import chunk
+
+		return chunk(list(dict.fromkeys(self.buckets[bucket])), self.BATCH_SIZE)
+
+	def get_client(self, bucket: str):
+		press_settings = frappe.get_single("Press Settings")
+		return client(
 			"s3",
 			aws_access_key_id=press_settings.offsite_backups_access_key_id,
 			aws_secret_access_key=press_settings.get_password(
 				"offsite_backups_secret_access_key", raise_exception=False
 			),
-			endpoint_url=frappe.db.get_value("Backup Bucket", bucket_name, "endpoint_url")
+			endpoint_url=frappe.db.get_value("Backup Bucket", bucket, "endpoint_url")
 			or "https://s3.amazonaws.com",
 		)
-		bucket = s3.Bucket(bucket_name)
-		for objects in chunk([{"Key": x} for x in buckets[bucket_name]], 1000):
-			response = bucket.delete_objects(Delete={"Objects": objects})
-			response = pprint.pformat(response)
+
+	@staticmethod
+	def delete_objects(s3, bucket: str, keys: list[str]) -> dict:
+		# Runs in a worker thread, boto3 clients can be shared between threads
+		return s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": key} for key in keys]})
+
+	def process_response(self, bucket: str, keys: list[str], future) -> list[str]:
+		"""Record deleted and failed keys of a batch and return keys worth retrying"""
+		from botocore.exceptions import ClientError
+
+		from press.utils import log_error
+
+		try:
+			response = future.result()
+		except Exception as e:
+			if isinstance(e, ClientError) and self.is_retryable(
+				e.response["Error"].get("Code"), e.response["ResponseMetadata"].get("HTTPStatusCode")
+			):
+				return keys
+			# e.g. AccessDenied or an unreachable endpoint, retrying won't help
+			log_error("Remote File Deletion Exception", bucket=bucket, keys=len(keys))
+			self.failed.update((bucket, key) for key in keys)
+			return []
+
+		self.deleted.update((bucket, deleted["Key"]) for deleted in response.get("Deleted", []))
+		errors = response.get("Errors") or []
+		if errors:
 			frappe.get_doc(
-				doctype="Remote Operation Log", operation_type="Delete Files", response=response
+				doctype="Remote Operation Log",
+				operation_type="Delete Files",
+				response=pprint.pformat(errors),
 			).insert()
+
+		retry_keys = []
+		for error in errors:
+			if self.is_retryable(error.get("Code")):
+				retry_keys.append(error["Key"])
+			else:
+				self.failed.add((bucket, error["Key"]))
+		return retry_keys
+
+	def is_retryable(self, code: str | None, status_code: int | None = None) -> bool:
+		return code in self.RETRYABLE_ERRORS or (status_code or 0) >= 500
@@ -5,9 +5,20 @@
 
 import unittest
 from datetime import datetime
+from time import monotonic
 from typing import Optional
+from unittest.mock import patch
 
+import boto3
 import frappe
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from press.press.doctype.remote_file.remote_file import (
+	S3ObjectDeletion,
+	delete_remote_backup_objects,
+	plan_remote_backup_deletion,
+)
 
 
 def create_test_remote_file(
@@ -33,4 +44,91 @@ def create_test_remote_file(
 
 
 class TestRemoteFile(unittest.TestCase):
-	pass
+	def tearDown(self):
+		frappe.db.rollback()
+
+	@mock_aws
+	def test_delete_remote_backup_objects(self):
+		s3 = boto3.client("s3", region_name="us-east-1")
+		s3.create_bucket(Bucket="test-backups")
+		frappe.db.set_single_value("Press Settings", "aws_s3_bucket", "test-backups")
+
+		remote_files = [create_test_remote_file(file_path=f"backups/{i}.sql.gz") for i in range(5)]
+		for remote_file in remote_files:
+			s3.put_object(Bucket="test-backups", Key=remote_file.file_path, Body=b"backup")
+		names = [remote_file.name for remote_file in remote_files]
+
+		with patch.object(S3ObjectDeletion, "BATCH_SIZE", 2):
+			dry_run = plan_remote_backup_deletion(names)
+			self.assertEqual(dry_run.stats.keys, 5)
+			self.assertEqual(dry_run.stats.batches, 3)
+			self.assertCountEqual(
+				dry_run.objects, [("test-backups", remote_file.file_path) for remote_file in remote_files]
+			)
+			self.assertEqual(s3.list_objects_v2(Bucket="test-backups")["KeyCount"], 5)
+			self.assertEqual(frappe.db.get_value("Remote File", names[0], "status"), "Available")
+			self.assertIn("'dry_run': True", frappe.get_last_doc("Remote Operation Log").response)
+
+			deleted = delete_remote_backup_objects(names)
+
+		self.assertCountEqual(deleted, names)
+		self.assertEqual(s3.list_objects_v2(Bucket="test-backups")["KeyCount"], 0)
+		for name in names:
+			self.assertEqual(frappe.db.get_value("Remote File", name, "status"), "Unavailable")
+
+	@mock_aws
+	@patch.object(S3ObjectDeletion, "BACKOFF", 0.05)
+	def test_failed_deletions_retried(self):
+		s3 = boto3.client("s3", region_name="us-east-1")
+		s3.create_bucket(Bucket="test-backups")
+		responses = [
+			{
+				"Deleted": [{"Key": "a"}],
+				"Errors": [{"Key": "b", "Code": "SlowDown"}, {"Key": "c", "Code": "AccessDenied"}],
+			},
+			{"Deleted": [{"Key": "b"}]},
+		]
+		called_at = []
+
+		def delete_objects(*args):
+			called_at.append(monotonic())
+			return responses[len(called_at) - 1]
+
+		with patch.object(S3ObjectDeletion, "delete_objects", side_effect=delete_objects) as mock_delete:
+			deletion = S3ObjectDeletion({"test-backups": ["a", "b", "c"]})
+			deletion.run()
+
+		# Only the throttled key is retried, after a backoff
+		self.assertEqual(mock_delete.call_args.args[2], ["b"])
+		self.assertGreaterEqual(called_at[1] - called_at[0], 0.05)
+		self.assertEqual(deletion.deleted, {("test-backups", "a"), ("test-backups", "b")})
+		self.assertEqual(deletion.failed, {("test-backups", "c")})
+		self.assertEqual(deletion.stats.retries, 1)
+
+	@mock_aws
+	@patch.object(S3ObjectDeletion, "BACKOFF", 0)
+	def test_failed_batches_retried_only_on_server_errors(self):
+		s3 = boto3.client("s3", region_name="us-east-1")
+		s3.create_bucket(Bucket="test-backups")
+
+		def client_error(code, status_code):
+			return ClientError(
+				{"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status_code}},
+				"DeleteObjects",
+			)
+
+		with patch.object(
+			S3ObjectDeletion, "delete_objects", side_effect=client_error("AccessDenied", 403)
+		) as mock_delete:
+			deletion = S3ObjectDeletion({"test-backups": ["a", "b"]})
+			deletion.run()
+		self.assertEqual(mock_delete.call_count, 1)
+		self.assertEqual(deletion.failed, {("test-backups", "a"), ("test-backups", "b")})
+
+		with patch.object(
+			S3ObjectDeletion, "delete_objects", side_effect=client_error("InternalError", 500)
+		) as mock_delete:
+			deletion = S3ObjectDeletion({"test-backups": ["a", "b"]})
+			deletion.run()
+		self.assertEqual(mock_delete.call_count, S3ObjectDeletion.RETRIES + 1)
+		self.assertEqual(deletion.stats.failed, 2)
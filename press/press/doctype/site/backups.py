@@ -12,13 +12,13 @@ from time import time
 
 import frappe
 import pytz
+from frappe.query_builder.functions import Count
 
 from press.press.doctype.press_settings.press_settings import PressSettings
 from press.press.doctype.remote_file.remote_file import delete_remote_backup_objects
 from press.press.doctype.site.site import Literal, Site
-from press.press.doctype.site_backup.site_backup import SiteBackup
 from press.press.doctype.subscription.subscription import Subscription
-from press.utils import log_error
+from press.utils import chunk, log_error
 
 
 def timing(f):
@@ -34,6 +34,8 @@ def timing(f):
 
 
 BACKUP_TYPES = Literal["Logical", "Physical"]
+# Backups (or sites) read or expired with a single query
+EXPIRY_CHUNK_SIZE = 1000
 
 
 class BackupRotationScheme:
@@ -43,17 +45,18 @@ class BackupRotationScheme:
 	Rotation is maintained by controlled deletion of daily backups.
 	"""
 
-	def _expire_and_get_remote_files(self, offsite_backups: list[dict[str, str]]) -> list[str]:
-		"""Mark backup as unavailable and return remote files to delete."""
+	def _expire_and_get_remote_files(self, offsite_backups: list[str]) -> list[str]:
+		"""Mark backups as unavailable and return remote files to delete."""
 		remote_files_to_delete = []
-		for backup in offsite_backups:
-			remote_files = frappe.db.get_value(
+		for backups in chunk(offsite_backups, EXPIRY_CHUNK_SIZE):
+			for remote_files in frappe.get_all(
 				"Site Backup",
-				backup,
+				{"name": ("in", backups)},
 				["remote_database_file", "remote_private_file", "remote_public_file"],
-			)
-			remote_files_to_delete.extend(remote_files)
-			frappe.db.set_value("Site Backup", backup, "files_availability", "Unavailable")
+				as_list=True,
+			):
+				remote_files_to_delete.extend(remote_files)
+			frappe.db.set_value("Site Backup", {"name": ("in", backups)}, "files_availability", "Unavailable")
 		return remote_files_to_delete
 
 	def expire_local_backups(self):
@@ -98,30 +101,27 @@ class BackupRotationScheme:
 			)
 
 	def _mark_physical_backups_as_expired(self, backups: list[str]):
-		site_backups = frappe.get_all(
-			"Site Backup",
-			filters={
-				"name": ("in", backups),
-				"files_availability": "Available",
-				"physical": True,
-			},
-			fields=["name", "database_snapshot"],
-			pluck="name",
-		)
-		for backup in site_backups:
-			# set snapshot as Unavailable
+		for names in chunk(backups, EXPIRY_CHUNK_SIZE):
+			site_backups = frappe.get_all(
+				"Site Backup",
+				filters={
+					"name": ("in", names),
+					"files_availability": "Available",
+					"physical": True,
+				},
+				fields=["name", "database_snapshot"],
+			)
+			if not site_backups:
+				continue
+
 			frappe.db.set_value(
 				"Site Backup",
-				backup.name,
+				{"name": ("in", [backup.name for backup in site_backups])},
 				"files_availability",
 				"Unavailable",
 			)
-			frappe.db.set_value(
-				"Virtual Disk Snapshot",
-				backup.database_snapshot,
-				"expired",
-				True,
-			)
+			if snapshots := [backup.database_snapshot for backup in site_backups if backup.database_snapshot]:
+				frappe.db.set_value("Virtual Disk Snapshot", {"name": ("in", snapshots)}, "expired", True)
 
 	def get_backups_due_for_expiry(self, backup_type: BACKUP_TYPES) -> list[str]:
 		raise NotImplementedError
@@ -149,22 +149,31 @@ class FIFO(BackupRotationScheme):
 		)
 
 	def get_backups_due_for_expiry(self, backup_type: BACKUP_TYPES) -> list[str]:
-		offsite_expiry = self.offsite_backups_count
-		to_be_expired_backups = []
-		sites = frappe.get_all("Site", {"status": ("!=", "Archived")}, pluck="name")
-		for site in sites:
-			to_be_expired_backups += frappe.get_all(
-				"Site Backup",
-				filters={
-					"site": site,
-					"status": "Success",
-					"files_availability": "Available",
-					"offsite": backup_type == "Logical",
-					"physical": backup_type == "Physical",
-				},
-				order_by="creation desc",
-			)[offsite_expiry:]
-		return to_be_expired_backups
+		"""Backups of each site beyond the newest `offsite_backups_count`, ranked in a single query."""
+		return frappe.db.sql(
+			"""
+			SELECT name FROM (
+				SELECT
+					backup.name,
+					ROW_NUMBER() OVER (PARTITION BY backup.site ORDER BY backup.creation DESC) AS position
+				FROM `tabSite Backup` backup
+				JOIN tabSite site ON site.name = backup.site
+				WHERE
+					site.status != "Archived" and
+					backup.status = "Success" and
+					backup.files_availability = "Available" and
+					backup.offsite = %(offsite)s and
+					backup.physical = %(physical)s
+			) ranked
+			WHERE position > %(keep)s
+			""",
+			{
+				"offsite": backup_type == "Logical",
+				"physical": backup_type == "Physical",
+				"keep": self.offsite_backups_count,
+			},
+			pluck=True,
+		)
 
 
 class GFS(BackupRotationScheme):
@@ -202,7 +211,7 @@ class GFS(BackupRotationScheme):
 				(DAYOFMONTH(creation) != {self.monthly_backup_day} or creation < "{oldest_monthly}") and
 				(DAYOFYEAR(creation) != {self.yearly_backup_day} or creation < "{oldest_yearly}")
 			""",
-			as_dict=True,
+			pluck=True,
 		)
 		# XXX: DAYOFWEEK in sql gives 1-7 for SUN-SAT in sql
 		# datetime.weekday() in python gives 0-6 for MON-SUN
@@ -254,6 +263,11 @@ class ScheduledBackupJob:
 			or 6
 		)
 
+		self.max_concurrent_backups_per_server = (
+			frappe.get_cached_value("Press Settings", "Press Settings", "max_concurrent_backups_per_server")
+			or 0
+		)
+
 		self.offsite_setup = PressSettings.is_offsite_setup()
 		self.server_time = datetime.now()
 		self.sites = Site.get_sites_for_backup(self.interval, backup_type=self.backup_type)
@@ -262,11 +276,87 @@ class ScheduledBackupJob:
 		else:
 			self.sites_without_offsite = []
 
+		self._load_backup_eligibility()
+		self._load_ongoing_backups_by_server()
+
+	def _load_backup_eligibility(self):
+		"""Load failed attempts and today's backups of all candidate sites with grouped queries."""
+		self.failed_backup_attempts: dict[str, int] = {}
+		self.sites_with_offsite_backup: set[str] = set()
+		self.sites_with_file_backup: set[str] = set()
+
+		today = frappe.utils.getdate()
+		for sites in chunk([site.name for site in self.sites], EXPIRY_CHUNK_SIZE):
+			self.failed_backup_attempts.update(
+				frappe.get_all(
+					"Site Backup",
+					{
+						"site": ("in", sites),
+						"status": ("in", ["Failure", "Delivery Failure"]),
+						"physical": self.backup_type == "Physical",
+						"creation": (">=", frappe.utils.add_days(None, -1)),
+					},
+					["site", "count(*) as count"],
+					group_by="site",
+					as_list=True,
+				)
+			)
+			for site, offsite, with_files in frappe.get_all(
+				"Site Backup",
+				{
+					"site": ("in", sites),
+					"status": "Success",
+					"creation": ("between", [today, today]),
+				},
+				["site", "max(offsite) as offsite", "max(with_files) as with_files"],
+				group_by="site",
+				as_list=True,
+			):
+				if offsite:
+					self.sites_with_offsite_backup.add(site)
+				if with_files:
+					self.sites_with_file_backup.add(site)
+
+	def _load_ongoing_backups_by_server(self):
+		"""Count pending and running backups on the database server of each candidate site's server."""
+		self.database_servers: dict[str, str] = {}
+		self.ongoing_backups: dict[str, int] = {}
+		if not self.max_concurrent_backups_per_server:
+			return
+
+		servers = list({site.server for site in self.sites})
+		self.database_servers = dict(
+			frappe.get_all("Server", {"name": ("in", servers)}, ["name", "database_server"], as_list=True)
+		)
+
+		SiteBackup = frappe.qb.DocType("Site Backup")
+		SiteDoc = frappe.qb.DocType("Site")
+		Server = frappe.qb.DocType("Server")
+		self.ongoing_backups = dict(
+			frappe.qb.from_(SiteBackup)
+			.join(SiteDoc)
+			.on(SiteDoc.name == SiteBackup.site)
+			.join(Server)
+			.on(Server.name == SiteDoc.server)
+			.select(Server.database_server, Count("*"))
+			.where(SiteBackup.status.isin(["Pending", "Running"]))
+			.where(SiteBackup.creation >= frappe.utils.add_days(None, -1))
+			.groupby(Server.database_server)
+			.run()
+		)
+
+	def has_capacity(self, server: str) -> bool:
+		if not self.max_concurrent_backups_per_server:
+			return True
+		database_server = self.database_servers.get(server, server)
+		return self.ongoing_backups.get(database_server, 0) < self.max_concurrent_backups_per_server
+
 	def take_offsite(self, site: frappe._dict, day: datetime.date) -> bool:
+		# Existence of offsite backups is loaded for today
 		return (
 			self.offsite_setup
 			and site.name not in self.sites_without_offsite
-			and not SiteBackup.offsite_backup_exists(site.name, day)
+			and site.name not in self.sites_with_offsite_backup
 		)
 
 	def get_site_time(self, site: dict[str, str]) -> datetime:
@@ -285,7 +375,10 @@ class ScheduledBackupJob:
 
 	def _take_backups_in_round_robin(self, sites_by_server_cycle: ModifiableCycle):
 		limit = min(len(self.sites), self.limit)
-		for _server, sites in sites_by_server_cycle:
+		for server, sites in sites_by_server_cycle:
+			if not self.has_capacity(server):
+				sites_by_server_cycle.delete_prev()  # database server is busy with enough backups
+				continue
 			try:
 				site = next(sites)
 				while not self.backup(site):
@@ -293,6 +386,8 @@ class ScheduledBackupJob:
 			except StopIteration:
 				sites_by_server_cycle.delete_prev()  # no more sites in this server
 				continue
+			database_server = self.database_servers.get(server, server)
+			self.ongoing_backups[database_server] = self.ongoing_backups.get(database_server, 0) + 1
 			limit -= 1
 			if limit <= 0:
 				break
@@ -301,18 +396,7 @@ class ScheduledBackupJob:
 		"""Return true if backup was taken."""
 		try:
 			site_time = self.get_site_time(site)
-			failed_backup_attempts_in_a_day = frappe.db.count(
-				"Site Backup",
-				{
-					"site": site.name,
-					"status": ("in", ["Failure", "Delivery Failure"]),
-					"physical": self.backup_type == "Physical",
-					"creation": [
-						">=",
-						frappe.utils.add_days(None, -1),
-					],
-				},
-			)
+			failed_backup_attempts_in_a_day = self.failed_backup_attempts.get(site.name, 0)
 			if (
 				self.is_backup_hour(site_time.hour)
 				and failed_backup_attempts_in_a_day <= self.max_failed_backup_attempts_in_a_day
@@ -325,7 +409,7 @@ class ScheduledBackupJob:
 				"""
 				offsite = self.backup_type == "Logical" and self.take_offsite(site, today)
 				with_files = self.backup_type == "Logical" and (
-					offsite or not SiteBackup.file_backup_exists(site.name, today)
+					offsite or site.name not in self.sites_with_file_backup
 				)
 
 				frappe.get_doc("Site", site.name).backup(
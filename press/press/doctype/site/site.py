@@ -66,7 +66,6 @@ from press.press.doctype.marketplace_app.marketplace_app import (
 	marketplace_app_hook,
 )
 from press.press.doctype.resource_tag.tag_helpers import TagHelpers
-from press.press.doctype.server.server import is_dedicated_server
 from press.press.doctype.site_activity.site_activity import log_site_activity
 from press.press.doctype.site_analytics.site_analytics import create_site_analytics
 from press.press.doctype.site_plan.site_plan import UNLIMITED_PLANS, get_plan_config
@@ -91,10 +90,8 @@ if TYPE_CHECKING:
 
 	from frappe.types.DF import Table
 
-	from press.press.doctype.bench.bench import Bench
 	from press.press.doctype.bench_app.bench_app import BenchApp
 	from press.press.doctype.database_server.database_server import DatabaseServer
-	from press.press.doctype.deploy_candidate.deploy_candidate import DeployCandidate
 	from press.press.doctype.release_group.release_group import ReleaseGroup
 	from press.press.doctype.server.server import BaseServer, Server
 
@@ -105,6 +102,11 @@ DOCTYPE_SERVER_TYPE_MAP = {
 }
 
 
+SITE_DASHBOARD_CONTEXT_KEY = "site_dashboard_context"
+SITE_DASHBOARD_PLAN_KEY = "site_dashboard_plan"
+SITE_DASHBOARD_CONTEXT_TTL = 5 * 60
+
+
 class Site(Document, TagHelpers):
 	# begin: auto-generated types
 	# This code is auto-generated. Do not modify anything in this block.
@@ -227,7 +229,7 @@ class Site(Document, TagHelpers):
 	@staticmethod
 	def get_list_query(query, filters=None, **list_args):
 		from press.press.doctype.site_update.site_update import (
-			benches_with_available_update,
+			filter_benches_with_available_update,
 		)
 
 		Site = frappe.qb.DocType("Site")
@@ -236,8 +238,8 @@ class Site(Document, TagHelpers):
 		if status == "Archived":
 			sites = query.where(Site.status == status).run(as_dict=1)
 		else:
-			benches_with_available_update = benches_with_available_update()
 			sites = query.where(Site.status != "Archived").select(Site.bench).run(as_dict=1)
+			benches_with_available_update = filter_benches_with_available_update(site.bench for site in sites)
 
 			for site in sites:
 				if site.bench in benches_with_available_update:
@@ -256,57 +258,112 @@ class Site(Document, TagHelpers):
 		raise
 
 	def get_doc(self, doc):
-		from press.api.client import get
-
-		group = frappe.db.get_value(
-			"Release Group",
-			self.group,
-			["title", "public", "team", "central_bench", "version"],
-			as_dict=1,
-		)
-		doc.group_title = group.title
-		doc.version = group.version
-		doc.group_team = group.team
-		doc.group_public = group.public or group.central_bench
-		doc.latest_frappe_version = frappe.db.get_value(
-			"Frappe Version", {"status": "Stable", "public": True}, order_by="name desc"
-		)
-		doc.eol_versions = frappe.db.get_all(
-			"Frappe Version",
-			filters={"status": "End of Life"},
-			fields=["name"],
-			order_by="name desc",
-			pluck="name",
-		)
-		doc.owner_email = frappe.db.get_value("Team", self.team, "user")
+		info = self.get_dashboard_info()
+		context = get_site_dashboard_context()
+
+		doc.group_title = info.group_title
+		doc.version = info.version
+		doc.group_team = info.group_team
+		doc.group_public = info.group_public or info.central_bench
+		doc.latest_frappe_version = context["latest_frappe_version"]
+		doc.eol_versions = context["eol_versions"]
+		doc.owner_email = info.owner_email
 		doc.current_usage = self.current_usage
-		doc.current_plan = get("Site Plan", self.plan) if self.plan else None
+		doc.current_plan = get_dashboard_plan(self.plan) if self.plan else None
 		doc.last_updated = self.last_updated
-		doc.has_scheduled_updates = bool(
-			frappe.db.exists("Site Update", {"site": self.name, "status": "Scheduled"})
-		)
-		doc.update_information = self.get_update_information()
+		doc.has_scheduled_updates = bool(info.scheduled_update)
+		doc.update_information = self.get_update_information(info)
 		doc.actions = self.get_actions()
-		server = frappe.get_value("Server", self.server, ["ip", "proxy_server", "team", "title"], as_dict=1)
-		doc.cluster = frappe.db.get_value("Cluster", self.cluster, ["title", "image"], as_dict=1)
-		doc.outbound_ip = server.ip
-		doc.server_team = server.team
-		doc.server_title = server.title
-		doc.inbound_ip = self.inbound_ip
-		doc.is_dedicated_server = is_dedicated_server(self.server)
+		doc.cluster = context["clusters"].get(self.cluster)
+		doc.outbound_ip = info.server_ip
+		doc.server_team = info.server_team
+		doc.server_title = info.server_title
+		doc.inbound_ip = info.server_ip if info.is_standalone else info.proxy_ip
+		doc.is_dedicated_server = not info.server_public
 
 		if doc.owner == "Administrator":
-			doc.signup_by = frappe.db.get_value("Account Request", doc.account_request, "email")
+			doc.signup_by = info.signup_by
 
-		if broken_domain_tls_certificate := frappe.db.get_value(
-			"Site Domain", {"site": self.name, "status": "Broken"}, "tls_certificate"
-		):
-			doc.broken_domain_error, doc.tls_cert_retry_count = frappe.db.get_values(
-				"TLS Certificate", broken_domain_tls_certificate, ("error", "retry_count")
-			)[0]
+		if info.broken_domain_tls_certificate:
+			doc.broken_domain_error = info.broken_domain_error
+			doc.tls_cert_retry_count = info.tls_cert_retry_count
 
 		return doc
 
+	def get_dashboard_info(self) -> frappe._dict:
+		"""Everything the site page needs from related documents, in a single query"""
+		Site = frappe.qb.DocType("Site")
+		ReleaseGroup = frappe.qb.DocType("Release Group")
+		Server = frappe.qb.DocType("Server")
+		ProxyServer = frappe.qb.DocType("Proxy Server")
+		Team = frappe.qb.DocType("Team")
+		AccountRequest = frappe.qb.DocType("Account Request")
+		Bench = frappe.qb.DocType("Bench")
+		TLSCertificate = frappe.qb.DocType("TLS Certificate")
+		SiteUpdate = frappe.qb.DocType("Site Update")
+		SiteDomain = frappe.qb.DocType("Site Domain")
+		DeployCandidateDifference = frappe.qb.DocType("Deploy Candidate Difference")
+
+		scheduled_update = (
+			frappe.qb.from_(SiteUpdate)
+			.select(SiteUpdate.name)
+			.where((SiteUpdate.site == Site.name) & (SiteUpdate.status == "Scheduled"))
+			.limit(1)
+		)
+		broken_domain_tls_certificate = (
+			frappe.qb.from_(SiteDomain)
+			.select(SiteDomain.tls_certificate)
+			.where((SiteDomain.site == Site.name) & (SiteDomain.status == "Broken"))
+			.limit(1)
+		)
+		update_destination = (
+			frappe.qb.from_(DeployCandidateDifference)
+			.select(DeployCandidateDifference.destination)
+			.where(DeployCandidateDifference.source == Bench.candidate)
+			.limit(1)
+		)
+
+		info = (
+			frappe.qb.from_(Site)
+			.left_join(ReleaseGroup)
+			.on(ReleaseGroup.name == Site.group)
+			.left_join(Server)
+			.on(Server.name == Site.server)
+			.left_join(ProxyServer)
+			.on(ProxyServer.name == Server.proxy_server)
+			.left_join(Team)
+			.on(Team.name == Site.team)
+			.left_join(AccountRequest)
+			.on(AccountRequest.name == Site.account_request)
+			.left_join(Bench)
+			.on(Bench.name == Site.bench)
+			.left_join(TLSCertificate)
+			.on(TLSCertificate.name == broken_domain_tls_certificate)
+			.select(
+				ReleaseGroup.title.as_("group_title"),
+				ReleaseGroup.version,
+				ReleaseGroup.team.as_("group_team"),
+				ReleaseGroup.public.as_("group_public"),
+				ReleaseGroup.central_bench,
+				Server.ip.as_("server_ip"),
+				Server.team.as_("server_team"),
+				Server.title.as_("server_title"),
+				Server.public.as_("server_public"),
+				Server.is_standalone,
+				ProxyServer.ip.as_("proxy_ip"),
+				Team.user.as_("owner_email"),
+				AccountRequest.email.as_("signup_by"),
+				TLSCertificate.name.as_("broken_domain_tls_certificate"),
+				TLSCertificate.error.as_("broken_domain_error"),
+				TLSCertificate.retry_count.as_("tls_cert_retry_count"),
+				scheduled_update.as_("scheduled_update"),
+				update_destination.as_("update_destination"),
+			)
+			.where(Site.name == self.name)
+			.run(as_dict=True)
+		)
+		return info[0] if info else frappe._dict()
+
 	def site_action(allowed_status: list[str]):
 		def outer_wrapper(func):
 			@wraps(func)
@@ -2484,34 +2541,34 @@ class Site(Document, TagHelpers):
 		]
 		return {field: self.get(field) for field in fields}
 
-	def get_update_information(self):
+	def get_update_information(self, info: frappe._dict | None = None):
 		from press.press.doctype.site_update.site_update import (
-			benches_with_available_update,
+			find_benches_with_available_update,
 		)
 
 		out = frappe._dict()
-		out.update_available = self.bench in benches_with_available_update(site=self.name)
+		out.update_available = self.bench in find_benches_with_available_update(benches=[self.bench])
 		if not out.update_available:
 			return out
 
-		bench: "Bench" = frappe.get_doc("Bench", self.bench)
-		source = bench.candidate
-		destinations = frappe.get_all(
-			"Deploy Candidate Difference",
-			filters={"source": source},
-			limit=1,
-			pluck="destination",
-		)
-		if not destinations:
+		destination = (info or self.get_dashboard_info()).update_destination
+		if not destination:
 			out.update_available = False
 			return out
 
-		destination = destinations[0]
-
-		destination_candidate: "DeployCandidate" = frappe.get_doc("Deploy Candidate", destination)
-
-		current_apps = bench.apps
-		next_apps = destination_candidate.apps
+		# Only the apps are needed, skip loading the whole Bench and Deploy Candidate
+		current_apps = frappe.get_all(
+			"Bench App",
+			filters={"parent": self.bench, "parenttype": "Bench"},
+			fields=["app", "source", "hash"],
+			order_by="idx asc",
+		)
+		next_apps = frappe.get_all(
+			"Deploy Candidate App",
+			filters={"parent": destination, "parenttype": "Deploy Candidate"},
+			fields=["app", "title", "source", "hash", "pullable_hash"],
+			order_by="idx asc",
+		)
 		out.apps = get_updates_between_current_and_next_apps(current_apps, next_apps)
 
 		out.installed_apps = self.apps
@@ -3910,3 +3967,46 @@ def create_site_status_update_webhook_event(site: str):
 	if record.team == "Administrator":
 		return
 	create_webhook_event("Site Status Update", record, record.team)
+
+
+def get_site_dashboard_context() -> dict:
+	"""Data shared by every site page, cached for a few minutes"""
+	context = frappe.cache.get_value(SITE_DASHBOARD_CONTEXT_KEY)
+	if context:
+		return context
+
+	context = {
+		"latest_frappe_version": frappe.db.get_value(
+			"Frappe Version", {"status": "Stable", "public": True}, order_by="name desc"
+		),
+		"eol_versions": frappe.db.get_all(
+			"Frappe Version",
+			filters={"status": "End of Life"},
+			order_by="name desc",
+			pluck="name",
+		),
+		"clusters": {
+			cluster.name: frappe._dict(title=cluster.title, image=cluster.image)
+			for cluster in frappe.get_all("Cluster", fields=["name", "title", "image"])
+		},
+	}
+	frappe.cache.set_value(SITE_DASHBOARD_CONTEXT_KEY, context, expires_in_sec=SITE_DASHBOARD_CONTEXT_TTL)
+	return context
+
+
+def get_dashboard_plan(plan: str) -> dict:
+	from press.api.client import get
+
+	key = f"{SITE_DASHBOARD_PLAN_KEY}:{plan}"
+	doc = frappe.cache.get_value(key)
+	if not doc:
+		doc = get("Site Plan", plan)
+		frappe.cache.set_value(key, doc, expires_in_sec=SITE_DASHBOARD_CONTEXT_TTL)
+	return doc
+
+
+def clear_site_dashboard_context(doc, method=None):
+	if doc.doctype == "Site Plan":
+		frappe.cache.delete_value(f"{SITE_DASHBOARD_PLAN_KEY}:{doc.name}")
+	else:
+		frappe.cache.delete_value(SITE_DASHBOARD_CONTEXT_KEY)
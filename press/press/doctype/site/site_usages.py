@@ -4,8 +4,9 @@ import rq
 import frappe
 
 from press.api.analytics import get_current_cpu_usage_for_sites_on_server
+from press.press.doctype.agent_job.agent_job import suspend_sites
 from press.press.doctype.site_plan.site_plan import get_plan_config
-from press.utils import log_error
+from press.utils import bulk_update, chunk, log_error
 
 
 @functools.lru_cache(maxsize=128)
@@ -47,33 +48,36 @@ def update_cpu_usages():
 
 def update_cpu_usage_server(server):
 	usage = get_current_cpu_usage_for_sites_on_server(server)
+	if not usage:
+		return
+
 	sites = frappe.get_all(
 		"Site",
-		filters={"status": "Active", "server": server},
+		filters={"status": "Active", "server": server, "name": ("in", list(usage))},
 		fields=["name", "plan", "current_cpu_usage"],
 	)
 
+	updates = {}
 	for site in sites:
-		if site.name not in usage:
-			continue
+		cpu_usage = usage[site.name]
 		try:
-			cpu_usage = usage[site.name]
 			cpu_limit = get_cpu_limits(site.plan)
 			latest_cpu_usage = int((cpu_usage / cpu_limit) * 100)
-
-			if site.current_cpu_usage != latest_cpu_usage:
-				site_doc = frappe.get_doc("Site", site.name)
-				site_doc.current_cpu_usage = latest_cpu_usage
-				site_doc.save()
-				frappe.db.commit()
-		except rq.timeouts.JobTimeoutException:
-			frappe.db.rollback()
-			return
 		except Exception:
-			log_error(
-				"Site CPU Usage Update Error", site=site, cpu_usage=cpu_usage, cpu_limit=cpu_limit
-			)
-			frappe.db.rollback()
+			log_error("Site CPU Usage Update Error", site=site, cpu_usage=cpu_usage)
+			continue
+
+		if site.current_cpu_usage != latest_cpu_usage:
+			updates[site.name] = {"current_cpu_usage": latest_cpu_usage}
+
+	try:
+		bulk_update("Site", updates)
+		frappe.db.commit()
+	except rq.timeouts.JobTimeoutException:
+		frappe.db.rollback()
+	except Exception:
+		log_error("Site CPU Usage Update Error", server=server, updates=updates)
+		frappe.db.rollback()
 
 
 def update_disk_usages():
@@ -132,15 +136,26 @@ def update_disk_usages():
 		as_dict=True,
 	)
 
-	for usage in latest_disk_usages:
+	updates = {
+		usage.site: {
+			"current_database_usage": usage.latest_database_usage,
+			"current_disk_usage": usage.latest_disk_usage,
+		}
+		for usage in latest_disk_usages
+	}
+	for sites in chunk(list(updates), 500):
 		try:
-			site = frappe.get_doc("Site", usage.site, for_update=True)
-			site.current_database_usage = usage.latest_database_usage
-			site.current_disk_usage = usage.latest_disk_usage
-			site.save()
+			bulk_update("Site", {site: updates[site] for site in sites})
 			frappe.db.commit()
-		except frappe.DoesNotExistError:
-			frappe.db.rollback()
 		except Exception:
-			log_error("Site Disk Usage Update Error", usage=usage)
+			log_error("Site Disk Usage Update Error", sites=sites)
 			frappe.db.rollback()
+
+	# Don't wait for the hourly check to suspend sites that just crossed their limits
+	exceeded = [
+		usage.site
+		for usage in latest_disk_usages
+		if (usage.latest_database_usage or 0) > 100 or (usage.latest_disk_usage or 0) > 100
+	]
+	if exceeded:
+		suspend_sites(sites=exceeded)
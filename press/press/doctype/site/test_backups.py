@@ -115,6 +115,17 @@ class TestScheduledBackupJob(FrappeTestCase):
 		self.assertLess(sites_num_new, sites_num_old)
 		self.assertEqual(sites_num_old - sites_num_new, limit)
 
+	def test_concurrent_backups_per_server_limited(self):
+		self._create_x_sites_on_1_bench(3)
+
+		job = ScheduledBackupJob(backup_type="Logical")
+		job.max_concurrent_backups_per_server = 1
+		job._load_ongoing_backups_by_server()
+		job.start()
+
+		sites_for_backup = [site.name for site in job.sites]
+		self.assertEqual(frappe.db.count("Site Backup", {"site": ("in", sites_for_backup)}), 1)
+
 	def test_sites_considered_for_backup(self):
 		"""Ensure sites with succesful or pending backups in past interval are skipped."""
 		sites = Site.get_sites_for_backup(self.interval)
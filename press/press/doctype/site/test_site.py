@@ -525,3 +525,57 @@ class TestSite(unittest.TestCase):
 		self.assertEqual(site.apps[0].app, "frappe")
 		self.assertEqual(site.apps[1].app, "erpnext")
 		self.assertEqual(site.apps[2].app, "crm")
+
+	def test_cpu_usages_of_all_sites_on_server_are_updated_together(self):
+		from press.press.doctype.site.site_usages import update_cpu_usage_server
+
+		site = create_test_site()
+		other_site = create_test_site(bench=site.bench)
+		usage = {site.name: 500_000, other_site.name: 250_000, "archived.site": 100_000}
+
+		with patch(
+			"press.press.doctype.site.site_usages.get_current_cpu_usage_for_sites_on_server",
+			return_value=usage,
+		), patch("press.press.doctype.site.site_usages.get_cpu_limits", return_value=1_000_000):
+			update_cpu_usage_server(site.server)
+
+		self.assertEqual(frappe.db.get_value("Site", site.name, "current_cpu_usage"), 50)
+		self.assertEqual(frappe.db.get_value("Site", other_site.name, "current_cpu_usage"), 25)
+
+	def test_disk_usages_are_updated_in_bulk_and_only_over_limit_sites_suspended(self):
+		from press.agent import Agent
+		from press.press.doctype.site.site_usages import update_disk_usages
+		from press.press.doctype.site_plan.test_site_plan import create_test_plan
+		from press.press.doctype.subscription.test_subscription import create_test_subscription
+		from press.utils import bulk_update, chunk
+
+		plan = create_test_plan("Site")
+		plan.db_set({"max_database_usage": 1000, "max_storage_usage": 1000})
+		site = create_test_site()
+		other_site = create_test_site(bench=site.bench)
+		for s, database in ((site, 500), (other_site, 1500)):
+			create_test_subscription(s.name, plan.name, s.team)
+			frappe.get_doc(
+				{"doctype": "Site Usage", "site": s.name, "database": database, "public": 200, "private": 100}
+			).insert(ignore_permissions=True)
+		frappe.db.set_single_value("Press Settings", "enforce_storage_limits", True)
+
+		with patch(
+			"press.press.doctype.site.site_usages.chunk", side_effect=lambda items, _: chunk(items, 1)
+		), patch(
+			"press.press.doctype.site.site_usages.bulk_update", wraps=bulk_update
+		) as mock_bulk_update, patch.object(Site, "suspend", autospec=True) as mock_suspend, patch.object(
+			Agent, "reload_nginx"
+		):
+			update_disk_usages()
+
+		self.assertEqual(mock_bulk_update.call_count, 2)
+		self.assertEqual(
+			frappe.db.get_value("Site", site.name, ["current_database_usage", "current_disk_usage"]), (50, 30)
+		)
+		self.assertEqual(
+			frappe.db.get_value("Site", other_site.name, ["current_database_usage", "current_disk_usage"]),
+			(150, 30),
+		)
+		mock_suspend.assert_called_once()
+		self.assertEqual(mock_suspend.call_args.args[0].name, other_site.name)
@@ -14,7 +14,6 @@ import pytz
 from frappe.core.utils import find
 from frappe.model.document import Document
 from frappe.utils import convert_utc_to_system_timezone
-from frappe.utils.caching import site_cache
 from frappe.utils.data import cint
 
 from press.agent import Agent
@@ -585,25 +584,112 @@ def update_status(
 			)
 
 
-@site_cache(ttl=60)
-def benches_with_available_update(site=None, server=None):
-	site_bench = frappe.db.get_value("Site", site, "bench") if site else None
-	values = {}
+# Benches with an update available, maintained in redis for the dashboard.
+# Updated on bench status changes and new deploy candidate differences,
+# and rebuilt from scratch when it expires.
+AVAILABLE_UPDATE_INDEX_KEY = "benches_with_available_update"
+AVAILABLE_UPDATE_INDEX_TTL = 10 * 60
+
+
+def benches_with_available_update(site=None, server=None) -> list[str]:
 	if site:
-		values["site_bench"] = site_bench
+		# Single bench lookups are cheap enough to always be fresh
+		bench = frappe.db.get_value("Site", site, "bench")
+		return list(find_benches_with_available_update(benches=[bench])) if bench else []
+
+	benches = get_available_update_index()
 	if server:
-		values["server"] = server
+		benches &= set(
+			frappe.get_all("Bench", {"server": server, "status": ("in", ("Active", "Broken"))}, pluck="name")
+		)
+	return list(benches)
+
+
+def filter_benches_with_available_update(benches) -> set[str]:
+	"""Benches among `benches` that have an update available, in a single redis lookup"""
+	benches = list(set(filter(None, benches)))
+	if not benches:
+		return set()
+
+	if not frappe.cache.exists(f"{AVAILABLE_UPDATE_INDEX_KEY}:built"):
+		return get_available_update_index() & set(benches)
+
+	flags = frappe.cache.smismember(frappe.cache.make_key(AVAILABLE_UPDATE_INDEX_KEY), benches)
+	return {bench for bench, flag in zip(benches, flags) if flag}
+
+
+def get_available_update_index() -> set[str]:
+	if frappe.cache.exists(f"{AVAILABLE_UPDATE_INDEX_KEY}:built"):
+		return {frappe.safe_decode(bench) for bench in frappe.cache.smembers(AVAILABLE_UPDATE_INDEX_KEY)}
+
+	benches = find_benches_with_available_update()
+	key = frappe.cache.make_key(AVAILABLE_UPDATE_INDEX_KEY)
+	pipeline = frappe.cache.pipeline()
+	pipeline.delete(key)
+	if benches:
+		pipeline.sadd(key, *benches)
+		pipeline.expire(key, AVAILABLE_UPDATE_INDEX_TTL)
+	pipeline.set(
+		frappe.cache.make_key(f"{AVAILABLE_UPDATE_INDEX_KEY}:built"), 1, ex=AVAILABLE_UPDATE_INDEX_TTL
+	)
+	pipeline.execute()
+	return benches
+
+
+def update_available_update_index(benches: list[str]):
+	"""Recompute the index entries of `benches`"""
+	if not benches or not frappe.cache.exists(f"{AVAILABLE_UPDATE_INDEX_KEY}:built"):
+		# Nothing to update, the index is built on next read
+		return
+
+	available = find_benches_with_available_update(benches=benches)
+	key = frappe.cache.make_key(AVAILABLE_UPDATE_INDEX_KEY)
+	pipeline = frappe.cache.pipeline()
+	if available:
+		pipeline.sadd(key, *available)
+	unavailable = set(benches) - available
+	if unavailable:
+		pipeline.srem(key, *unavailable)
+	pipeline.execute()
+
+
+def on_bench_status_change(bench: str):
+	"""Update the bench and the benches that could be updated to it, once the change is committed"""
+	candidate, server = frappe.db.get_value("Bench", bench, ["candidate", "server"])
+	Bench = frappe.qb.DocType("Bench")
+	DeployCandidateDifference = frappe.qb.DocType("Deploy Candidate Difference")
+	sources = (
+		frappe.qb.from_(Bench)
+		.join(DeployCandidateDifference)
+		.on(DeployCandidateDifference.source == Bench.candidate)
+		.select(Bench.name)
+		.where((DeployCandidateDifference.destination == candidate) & (Bench.server == server))
+		.run(pluck=True)
+	)
+	benches = [bench, *sources]
+	frappe.db.after_commit.add(lambda: update_available_update_index(benches))
+
+
+def on_deploy_candidate_difference_insert(source_candidate: str):
+	benches = frappe.get_all("Bench", {"candidate": source_candidate}, pluck="name")
+	frappe.db.after_commit.add(lambda: update_available_update_index(benches))
+
+
+def find_benches_with_available_update(benches: list[str] | None = None) -> set[str]:
+	"""Active or Broken benches whose candidate has a newer candidate deployed on an Active bench on the same server"""
+	values = {"benches": tuple(benches)} if benches else {}
 	source_benches_info = frappe.db.sql(
 		f"""
 		SELECT sb.name AS source_bench, sb.candidate AS source_candidate, sb.server AS server, dcd.destination AS destination_candidate
 		FROM `tabBench` sb, `tabDeploy Candidate Difference` dcd
 		WHERE sb.status IN ('Active', 'Broken') AND sb.candidate = dcd.source
-		{"AND sb.name = %(site_bench)s" if site else ""}
-		{"AND sb.server = %(server)s" if server else ""}
+		{"AND sb.name IN %(benches)s" if benches else ""}
 		""",
 		values=values,
 		as_dict=True,
 	)
+	if not source_benches_info:
+		return set()
 
 	destination_candidates = list(set(d["destination_candidate"] for d in source_benches_info))
 
@@ -623,7 +709,7 @@ def benches_with_available_update(site=None, server=None):
 		if (bench.destination_candidate, bench.server) in destinations:
 			updates_available_for_benches.append(bench)
 
-	return list(set([bench.source_bench for bench in updates_available_for_benches]))
+	return set([bench.source_bench for bench in updates_available_for_benches])
 
 
 @frappe.whitelist()
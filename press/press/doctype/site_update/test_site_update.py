@@ -156,3 +156,34 @@ class TestSiteUpdate(FrappeTestCase):
 		self.assertEqual(bench1.background_workers, 1)
 		self.assertGreater(bench2.gunicorn_workers, 2)
 		self.assertGreater(bench2.background_workers, 1)
+
+	@patch(
+		"press.press.doctype.app_release_difference.app_release_difference.Github",
+		new=MagicMock(),
+	)
+	@patch.object(AgentJob, "enqueue_http_request", new=Mock())
+	def test_available_update_index_is_updated_incrementally(self):
+		from press.press.doctype.site_update.site_update import (
+			AVAILABLE_UPDATE_INDEX_KEY,
+			filter_benches_with_available_update,
+			get_available_update_index,
+			update_available_update_index,
+		)
+
+		app = create_test_app()
+		group = create_test_release_group([app])
+		bench1 = create_test_bench(group=group)
+		create_test_app_release(app_source=frappe.get_doc("App Source", group.apps[0].source))
+		bench2 = create_test_bench(group=group, server=bench1.server)
+		create_test_deploy_candidate_differences(bench2.candidate)
+
+		frappe.cache.delete_value([AVAILABLE_UPDATE_INDEX_KEY, f"{AVAILABLE_UPDATE_INDEX_KEY}:built"])
+		self.assertIn(bench1.name, get_available_update_index())
+		self.assertEqual(filter_benches_with_available_update([bench1.name, bench2.name]), {bench1.name})
+
+		# destination bench goes away, index is updated without a rebuild
+		frappe.db.set_value("Bench", bench2.name, "status", "Archived")
+		update_available_update_index([bench1.name])
+		self.assertEqual(filter_benches_with_available_update([bench1.name, bench2.name]), set())
+
+		frappe.cache.delete_value([AVAILABLE_UPDATE_INDEX_KEY, f"{AVAILABLE_UPDATE_INDEX_KEY}:built"])
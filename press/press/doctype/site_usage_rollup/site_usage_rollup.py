@@ -0,0 +1,246 @@
+# Copyright (c) 2026, Frappe and contributors
+# For license information, please see license.txt
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import convert_utc_to_timezone, get_datetime
+
+# Size of rolled up buckets, dashboard timegrains that are multiples of this are served from rollups
+ROLLUP_TIMEGRAIN = 30 * 60
+ROLLUP_RETENTION_DAYS = 16
+# Seconds of logs rolled up in a single run, so the first run backfills over a few runs
+ROLLUP_MAX_WINDOW = 24 * 60 * 60
+# Logs reach the log server late, don't roll up the most recent minutes
+ROLLUP_SETTLE_DELAY = 5 * 60
+ROLLUP_WATERMARK_KEY = "site_usage_rollup_until"
+
+
+class SiteUsageRollup(Document):
+	# begin: auto-generated types
+	# This code is auto-generated. Do not modify anything in this block.
+
+	from typing import TYPE_CHECKING
+
+	if TYPE_CHECKING:
+		from frappe.types import DF
+
+		count: DF.Int
+		duration: DF.Float
+		max_counter: DF.Float
+		name: DF.Int | None
+		site: DF.Link
+		timestamp: DF.Datetime
+		transaction_type: DF.Literal["request", "job"]
+	# end: auto-generated types
+
+	pass
+
+
+def rollup_site_usage():
+	"""Materialise request and job usage of all sites from the log server in ROLLUP_TIMEGRAIN buckets"""
+	if not frappe.db.get_single_value("Press Settings", "log_server"):
+		return
+
+	until = floor_to_grain(utcnow() - timedelta(seconds=ROLLUP_SETTLE_DELAY), ROLLUP_TIMEGRAIN)
+	oldest = floor_to_grain(until - timedelta(days=ROLLUP_RETENTION_DAYS), ROLLUP_TIMEGRAIN)
+	watermark = get_rollup_watermark()
+	# Roll up the last bucket again, to pick up logs that arrived late
+	since = max(watermark - timedelta(seconds=ROLLUP_TIMEGRAIN), oldest) if watermark else oldest
+	until = min(until, since + timedelta(seconds=ROLLUP_MAX_WINDOW))
+	if since >= until:
+		return
+
+	rows = fetch_usage_buckets(since, until)
+
+	rollup = frappe.qb.DocType("Site Usage Rollup")
+	frappe.qb.from_(rollup).delete().where(
+		(rollup.timestamp >= since) & (rollup.timestamp < until) | (rollup.timestamp < oldest)
+	).run()
+	now = frappe.utils.now_datetime()
+	frappe.db.bulk_insert(
+		"Site Usage Rollup",
+		["site", "transaction_type", "timestamp", "count", "duration", "max_counter", "creation", "modified"],
+		[(*row, now, now) for row in rows],
+	)
+	frappe.db.commit()
+	frappe.cache.set_value(ROLLUP_WATERMARK_KEY, until)
+
+
+def fetch_usage_buckets(since: datetime, until: datetime) -> list[tuple]:
+	"""Usage of all sites between `since` and `until`, paginated with a composite aggregation"""
+	from press.api.analytics import get_elasticsearch_client
+
+	client = get_elasticsearch_client()
+	query = {
+		"bool": {
+			"filter": [
+				{"terms": {"json.transaction_type": ["request", "job"]}},
+				{
+					"range": {
+						"@timestamp": {
+							"gte": to_epoch_millis(since),
+							"lt": to_epoch_millis(until),
+							"format": "epoch_millis",
+						}
+					}
+				},
+			]
+		}
+	}
+	composite = {
+		"size": 1000,
+		"sources": [
+			{"site": {"terms": {"field": "json.site"}}},
+			{"transaction_type": {"terms": {"field": "json.transaction_type"}}},
+			{
+				"timestamp": {
+					"date_histogram": {"field": "@timestamp", "fixed_interval": f"{ROLLUP_TIMEGRAIN}s"}
+				}
+			},
+		],
+	}
+	metrics = {
+		"duration": {"sum": {"field": "json.duration"}},
+		"count": {"value_count": {"field": "json.duration"}},
+		"max": {"max": {"field": "json.request.counter"}},
+	}
+
+	rows = []
+	while True:
+		response = client.search(
+			index="filebeat-*", size=0, query=query, aggs={"usage": {"composite": composite, "aggs": metrics}}
+		)
+		result = response["aggregations"]["usage"]
+		for bucket in result["buckets"]:
+			key = bucket["key"]
+			rows.append(
+				(
+					key["site"],
+					key["transaction_type"],
+					from_epoch_millis(key["timestamp"]),
+					bucket["count"]["value"],
+					bucket["duration"]["value"] or 0,
+					bucket["max"]["value"],
+				)
+			)
+
+		if not result["buckets"] or not result.get("after_key"):
+			break
+		composite["after"] = result["after_key"]
+	return rows
+
+
+def get_usage_from_rollup(site, type, timezone, timespan, timegrain) -> list | None:
+	"""
+	Usage of the site in the same shape as `press.api.analytics.get_usage`
+
+	Completed buckets are read from rollups and only the latest partial bucket
+	is queried from the log server. Returns None if rollups can't serve the timespan.
+	"""
+	if timegrain % ROLLUP_TIMEGRAIN:
+		return None
+
+	now = utcnow()
+	start = floor_to_grain(now - timedelta(seconds=timespan), ROLLUP_TIMEGRAIN)
+	coverage_start, coverage_end = get_rollup_coverage()
+	if not coverage_start or not coverage_end or coverage_start > start:
+		return None
+
+	buckets = {}
+	for row in frappe.get_all(
+		"Site Usage Rollup",
+		filters={
+			"site": site,
+			"transaction_type": type,
+			"timestamp": ("between", (start, coverage_end - timedelta(seconds=1))),
+		},
+		fields=["timestamp", "count", "duration", "max_counter"],
+	):
+		add_to_bucket(
+			buckets, floor_to_grain(row.timestamp, timegrain), row.count, row.duration, row.max_counter
+		)
+
+	if coverage_end < now:
+		for timestamp, count, duration, max_counter in get_recent_usage(site, type, timegrain, coverage_end):
+			add_to_bucket(buckets, timestamp, count, duration, max_counter)
+
+	usage = []
+	bucket = floor_to_grain(start, timegrain)
+	while bucket <= now:
+		count, duration, max_counter = buckets.get(bucket, (0, 0.0, None))
+		usage.append(
+			frappe._dict(
+				{
+					"date": convert_utc_to_timezone(bucket, timezone),
+					"count": count,
+					"duration": duration,
+					"max": max_counter,
+				}
+			)
+		)
+		bucket += timedelta(seconds=timegrain)
+	return usage
+
+
+def get_recent_usage(site, type, timegrain, since: datetime) -> list[tuple]:
+	"""Usage of the site after `since`, straight from the log server"""
+	from press.api.analytics import get_elasticsearch_client, get_usage_search
+
+	search = get_usage_search(site, type, None, timegrain, since=to_epoch_millis(since))
+	response = search.using(get_elasticsearch_client()).execute().to_dict()
+	return [
+		(
+			from_epoch_millis(bucket["key"]),
+			bucket["count"]["value"],
+			bucket["duration"]["value"] or 0,
+			bucket["max"]["value"],
+		)
+		for bucket in response.get("aggregations", {}).get("date_histogram", {}).get("buckets", [])
+	]
+
+
+def add_to_bucket(buckets: dict, timestamp: datetime, count, duration, max_counter):
+	previous_count, previous_duration, previous_max = buckets.get(timestamp, (0, 0.0, None))
+	if previous_max is not None and (max_counter is None or previous_max > max_counter):
+		max_counter = previous_max
+	buckets[timestamp] = (previous_count + (count or 0), previous_duration + (duration or 0), max_counter)
+
+
+def get_rollup_coverage() -> tuple[datetime | None, datetime | None]:
+	"""Start of the oldest rolled up bucket and end of the newest, in UTC"""
+	oldest = frappe.db.sql("select min(timestamp) from `tabSite Usage Rollup`")[0][0]
+	return (get_datetime(oldest) if oldest else None), get_rollup_watermark()
+
+
+def get_rollup_watermark() -> datetime | None:
+	watermark = frappe.cache.get_value(ROLLUP_WATERMARK_KEY)
+	if not watermark:
+		newest = frappe.db.sql("select max(timestamp) from `tabSite Usage Rollup`")[0][0]
+		watermark = newest and get_datetime(newest) + timedelta(seconds=ROLLUP_TIMEGRAIN)
+	return get_datetime(watermark) if watermark else None
+
+
+def utcnow() -> datetime:
+	return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def floor_to_grain(dt: datetime, grain: int) -> datetime:
+	"""Round down a naive UTC datetime to the grain, aligned to epoch like Elasticsearch's fixed intervals"""
+	epoch = int(dt.replace(tzinfo=timezone.utc).timestamp())
+	return datetime.fromtimestamp(epoch - epoch % grain, timezone.utc).replace(tzinfo=None)
+
+
+def to_epoch_millis(dt: datetime) -> int:
+	return int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def from_epoch_millis(millis: int) -> datetime:
+	return datetime.fromtimestamp(millis / 1000, timezone.utc).replace(tzinfo=None)
+
+
+def on_doctype_update():
+	frappe.db.add_index("Site Usage Rollup", ["site", "transaction_type", "timestamp"])
+	frappe.db.add_index("Site Usage Rollup", ["timestamp"])
@@ -0,0 +1,76 @@
+# Copyright (c) 2026, Frappe and Contributors
+# See license.txt
+
+from datetime import timedelta
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from press.press.doctype.site_usage_rollup.site_usage_rollup import (
+	ROLLUP_TIMEGRAIN,
+	ROLLUP_WATERMARK_KEY,
+	floor_to_grain,
+	get_usage_from_rollup,
+	utcnow,
+)
+
+
+class TestSiteUsageRollup(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.rollback()
+		frappe.cache.delete_value(ROLLUP_WATERMARK_KEY)
+
+	def insert_rollup(self, timestamp, count, duration, max_counter, site="rollup.test"):
+		frappe.get_doc(
+			{
+				"doctype": "Site Usage Rollup",
+				"site": site,
+				"transaction_type": "request",
+				"timestamp": timestamp,
+				"count": count,
+				"duration": duration,
+				"max_counter": max_counter,
+			}
+		).db_insert()
+
+	def test_timegrain_not_multiple_of_rollup_is_not_served(self):
+		self.assertIsNone(get_usage_from_rollup("rollup.test", "request", "UTC", 60 * 60, 60))
+
+	def test_partially_covered_timespan_is_not_served(self):
+		self.insert_rollup(floor_to_grain(utcnow(), ROLLUP_TIMEGRAIN) - timedelta(hours=2), 1, 1, 1)
+		self.assertIsNone(get_usage_from_rollup("rollup.test", "request", "UTC", 24 * 60 * 60, 60 * 60))
+
+	def test_rollups_are_merged_with_recent_usage(self):
+		grain = 2 * ROLLUP_TIMEGRAIN
+		timespan = 24 * 60 * 60
+		now = utcnow()
+		start = floor_to_grain(now - timedelta(seconds=timespan), ROLLUP_TIMEGRAIN)
+		current = floor_to_grain(now, grain)
+		watermark = floor_to_grain(now, ROLLUP_TIMEGRAIN)
+
+		self.insert_rollup(start, 1, 1, 1)
+		self.insert_rollup(current - timedelta(seconds=grain), 2, 20, 5)
+		self.insert_rollup(current - timedelta(seconds=ROLLUP_TIMEGRAIN), 3, 30, 7)
+		self.insert_rollup(current - timedelta(seconds=ROLLUP_TIMEGRAIN), 100, 100, 100, site="other.test")
+		frappe.cache.set_value(ROLLUP_WATERMARK_KEY, watermark)
+
+		with patch(
+			"press.press.doctype.site_usage_rollup.site_usage_rollup.get_recent_usage",
+			return_value=[(floor_to_grain(watermark, grain), 4, 40, 6)],
+		) as get_recent_usage:
+			usage = get_usage_from_rollup("rollup.test", "request", "UTC", timespan, grain)
+
+		get_recent_usage.assert_called_once_with("rollup.test", "request", grain, watermark)
+		by_date = {row.date.replace(tzinfo=None): row for row in usage}
+		self.assertEqual(len(by_date), len(usage))
+		self.assertEqual(usage[0].date.replace(tzinfo=None), floor_to_grain(start, grain))
+		self.assertEqual(usage[-1].date.replace(tzinfo=None), current)
+
+		# Both rollup buckets fall in the previous timegrain bucket
+		previous = by_date[current - timedelta(seconds=grain)]
+		self.assertEqual((previous.count, previous.duration, previous.max), (5, 50, 7))
+		latest = by_date[current]
+		self.assertEqual((latest.count, latest.duration, latest.max), (4, 40, 6))
+		self.assertEqual(sum(row.count for row in usage), 1 + 2 + 3 + 4)
+		self.assertEqual(max(row.max or 0 for row in usage), 7)
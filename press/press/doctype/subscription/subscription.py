@@ -11,7 +11,7 @@ from frappe.utils import cint, flt
 
 from press.overrides import get_permission_query_conditions_for_doctype
 from press.press.doctype.site_plan.site_plan import SitePlan
-from press.utils import log_error
+from press.utils import chunk, log_error
 from press.utils.jobs import has_job_timeout_exceeded
 
 
@@ -249,42 +249,300 @@ class Subscription(Document):
 		)
 
 
+PAID_PLAN_DOCTYPES = (
+	"Site Plan",
+	"Marketplace App Plan",
+	"Server Plan",
+	"Server Storage Plan",
+	"Cluster Plan",
+)
+
+
 def create_usage_records():
 	"""
 	Creates daily usage records for paid Subscriptions
+
+	Subscriptions missing today's usage record are found with a single query.
+	They are priced in bulk and inserted with a multi-row insert, committed in
+	batches of `usage_record_creation_batch_size`. The new usage records are then
+	added to invoices, with one update per invoice in each batch.
 	"""
-	free_sites = sites_with_free_hosting()
-	settings = frappe.get_single("Press Settings")
-	subscriptions = frappe.db.get_all(
-		"Subscription",
+	date = frappe.utils.getdate()
+	batch_size = cint(frappe.db.get_single_value("Press Settings", "usage_record_creation_batch_size")) or 500
+	for subscriptions in chunk(get_subscriptions_without_usage_record(date), batch_size):
+		if has_job_timeout_exceeded():
+			return
+		insert_usage_records(get_usage_records_for_subscriptions(subscriptions, date))
+		frappe.db.commit()
+
+	add_usage_records_to_invoices(date, batch_size)
+
+
+def get_subscriptions_without_usage_record(date) -> list[frappe._dict]:
+	"""Enabled subscriptions on paid plans, that aren't hosted for free and aren't charged for `date` yet"""
+	paid_plans = " UNION ".join(
+		f"SELECT `name` FROM `tab{doctype}` WHERE `price_inr` > 0 AND `enabled` = 1"
+		for doctype in PAID_PLAN_DOCTYPES
+	)
+	return frappe.db.sql(
+		f"""
+		SELECT
+			s.`name`, s.`team`, s.`document_type`, s.`document_name`, s.`plan_type`, s.`plan`,
+			s.`interval`, s.`additional_storage`, s.`site`, s.`marketplace_app_subscription`, s.`enabled`
+		FROM
+			`tabSubscription` s
+		WHERE
+			s.`enabled` = 1
+			AND s.`plan` IN ({paid_plans})
+			AND NOT EXISTS (
+				SELECT 1 FROM `tabUsage Record` ur
+				WHERE ur.`subscription` = s.`name` AND (
+					ur.`date` = %(date)s
+					OR (s.`interval` = 'Monthly' AND ur.`date` BETWEEN %(first_day)s AND %(last_day)s)
+				)
+			)
+			AND NOT EXISTS (
+				SELECT 1 FROM `tabSite` site
+				LEFT JOIN `tabTeam` team ON team.`name` = site.`team`
+				WHERE site.`name` = s.`document_name`
+					AND site.`status` NOT IN ('Archived', 'Suspended')
+					AND (site.`free` = 1 OR (team.`free_account` = 1 AND team.`enabled` = 1))
+			)
+		""",
+		{
+			"date": date,
+			"first_day": frappe.utils.get_first_day(date),
+			"last_day": frappe.utils.get_last_day(date),
+		},
+		as_dict=True,
+	)
+
+
+def get_usage_records_for_subscriptions(subscriptions: list[frappe._dict], date) -> list[dict]:
+	"""Price the usage records of chargeable subscriptions, same as `Subscription.create_usage_record`"""
+	if not subscriptions:
+		return []
+
+	documents = get_documents_by_type({(row.document_type, row.document_name) for row in subscriptions})
+	plans = get_documents_by_type({(row.plan_type, row.plan) for row in subscriptions})
+	billing_teams = get_billing_teams({row.team for row in subscriptions})
+	create_missing_upcoming_invoices({team.name for team in billing_teams.values()})
+	marketplace_sites = dict(
+		frappe.get_all(
+			"Marketplace App Subscription",
+			filters={
+				"name": (
+					"in",
+					[
+						row.marketplace_app_subscription
+						for row in subscriptions
+						if row.marketplace_app_subscription
+					],
+				)
+			},
+			fields=["name", "site"],
+			as_list=True,
+		)
+	)
+
+	usage_records = []
+	for row in subscriptions:
+		subscription = frappe.get_doc({"doctype": "Subscription", **row})
+		subscription._subscribed_document = documents.get((row.document_type, row.document_name))
+		team = billing_teams.get(row.team)
+		plan = plans.get((row.plan_type, row.plan))
+		if not (team and plan and subscription.can_charge_for_subscription()):
+			continue
+
+		usage_records.append(
+			{
+				"team": team.name,
+				"document_type": row.document_type,
+				"document_name": row.document_name,
+				"plan_type": row.plan_type,
+				"plan": plan.name,
+				"amount": get_usage_amount(subscription, plan, team.currency),
+				"date": date,
+				"subscription": row.name,
+				"interval": row.interval,
+				"site": (row.site or marketplace_sites.get(row.marketplace_app_subscription))
+				if row.document_type == "Marketplace App"
+				else None,
+			}
+		)
+	return usage_records
+
+
+def get_usage_amount(subscription: Subscription, plan, currency: str) -> float:
+	if subscription.additional_storage:
+		price = plan.price_inr if currency == "INR" else plan.price_usd
+		price_per_day = price / plan.period  # no rounding off to avoid discrepancies
+		return flt((price_per_day * cint(subscription.additional_storage)), 2)
+	return plan.get_price_for_interval(subscription.interval, currency)
+
+
+def get_documents_by_type(keys: set[tuple[str, str]]) -> dict[tuple[str, str], Document]:
+	"""Load documents with one query per doctype, without child tables"""
+	names_by_doctype = {}
+	for doctype, name in keys:
+		names_by_doctype.setdefault(doctype, []).append(name)
+
+	documents = {}
+	for doctype, names in names_by_doctype.items():
+		for row in frappe.get_all(doctype, filters={"name": ("in", names)}, fields=["*"]):
+			documents[(doctype, row.name)] = frappe.get_doc({**row, "doctype": doctype})
+	return documents
+
+
+def get_billing_teams(teams: set[str]) -> dict[str, frappe._dict]:
+	"""Map teams to the team that is billed for them, same as `Subscription.create_usage_record`"""
+	fields = ["name", "parent_team", "billing_team", "payment_mode", "currency", "free_account"]
+	rows = {
+		row.name: row for row in frappe.get_all("Team", filters={"name": ("in", list(teams))}, fields=fields)
+	}
+	related = {row.parent_team for row in rows.values()} | {row.billing_team for row in rows.values()}
+	related = [team for team in related if team and team not in rows]
+	if related:
+		rows.update(
+			{
+				row.name: row
+				for row in frappe.get_all("Team", filters={"name": ("in", related)}, fields=fields)
+			}
+		)
+
+	billing_teams = {}
+	for name in teams:
+		team = rows.get(name)
+		if team and team.parent_team:
+			team = rows.get(team.parent_team)
+		if team and team.billing_team and team.payment_mode == "Paid By Partner":
+			team = rows.get(team.billing_team)
+		if team:
+			billing_teams[name] = team
+	return billing_teams
+
+
+def create_missing_upcoming_invoices(teams: set[str]):
+	today = frappe.utils.today()
+	with_invoices = frappe.get_all(
+		"Invoice",
 		filters={
-			"enabled": True,
-			"plan": ("in", paid_plans()),
-			"name": ("not in", created_usage_records(free_sites)),
-			"document_name": ("not in", free_sites),
+			"status": "Draft",
+			"team": ("in", list(teams)),
+			"type": "Subscription",
+			"period_start": ("<=", today),
+			"period_end": (">=", today),
 		},
-		pluck="name",
-		order_by=None,
-		limit=settings.usage_record_creation_batch_size or 500,
-		ignore_ifnull=True,
-		debug=True,
+		pluck="team",
+		distinct=True,
 	)
-	for name in subscriptions:
-		if has_job_timeout_exceeded():
-			return
-		subscription = frappe.get_cached_doc("Subscription", name)
-		try:
-			subscription.create_usage_record()
-			frappe.db.commit()
-		except rq.timeouts.JobTimeoutException:
-			# This job took too long to execute
-			# We need to rollback the transaction
-			# Try again in the next job
-			frappe.db.rollback()
-			return
-		except Exception:
-			frappe.db.rollback()
-			log_error(title="Create Usage Record Error", name=name)
+	for team in teams.difference(with_invoices):
+		frappe.get_cached_doc("Team", team).create_upcoming_invoice()
+
+
+def insert_usage_records(usage_records: list[dict]):
+	"""Insert submitted usage records with a multi-row insert, skipping their hooks"""
+	if not usage_records:
+		return
+
+	from frappe.model.naming import parse_naming_series
+
+	prefix = parse_naming_series("UR-.YYYY.-")
+	first = reserve_series(prefix, len(usage_records))
+	now = frappe.utils.now_datetime()
+	fields = list(usage_records[0])
+	frappe.db.bulk_insert(
+		"Usage Record",
+		["name", *fields, "time", "docstatus", "owner", "modified_by", "creation", "modified"],
+		[
+			(
+				f"{prefix}{first + index:06d}",
+				*(usage_record[field] for field in fields),
+				now.time(),
+				1,
+				frappe.session.user,
+				frappe.session.user,
+				now,
+				now,
+			)
+			for index, usage_record in enumerate(usage_records)
+		],
+	)
+
+
+def reserve_series(prefix: str, count: int) -> int:
+	"""Reserve `count` consecutive numbers of the naming series, returns the first one"""
+	Series = frappe.qb.DocType("Series")
+	current = frappe.qb.from_(Series).select(Series.current).where(Series.name == prefix).for_update().run()
+	if current:
+		current = current[0][0] or 0
+		frappe.qb.update(Series).set(Series.current, current + count).where(Series.name == prefix).run()
+	else:
+		current = 0
+		frappe.qb.into(Series).insert(prefix, count).run()
+	return current + 1
+
+
+def add_usage_records_to_invoices(date, batch_size: int = 500):
+	"""Add usage records of `date` that aren't on an invoice yet, one invoice at a time"""
+	for usage_records in chunk(get_unlinked_usage_records(date), batch_size):
+		usage_records_by_team = group_usage_records_by_billing_team(usage_records)
+		for team, team_usage_records in usage_records_by_team.items():
+			if has_job_timeout_exceeded() or not add_usage_records_to_team_invoice(team, team_usage_records):
+				return
+
+
+def get_unlinked_usage_records(date) -> list[frappe._dict]:
+	return frappe.get_all(
+		"Usage Record",
+		filters={"date": date, "docstatus": 1, "invoice": ("is", "not set")},
+		fields=[
+			"name",
+			"team",
+			"document_type",
+			"document_name",
+			"plan",
+			"amount",
+			"site",
+			"date",
+			"payout",
+			"invoice",
+		],
+		# Usage records of a team are mostly in the same batch
+		order_by="team asc",
+	)
+
+
+def group_usage_records_by_billing_team(usage_records: list[frappe._dict]) -> dict[str, list]:
+	"""Usage records grouped by the team that is billed for them, free accounts are left out"""
+	if not usage_records:
+		return {}
+
+	billing_teams = get_billing_teams({usage_record.team for usage_record in usage_records})
+	usage_records_by_team = {}
+	for usage_record in usage_records:
+		team = billing_teams.get(usage_record.team)
+		if team and not team.free_account:
+			usage_records_by_team.setdefault(team.name, []).append(usage_record)
+	return usage_records_by_team
+
+
+def add_usage_records_to_team_invoice(team: str, usage_records: list[frappe._dict]) -> bool:
+	"""Add usage records to the upcoming invoice of `team`, returns False if the job timed out"""
+	try:
+		# Lock the invoice, we don't want any other process to update it
+		invoice = frappe.get_cached_doc("Team", team).get_upcoming_invoice(for_update=True)
+		if not invoice:
+			invoice = frappe.get_cached_doc("Team", team).create_upcoming_invoice()
+		invoice.add_usage_records(usage_records)
+		frappe.db.commit()
+	except rq.timeouts.JobTimeoutException:
+		frappe.db.rollback()
+		return False
+	except Exception:
+		frappe.db.rollback()
+		log_error(title="Add Usage Records to Invoice Error", team=team)
+	return True
 
 
 def paid_plans():
@@ -293,14 +551,7 @@ def paid_plans():
 		"price_inr": (">", 0),
 		"enabled": 1,
 	}
-	doctypes = [
-		"Site Plan",
-		"Marketplace App Plan",
-		"Server Plan",
-		"Server Storage Plan",
-		"Cluster Plan",
-	]
-	for doctype in doctypes:
+	for doctype in PAID_PLAN_DOCTYPES:
 		paid_plans += frappe.get_all(doctype, filter, pluck="name", ignore_ifnull=True)
 
 	return list(set(paid_plans))
@@ -9,7 +9,7 @@ from unittest.mock import patch
 import frappe
 
 from press.press.doctype.site.test_site import create_test_site
-from press.press.doctype.subscription.subscription import sites_with_free_hosting
+from press.press.doctype.subscription.subscription import create_usage_records, sites_with_free_hosting
 from press.press.doctype.team.test_team import create_test_team
 
 
@@ -166,6 +166,46 @@ class TestSubscription(unittest.TestCase):
 		invoice = frappe.get_doc("Invoice", {"team": self.team.name, "status": "Draft"})
 		self.assertEqual(invoice.total, 0)
 
+	def test_create_usage_records_in_bulk(self):
+		plan = frappe.get_doc(
+			doctype="Site Plan",
+			name="Plan-10",
+			document_type="ToDo",
+			interval="Daily",
+			price_usd=30,
+			price_inr=30,
+		).insert()
+		todos = [frappe.get_doc(doctype="ToDo", description=f"Test todo {i}").insert() for i in range(3)]
+		subscriptions = [
+			create_test_subscription(todo.name, plan.name, self.team.name, document_type="ToDo")
+			for todo in todos
+		]
+
+		trial_site = create_test_site(team=self.team.name)
+		trial_site.db_set("trial_end_date", frappe.utils.add_days(None, 2))
+		create_test_subscription(trial_site.name, plan.name, self.team.name)
+
+		# Records are inserted and added to the invoice in more than one batch
+		frappe.db.set_single_value("Press Settings", "usage_record_creation_batch_size", 2)
+		create_usage_records()
+		# shouldn't create duplicate records
+		create_usage_records()
+
+		usage_records = frappe.get_all(
+			"Usage Record",
+			filters={"team": self.team.name, "date": frappe.utils.today()},
+			fields=["subscription", "amount", "invoice", "docstatus"],
+		)
+		self.assertEqual(
+			sorted(usage_record.subscription for usage_record in usage_records),
+			sorted(subscription.name for subscription in subscriptions),
+		)
+		self.assertTrue(all(usage_record.docstatus == 1 for usage_record in usage_records))
+
+		invoice = frappe.get_doc("Invoice", {"team": self.team.name, "status": "Draft"})
+		self.assertTrue(all(usage_record.invoice == invoice.name for usage_record in usage_records))
+		self.assertEqual(invoice.total, plan.get_price_per_day("INR") * 3)
+
 	def test_sites_with_free_hosting(self):
 		self.team.create_upcoming_invoice()
 
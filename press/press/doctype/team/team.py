@@ -1151,6 +1151,12 @@ class Team(Document):
 				log_error("Failed to remove subscription config in trial sites")
 
 	def get_upcoming_invoice(self, for_update=False):
+		name = self.get_upcoming_invoice_name()
+		if name:
+			return frappe.get_doc("Invoice", name, for_update=for_update)
+		return None
+
+	def get_upcoming_invoice_name(self) -> str | None:
 		# get the current period's invoice
 		today = frappe.utils.today()
 		result = frappe.db.get_all(
@@ -1166,9 +1172,7 @@ class Team(Document):
 			limit=1,
 			pluck="name",
 		)
-		if result:
-			return frappe.get_doc("Invoice", result[0], for_update=for_update)
-		return None
+		return result[0] if result else None
 
 	def create_upcoming_invoice(self):
 		today = frappe.utils.today()
@@ -1516,9 +1520,14 @@ def validate_site_creation(doc, method):
 
 
 def has_unsettled_invoices(team):
-	if not frappe.db.exists(
-		"Invoice", {"team": team, "status": ("in", ("Unpaid", "Draft")), "type": "Subscription"}
-	):
+	from press.press.doctype.invoice.invoice import add_pending_usage_to_totals
+
+	invoices = frappe.get_all(
+		"Invoice",
+		{"team": team, "status": ("in", ("Unpaid", "Draft")), "type": "Subscription"},
+		["name", "status", "total", "amount_due"],
+	)
+	if not invoices:
 		return False
 
 	currency = frappe.db.get_value("Team", team, "currency")
@@ -1526,12 +1535,8 @@ def has_unsettled_invoices(team):
 	if currency == "INR":
 		minimum_amount = 450
 
-	data = frappe.get_all(
-		"Invoice",
-		{"team": team, "status": ("in", ("Unpaid", "Draft")), "type": "Subscription"},
-		["sum(amount_due) as amount_due"],
-	)[0]
-	if data.amount_due <= minimum_amount:
+	amount_due = sum(invoice.amount_due or 0 for invoice in add_pending_usage_to_totals(invoices))
+	if amount_due <= minimum_amount:
 		return False
 	return True
 
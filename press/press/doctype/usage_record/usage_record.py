@@ -60,6 +60,13 @@ class UsageRecord(Document):
 
 		if team.free_account:
 			return
+
+		from press.press.doctype.invoice.invoice import is_incremental_invoice_aggregation_enabled
+
+		if is_incremental_invoice_aggregation_enabled() and not self.payout:
+			self.add_usage_to_invoice_ledger(team)
+			return
+
 		# Get a read lock on this invoice
 		# We're going to update the invoice and we don't want any other process to update it
 		invoice = team.get_upcoming_invoice(for_update=True)
@@ -68,6 +75,15 @@ class UsageRecord(Document):
 
 		invoice.add_usage_record(self)
 
+	def add_usage_to_invoice_ledger(self, team):
+		"""Record usage against the upcoming invoice without loading it"""
+		from press.press.doctype.invoice_usage_ledger.invoice_usage_ledger import add_to_pending_usage
+
+		# If the invoice is finalized meanwhile, the usage record stays unlinked
+		# and is added to the next invoice by `link_unlinked_usage_records`
+		invoice = team.get_upcoming_invoice_name() or team.create_upcoming_invoice().name
+		add_to_pending_usage(invoice, [self])
+
 	def remove_usage_from_invoice(self):
 		team = frappe.get_doc("Team", self.team)
 		invoice = team.get_upcoming_invoice()
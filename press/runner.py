@@ -1,4 +1,9 @@
+from __future__ import annotations
+
 import json
+import threading
+import traceback
+from datetime import datetime, timedelta
 
 import frappe
 import wrapt
@@ -16,6 +21,12 @@ from ansible.vars.manager import VariableManager
 from frappe.utils import cstr
 from frappe.utils import now_datetime as now
 
+# Seconds between writes of buffered task progress, also the most progress lost on a crash
+PROGRESS_FLUSH_INTERVAL = 2
+# Servers worked on at the same time by a fleet run, by default and at most
+FLEET_FORKS = 50
+MAX_FLEET_FORKS = 200
+
 
 def reconnect_on_failure():
 	@wrapt.decorator
@@ -32,14 +43,24 @@ def reconnect_on_failure():
 
 
 class AnsibleCallback(CallbackBase):
+	"""
+	Records task and play progress in Ansible Play/Task, one play per host.
+
+	`plays`, `tasks` and `task_lists` are keyed by inventory host name (the
+	server IP), so the same callback serves single host and fleet runs.
+	"""
+
 	def __init__(self, *args, **kwargs):
 		super().__init__(*args, **kwargs)
 
 	@reconnect_on_failure()
 	def process_task_success(self, result):
+		host = result._host.get_name()
 		result, action = frappe._dict(result._result), result._task.action
 		if action == "user":
-			server_type, server = frappe.db.get_value("Ansible Play", self.play, ["server_type", "server"])
+			server_type, server = frappe.db.get_value(
+				"Ansible Play", self.plays[host], ["server_type", "server"]
+			)
 			server = frappe.get_doc(server_type, server)
 			if result.name == "root":
 				server.root_public_key = result.ssh_public_key
@@ -60,8 +81,8 @@ class AnsibleCallback(CallbackBase):
 	def v2_runner_on_unreachable(self, result):
 		self.update_task("Unreachable", result)
 
-	def v2_playbook_on_task_start(self, task, is_conditional):
-		self.update_task("Running", None, task)
+	def v2_runner_on_start(self, host, task):
+		self.update_task("Running", None, task, host.get_name())
 
 	def v2_playbook_on_start(self, playbook):
 		self.update_play("Running")
@@ -71,92 +92,202 @@ class AnsibleCallback(CallbackBase):
 
 	@reconnect_on_failure()
 	def update_play(self, status=None, stats=None):
-		play = frappe.get_doc("Ansible Play", self.play)
-		if stats:
-			# Assume we're running on one host
-			host = next(iter(stats.processed.keys()))
-			play.update(stats.summarize(host))
-			if play.failures or play.unreachable:
+		if not stats:
+			frappe.db.set_value(
+				"Ansible Play",
+				{"name": ("in", list(self.plays.values()))},
+				{"status": status, "start": now()},
+			)
+			frappe.db.commit()
+			return
+
+		self.progress.stop()
+		for host, play in self.plays.items():
+			play = frappe.get_doc("Ansible Play", play)
+			if host in stats.processed:
+				play.update(stats.summarize(host))
+			if play.failures or play.unreachable or host not in stats.processed:
+				# Hosts of a fleet run may not be processed if the run was aborted earlier
 				play.status = "Failure"
 			else:
 				play.status = "Success"
 			play.end = now()
 			play.duration = play.end - play.start
-		else:
-			play.status = status
-			play.start = now()
-
-		play.save()
+			play.save()
 		frappe.db.commit()
 
 	@reconnect_on_failure()
-	def update_task(self, status, result=None, task=None):
+	def update_task(self, status, result=None, task=None, host=None):
 		if result:
 			if not result._task._role:
 				return
-			task_name, result = self.parse_result(result)
+			host, task_name, result = self.parse_result(result)
 		else:
 			if not task._role:
 				return
-			task_name = self.tasks[task._role.get_name()][task.name]
-		task = frappe.get_doc("Ansible Task", task_name)
-		task.status = status
+			task_name = self.tasks[host][task._role.get_name()][task.name]
+
+		values = {"status": status}
 		if result:
-			task.output = result.stdout
-			task.error = result.stderr
-			task.exception = result.msg
+			values.update(output=result.stdout, error=result.stderr, exception=result.msg)
 			# Reduce clutter be removing keys already shown elsewhere
 			for key in ("stdout", "stdout_lines", "stderr", "stderr_lines", "msg"):
 				result.pop(key, None)
-			task.result = json.dumps(result, indent=4)
-			task.end = now()
-			task.duration = task.end - task.start
+			values["result"] = json.dumps(result, indent=4)
+			values["end"] = now()
+			values["duration"] = values["end"] - self.progress.get_start(task_name)
 		else:
-			task.start = now()
-		task.save()
-		self.publish_play_progress(task.name)
-		frappe.db.commit()
+			values["start"] = now()
 
-	def publish_play_progress(self, task):
+		self.progress.update(host, task_name, **values)
+
+	def publish_play_progress(self, host, task):
+		task_list = self.task_lists[host]
 		frappe.publish_realtime(
 			"ansible_play_progress",
-			{"progress": self.task_list.index(task), "total": len(self.task_list), "play": self.play},
+			{"progress": task_list.index(task), "total": len(task_list), "play": self.plays[host]},
 			doctype="Ansible Play",
-			docname=self.play,
+			docname=self.plays[host],
 			user=frappe.session.user,
 		)
 
 	def parse_result(self, result):
+		host = result._host.get_name()
 		task = result._task.name
 		role = result._task._role.get_name()
-		return self.tasks[role][task], frappe._dict(result._result)
+		return host, self.tasks[host][role][task], frappe._dict(result._result)
+
+	# Async hooks run in the forked worker process that runs the task, buffered
+	# updates would be lost with it, so these are written right away
 
 	@reconnect_on_failure()
-	def on_async_start(self, role, task, job_id):
-		task_name = self.tasks[role][task]
-		task = frappe.get_doc("Ansible Task", task_name)
-		task.job_id = job_id
-		task.save()
+	def on_async_start(self, host, role, task, job_id):
+		task_name = self.tasks[host][role][task]
+		self.progress.job_tasks[job_id] = task_name
+		frappe.db.set_value("Ansible Task", task_name, "job_id", job_id)
 		frappe.db.commit()
 
 	@reconnect_on_failure()
 	def on_async_poll(self, result):
 		job_id = result["ansible_job_id"]
-		task_name = frappe.get_value("Ansible Task", {"play": self.play, "job_id": job_id}, "name")
-		task = frappe.get_doc("Ansible Task", task_name)
-		task.result = json.dumps(result, indent=4)
-		task.duration = now() - task.start
-		task.save()
+		task_name = self.progress.job_tasks.get(job_id) or frappe.get_value(
+			"Ansible Task", {"play": ("in", list(self.plays.values())), "job_id": job_id}, "name"
+		)
+		frappe.db.set_value(
+			"Ansible Task",
+			task_name,
+			{
+				"result": json.dumps(result, indent=4),
+				# Start of the task is known, the worker is forked after the task starts
+				"duration": now() - self.progress.get_start(task_name),
+			},
+		)
 		frappe.db.commit()
 
 
+class AnsibleProgressWriter:
+	"""
+	Buffers Ansible Task updates of a run and writes them in batches.
+
+	Updates of a task are merged in memory. Every `interval` seconds a daemon
+	thread writes the changed fields of changed tasks, commits once and publishes
+	progress once per changed play, so a long running task still shows up as
+	running. Whatever is left is written when the writer is stopped at the end
+	of the play, or when the playbook crashes.
+	"""
+
+	def __init__(self, callback: AnsibleCallback, interval: float = PROGRESS_FLUSH_INTERVAL):
+		self.callback = callback
+		self.interval = interval
+		self.pending: dict[str, dict] = {}
+		self.starts: dict[str, datetime] = {}
+		self.job_tasks: dict[str, str] = {}
+		# Last updated task of each host
+		self.last_tasks: dict[str, str] = {}
+		self.lock = threading.Lock()
+		self.stopped = threading.Event()
+		self.thread: threading.Thread | None = None
+
+	def start(self):
+		self.thread = threading.Thread(
+			target=self.flush_periodically,
+			args=(frappe.local.site, frappe.local.sites_path, frappe.session.user),
+			daemon=True,
+		)
+		self.thread.start()
+
+	def stop(self):
+		"""Stop the flush thread and write what's left, safe to call more than once"""
+		self.stopped.set()
+		if self.thread:
+			self.thread.join()
+			self.thread = None
+		self.flush()
+
+	def flush_periodically(self, site: str, sites_path: str, user: str):
+		# frappe.local isn't shared between threads, this one gets its own connection
+		frappe.init(site, sites_path=sites_path)
+		frappe.connect()
+		frappe.set_user(user)
+		try:
+			while not self.stopped.wait(self.interval):
+				try:
+					self.flush()
+				except Exception:
+					# Updates stay pending and are retried with the next flush
+					traceback.print_exc()
+					frappe.db.rollback()
+		finally:
+			frappe.destroy()
+
+	def update(self, host: str, task: str, **values):
+		if "start" in values:
+			self.starts[task] = values["start"]
+
+		with self.lock:
+			self.pending.setdefault(task, {}).update(values)
+			self.last_tasks[host] = task
+
+	def get_start(self, task: str) -> datetime:
+		if task not in self.starts:
+			self.starts[task] = frappe.db.get_value("Ansible Task", task, "start")
+		return self.starts[task]
+
+	def flush(self):
+		with self.lock:
+			if not self.pending:
+				return
+
+			for task, values in self.pending.items():
+				frappe.db.set_value("Ansible Task", task, values)
+			frappe.db.commit()
+			self.pending = {}
+			last_tasks, self.last_tasks = self.last_tasks, {}
+
+		for host, task in last_tasks.items():
+			self.callback.publish_play_progress(host, task)
+			# Tasks are not saved, so Ansible Task.on_update doesn't publish this
+			frappe.publish_realtime(
+				"ansible_play_update",
+				doctype="Ansible Play",
+				docname=self.callback.plays[host],
+				message={"id": self.callback.plays[host]},
+			)
+
+
 class Ansible:
 	def __init__(self, server, playbook, user="root", variables=None, port=22):
-		self.patch()
 		self.server = server
+		self.setup([server], playbook, user, variables, port)
+		self.play = self.plays[server.ip]
+		self.tasks = self.host_tasks[server.ip]
+		self.task_list = self.task_lists[server.ip]
+
+	def setup(self, servers, playbook, user="root", variables=None, port=22, forks=None):
+		self.patch()
+		self.servers = {server.ip: server for server in servers}
 		self.playbook = playbook
 		self.playbook_path = frappe.get_app_path("press", "playbooks", self.playbook)
-		self.host = f"{server.ip}:{port}"
 		self.variables = variables or {}
 
 		constants.HOST_KEY_CHECKING = False
@@ -166,6 +297,7 @@ class Ansible:
 			connection="ssh",
 			# This is the only way to pass variables that preserves newlines
 			extra_vars=[f"{cstr(key)}='{cstr(value)}'" for key, value in self.variables.items()],
+			forks=forks or constants.DEFAULT_FORKS,
 			remote_user=user,
 			start_at_task=None,
 			syntax=False,
@@ -175,14 +307,14 @@ class Ansible:
 		self.loader = DataLoader()
 		self.passwords = dict({})
 
-		self.sources = f"{self.host},"
+		self.sources = "".join(f"{ip}:{port}," for ip in self.servers)
 		self.inventory = InventoryManager(loader=self.loader, sources=self.sources)
 		self.variable_manager = VariableManager(loader=self.loader, inventory=self.inventory)
 
 		self.callback = AnsibleCallback()
 		self.display = Display()
 		self.display.verbosity = 1
-		self.create_ansible_play()
+		self.create_ansible_plays()
 
 	def patch(self):
 		def modified_action_module_run(*args, **kwargs):
@@ -193,7 +325,7 @@ class Ansible:
 		def modified_poll_async_result(executor, result, templar, task_vars=None):
 			job_id = result["ansible_job_id"]
 			task = executor._task
-			self.callback.on_async_start(task._role.get_name(), task.name, job_id)
+			self.callback.on_async_start(executor._host.get_name(), task._role.get_name(), task.name, job_id)
 			return self._poll_async_result(executor, result, templar, task_vars=task_vars)
 
 		if ActionModule.run.__module__ != "press.runner":
@@ -209,52 +341,121 @@ class Ansible:
 		ActionModule.run = self.action_module_run
 
 	def run(self):
-		self.executor = PlaybookExecutor(
+		self.execute()
+		return frappe.get_doc("Ansible Play", self.play)
+
+	def execute(self, serial=None):
+		self.executor = FleetPlaybookExecutor(
 			playbooks=[self.playbook_path],
 			inventory=self.inventory,
 			variable_manager=self.variable_manager,
 			loader=self.loader,
 			passwords=self.passwords,
+			serial=serial,
 		)
 		# Use AnsibleCallback so we can receive updates for tasks execution
 		self.executor._tqm._stdout_callback = self.callback
-		self.callback.play = self.play
-		self.callback.tasks = self.tasks
-		self.callback.task_list = self.task_list
-		self.executor.run()
+		self.callback.plays = self.plays
+		self.callback.tasks = self.host_tasks
+		self.callback.task_lists = self.task_lists
+		self.callback.progress = AnsibleProgressWriter(self.callback)
+		self.callback.progress.start()
+		try:
+			self.executor.run()
+		finally:
+			# Persist the last known state of tasks, even if the playbook crashed
+			self.callback.progress.stop()
 		self.unpatch()
-		return frappe.get_doc("Ansible Play", self.play)
 
-	def create_ansible_play(self):
-		# Parse the playbook and create Ansible Tasks so we can show how many tasks are pending
+	def create_ansible_plays(self):
+		# Parse the playbook once and create Ansible Tasks so we can show how many tasks are pending
 		playbook = Playbook.load(
 			self.playbook_path, variable_manager=self.variable_manager, loader=self.loader
 		)
 		# Assume we only have one play per playbook
 		play = playbook.get_plays()[0]
-		play_doc = frappe.get_doc(
-			{
-				"doctype": "Ansible Play",
-				"server_type": self.server.doctype,
-				"server": self.server.name,
-				"variables": json.dumps(self.variables, indent=4),
-				"playbook": self.playbook,
-				"play": play.get_name(),
-			}
-		).insert()
-		self.play = play_doc.name
-		self.tasks = {}
-		self.task_list = []
-		for role in play.get_roles():
-			for block in role.get_task_blocks():
-				for task in block.block:
-					task_doc = frappe.get_doc(
-						{
-							"doctype": "Ansible Task",
-							"play": self.play,
-							"role": role.get_name(),
-							"task": task.name,
-						}
-					).insert()
-					self.tasks.setdefault(role.get_name(), {})[task.name] = task_doc.name
-					self.task_list.append(task_doc.name)
+		tasks = [
+			(role.get_name(), task.name)
+			for role in play.get_roles()
+			for block in role.get_task_blocks()
+			for task in block.block
+		]
+
+		self.plays, self.host_tasks, self.task_lists = {}, {}, {}
+		for ip, server in self.servers.items():
+			play_doc = frappe.get_doc(
+				{
+					"doctype": "Ansible Play",
+					"server_type": server.doctype,
+					"server": server.name,
+					"variables": json.dumps(self.variables, indent=4),
+					"playbook": self.playbook,
+					"play": play.get_name(),
+				}
+			).insert()
+			self.plays[ip] = play_doc.name
+			self.host_tasks[ip], self.task_lists[ip] = insert_ansible_tasks(play_doc.name, tasks)
+
+
+class AnsibleFleet(Ansible):
+	"""
+	Runs one playbook across many servers in a single execution.
+
+	The playbook is parsed once, each server still gets its own Ansible Play
+	and Ansible Tasks. At most `forks` servers are worked on at a time, and
+	with `serial` (a count or a percentage like "20%") servers go through the
+	whole play in batches, as with Ansible's `serial` keyword.
+	"""
+
+	def __init__(
+		self,
+		servers,
+		playbook,
+		user="root",
+		variables=None,
+		port=22,
+		forks=FLEET_FORKS,
+		serial=None,
+	):
+		self.serial = serial
+		self.setup(servers, playbook, user, variables, port, forks=min(forks, MAX_FLEET_FORKS))
+
+	def run(self) -> dict[str, str]:
+		"""Returns name of the Ansible Play of each server"""
+		self.execute(serial=self.serial)
+		return {self.servers[ip].name: play for ip, play in self.plays.items()}
+
+
+class FleetPlaybookExecutor(PlaybookExecutor):
+	def __init__(self, *args, serial=None, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.serial = serial
+
+	def _get_serialized_batches(self, play):
+		if self.serial:
+			play.serial = [self.serial]
+		return super()._get_serialized_batches(play)
+
+
+def insert_ansible_tasks(play: str, tasks: list[tuple[str, str]]) -> tuple[dict, list]:
+	"""Insert Ansible Tasks of a play with a multi-row insert, returns them by role and in order"""
+	by_role, task_list = {}, []
+	values = []
+	start = now()
+	for index, (role, task) in enumerate(tasks):
+		name = frappe.generate_hash(length=10)
+		# Tasks of a play are listed by creation
+		creation = start + timedelta(microseconds=index)
+		values.append(
+			(name, play, role, task, "Pending", frappe.session.user, frappe.session.user, creation, creation)
+		)
+		by_role.setdefault(role, {})[task] = name
+		task_list.append(name)
+
+	if values:
+		frappe.db.bulk_insert(
+			"Ansible Task",
+			["name", "play", "role", "task", "status", "owner", "modified_by", "creation", "modified"],
+			values,
+		)
+	return by_role, task_list
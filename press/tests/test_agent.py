@@ -1,6 +1,8 @@
 # Copyright (c) 2024, Frappe and contributors
 # For license information, please see license.txt
 
+from unittest.mock import patch
+
 import frappe
 import requests
 import responses
@@ -11,6 +13,7 @@ from press.press.doctype.agent_request_failure.agent_request_failure import (
 	remove_old_failures,
 )
 from press.press.doctype.server.test_server import create_test_server
+from press.utils import http_pool
 
 
 def create_test_agent_request_failure(
@@ -130,3 +133,24 @@ class TestAgent(FrappeTestCase):
 
 		responses.assert_call_count(f"https://{server.name}:443/agent/ping", 1)
 		self.assertEqual(frappe.db.count("Agent Request Failure", {"server": server.name}), 0)
+
+	@responses.activate
+	def test_requests_reuse_pooled_session_and_cached_password(self):
+		server = create_test_server()
+		responses.add(
+			responses.GET,
+			f"https://{server.name}:443/agent/ping",
+			status=200,
+			json={"message": "pong"},
+		)
+
+		http_pool.clear_cached_values()
+		with patch("press.agent.get_decrypted_password", return_value="password") as mock_password:
+			first, second = Agent(server.name, server.doctype), Agent(server.name, server.doctype)
+			first.request("GET", "ping")
+			second.request("GET", "ping")
+
+		self.assertIs(first.session, second.session)
+		mock_password.assert_called_once()
+		self.assertEqual(responses.calls[0].request.headers["Authorization"], "bearer password")
+		self.assertGreaterEqual(http_pool.get_stats()["agent"]["requests"], 2)
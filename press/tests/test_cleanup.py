@@ -238,6 +238,27 @@ class TestFIFO(unittest.TestCase):
 		self.assertEqual(old.files_availability, "Available")
 		self.assertEqual(new.files_availability, "Available")
 
+	def test_backups_of_each_site_kept_separately(self):
+		"""Ensure the newest backups are kept per site, not across sites."""
+		fifo = FIFO()
+		fifo.offsite_backups_count = 1
+		site = create_test_site("testsubdomain")
+		site2 = create_test_site("testsubdomain2")
+		older = create_test_site_backup(site.name, frappe.utils.getdate() - timedelta(3))
+		new = create_test_site_backup(site.name, frappe.utils.getdate() - timedelta(2))
+		only = create_test_site_backup(site2.name, frappe.utils.getdate() - timedelta(1))
+
+		due = fifo.get_backups_due_for_expiry("Logical")
+		self.assertIn(older.name, due)
+		self.assertNotIn(new.name, due)
+		self.assertNotIn(only.name, due)
+
+		fifo.expire_offsite_backups()
+
+		self.assertEqual(frappe.db.get_value("Site Backup", older.name, "files_availability"), "Unavailable")
+		self.assertEqual(frappe.db.get_value("Site Backup", new.name, "files_availability"), "Available")
+		self.assertEqual(frappe.db.get_value("Site Backup", only.name, "files_availability"), "Available")
+
 	@patch("press.press.doctype.site.backups.delete_remote_backup_objects")
 	@patch("press.press.doctype.site.backups.frappe.db.commit")
 	def test_delete_remote_backup_objects_called(
@@ -0,0 +1,203 @@
+# Copyright (c) 2026, Frappe and contributors
+# For license information, please see license.txt
+
+from __future__ import annotations
+
+import threading
+from unittest.mock import Mock, patch
+
+import frappe
+from ansible.inventory.manager import InventoryManager
+from ansible.parsing.dataloader import DataLoader
+from frappe.tests.utils import FrappeTestCase
+
+from press.press.doctype.ansible_play.test_ansible_play import create_test_ansible_play
+from press.runner import (
+	AnsibleCallback,
+	AnsibleProgressWriter,
+	FleetPlaybookExecutor,
+	insert_ansible_tasks,
+)
+
+TASKS = [("common", "Ping"), ("common", "Install Packages"), ("agent", "Start Agent")]
+
+
+def create_test_callback(hosts: list[str], tasks: list[tuple[str, str]] = TASKS) -> AnsibleCallback:
+	"""Callback of a run with an Ansible Play and Ansible Tasks for each host"""
+	callback = AnsibleCallback()
+	callback.plays, callback.tasks, callback.task_lists = {}, {}, {}
+	for host in hosts:
+		play = create_test_ansible_play("Test Play", "test.yml", status="Pending")
+		callback.plays[host] = play.name
+		callback.tasks[host], callback.task_lists[host] = insert_ansible_tasks(play.name, tasks)
+	callback.progress = AnsibleProgressWriter(callback, interval=60)
+	return callback
+
+
+def make_host(host: str) -> Mock:
+	return Mock(get_name=Mock(return_value=host))
+
+
+def make_task(role: str, name: str) -> Mock:
+	task = Mock(action="shell")
+	task.name = name
+	task._role.get_name.return_value = role
+	return task
+
+
+def make_result(host: str, task: Mock, **result) -> Mock:
+	return Mock(_host=make_host(host), _task=task, _result={"stdout": "", "stderr": "", "msg": "", **result})
+
+
+def get_task_status(task: str) -> str:
+	return frappe.db.get_value("Ansible Task", task, "status")
+
+
+@patch.object(frappe.db, "commit", new=Mock())
+@patch("frappe.publish_realtime", new=Mock())
+class TestAnsibleProgressWriter(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_task_updates_are_written_on_flush(self):
+		host = "10.0.0.1"
+		callback = create_test_callback([host])
+		ping, install, _ = callback.task_lists[host]
+		first, second = make_task("common", "Ping"), make_task("common", "Install Packages")
+
+		# Starts and results are buffered until the next flush
+		callback.v2_runner_on_start(make_host(host), first)
+		callback.v2_runner_on_ok(make_result(host, first, stdout="pong"))
+		callback.v2_runner_on_start(make_host(host), second)
+		callback.v2_runner_on_failed(make_result(host, second, msg="Connection refused"))
+		self.assertEqual(get_task_status(ping), "Pending")
+
+		with patch("frappe.publish_realtime") as publish_realtime:
+			callback.progress.flush()
+
+		self.assertEqual(get_task_status(ping), "Success")
+		self.assertEqual(frappe.db.get_value("Ansible Task", ping, "output"), "pong")
+		self.assertEqual(get_task_status(install), "Failure")
+		self.assertEqual(frappe.db.get_value("Ansible Task", install, "exception"), "Connection refused")
+		self.assertFalse(callback.progress.pending)
+		# Progress of the play is published once per flush, not once per update
+		self.assertEqual(
+			[call.args[0] for call in publish_realtime.call_args_list],
+			["ansible_play_progress", "ansible_play_update"],
+		)
+
+	def test_updates_are_coalesced_until_flush(self):
+		host = "10.0.0.1"
+		callback = create_test_callback([host])
+		ping = callback.task_lists[host][0]
+		writer = AnsibleProgressWriter(callback, interval=60)
+
+		with patch.object(frappe.db, "set_value", wraps=frappe.db.set_value) as set_value:
+			writer.update(host, ping, status="Success")
+			writer.update(host, ping, output="pong")
+			self.assertEqual(set_value.call_count, 0)
+
+			writer.flush()
+			set_value.assert_called_once_with("Ansible Task", ping, {"status": "Success", "output": "pong"})
+
+	@patch("press.runner.frappe.destroy", new=Mock())
+	@patch("press.runner.frappe.set_user", new=Mock())
+	@patch("press.runner.frappe.connect", new=Mock())
+	@patch("press.runner.frappe.init", new=Mock())
+	def test_progress_is_flushed_periodically(self):
+		callback = create_test_callback(["10.0.0.1"])
+		writer = AnsibleProgressWriter(callback, interval=0.01)
+		flushed = threading.Event()
+
+		with patch.object(writer, "flush", side_effect=flushed.set) as flush:
+			writer.start()
+			# A long running task shows up without waiting for another callback
+			self.assertTrue(flushed.wait(timeout=5))
+			writer.stop()
+			calls = flush.call_count
+			writer.stop()
+
+		self.assertIsNone(writer.thread)
+		self.assertEqual(flush.call_count, calls + 1)
+
+
+@patch.object(frappe.db, "commit", new=Mock())
+@patch("frappe.publish_realtime", new=Mock())
+class TestAnsibleFleet(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_insert_ansible_tasks_keeps_playbook_order(self):
+		play = create_test_ansible_play("Test Play", "test.yml")
+		by_role, task_list = insert_ansible_tasks(play.name, TASKS)
+
+		self.assertEqual(task_list, [by_role[role][task] for role, task in TASKS])
+		self.assertEqual(len(set(task_list)), len(TASKS))
+
+		tasks = frappe.get_all(
+			"Ansible Task",
+			filters={"play": play.name},
+			fields=["name", "role", "task", "status"],
+			order_by="creation asc",
+		)
+		self.assertEqual([task.name for task in tasks], task_list)
+		self.assertEqual([(task.role, task.task) for task in tasks], TASKS)
+		self.assertEqual({task.status for task in tasks}, {"Pending"})
+
+		self.assertEqual(insert_ansible_tasks(play.name, []), ({}, []))
+
+	def test_tasks_are_updated_per_host(self):
+		hosts = ["10.0.0.1", "10.0.0.2"]
+		callback = create_test_callback(hosts)
+		callback.update_play("Running")
+		self.assertEqual(
+			{frappe.db.get_value("Ansible Play", play, "status") for play in callback.plays.values()},
+			{"Running"},
+		)
+
+		task = make_task("common", "Ping")
+		for host in hosts:
+			callback.v2_runner_on_start(make_host(host), task)
+		callback.v2_runner_on_ok(make_result(hosts[0], task))
+		callback.v2_runner_on_unreachable(make_result(hosts[1], task, msg="Host unreachable"))
+		callback.progress.flush()
+
+		first, second = callback.task_lists[hosts[0]], callback.task_lists[hosts[1]]
+		self.assertEqual(get_task_status(first[0]), "Success")
+		self.assertEqual(get_task_status(second[0]), "Unreachable")
+		self.assertEqual(get_task_status(first[1]), "Pending")
+		self.assertEqual(get_task_status(second[1]), "Pending")
+
+	def test_unprocessed_hosts_fail_the_play(self):
+		hosts = ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+		callback = create_test_callback(hosts)
+		callback.update_play("Running")
+
+		summaries = {
+			hosts[0]: {"ok": 3, "failures": 0, "unreachable": 0, "changed": 1, "skipped": 0},
+			hosts[1]: {"ok": 1, "failures": 1, "unreachable": 0, "changed": 0, "skipped": 0},
+		}
+		# The third host was never reached, e.g. the run was aborted by an earlier batch
+		stats = Mock(processed=dict.fromkeys(summaries, 1), summarize=summaries.get)
+		callback.update_play(None, stats)
+
+		plays = [frappe.get_doc("Ansible Play", callback.plays[host]) for host in hosts]
+		self.assertEqual([play.status for play in plays], ["Success", "Failure", "Failure"])
+		self.assertEqual((plays[0].ok, plays[0].changed), (3, 1))
+		self.assertEqual(plays[1].failures, 1)
+		self.assertTrue(all(play.end for play in plays))
+
+	def test_serial_splits_servers_into_batches(self):
+		hosts = [f"10.0.0.{index}" for index in range(1, 5)]
+		executor = FleetPlaybookExecutor.__new__(FleetPlaybookExecutor)
+		executor._inventory = InventoryManager(
+			loader=DataLoader(), sources="".join(f"{host}:22," for host in hosts)
+		)
+		play = Mock(hosts="all", order="inventory", serial=[])
+
+		executor.serial = None
+		self.assertEqual(len(executor._get_serialized_batches(play)), 1)
+
+		executor.serial = "50%"
+		batches = executor._get_serialized_batches(play)
+		self.assertEqual([[host.get_name() for host in batch] for batch in batches], [hosts[:2], hosts[2:]])
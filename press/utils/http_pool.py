@@ -0,0 +1,193 @@
+# Copyright (c) 2026, Frappe and contributors
+# For license information, please see license.txt
+
+"""
+Process wide pool of keep-alive HTTP sessions.
+
+Each worker keeps at most `MAX_SESSIONS` sessions (least recently used are
+closed first), and every session holds a bounded urllib3 connection pool.
+Timing stats are accumulated in-process and periodically flushed to redis,
+so handshake cost can be compared across all workers.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable
+
+import frappe
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import parse_url
+
+if TYPE_CHECKING:
+	from typing import Any, Hashable
+
+MAX_SESSIONS = 256
+POOL_MAXSIZE = 4
+STATS_FLUSH_INTERVAL = 60
+STATS_KEY = "http_pool_request_stats"
+
+_lock = threading.RLock()
+_sessions: OrderedDict[Hashable, requests.Session] = OrderedDict()
+_values: dict[Hashable, tuple[float, Any]] = {}
+_stats: dict[str, dict[str, float]] = {}
+_last_flush = time.monotonic()
+
+
+def get_session(key: Hashable, pool_maxsize: int = POOL_MAXSIZE) -> requests.Session:
+	"""Return the pooled session for `key`, creating it if needed"""
+	with _lock:
+		session = _sessions.get(key)
+		if session:
+			_sessions.move_to_end(key)
+			return session
+
+		session = requests.Session()
+		adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=False)
+		session.mount("https://", adapter)
+		session.mount("http://", adapter)
+		_sessions[key] = session
+
+		while len(_sessions) > MAX_SESSIONS:
+			_, evicted = _sessions.popitem(last=False)
+			evicted.close()
+		return session
+
+
+def close_session(key: Hashable):
+	with _lock:
+		session = _sessions.pop(key, None)
+	if session:
+		session.close()
+
+
+def close_sessions():
+	with _lock:
+		sessions = list(_sessions.values())
+		_sessions.clear()
+	for session in sessions:
+		session.close()
+
+
+def get_cached_value(key: Hashable, generator: Callable[[], Any], ttl: int = 60):
+	"""Short lived in-process memo, meant for values that are expensive to fetch on every request"""
+	now = time.monotonic()
+	cached = _values.get(key)
+	if cached and cached[0] > now:
+		return cached[1]
+
+	value = generator()
+	_values[key] = (now + ttl, value)
+	return value
+
+
+def clear_cached_values():
+	_values.clear()
+
+
+def open_connections(session: requests.Session, url: str) -> int:
+	"""Number of connections opened so far by `session` to the host of `url`"""
+	parsed = parse_url(url)
+	adapter = session.get_adapter(url)
+	pools = getattr(getattr(adapter, "poolmanager", None), "pools", None)
+	if pools is None:
+		return 0
+
+	count = 0
+	for pool_key in pools.keys():  # noqa: SIM118, RecentlyUsedContainer does not support iteration
+		if pool_key.key_host == parsed.host and pool_key.key_port == parsed.port:
+			pool = pools.get(pool_key)
+			count += getattr(pool, "num_connections", 0) if pool else 0
+	return count
+
+
+def request(
+	session: requests.Session, method: str, url: str, stats_key: str | None = None, **kwargs
+) -> requests.Response:
+	"""Make a request over `session` and record its duration against `stats_key`"""
+	connections_before = open_connections(session, url)
+	start = time.monotonic()
+	try:
+		return session.request(method, url, **kwargs)
+	finally:
+		duration = time.monotonic() - start
+		new_connections = open_connections(session, url) - connections_before
+		record(stats_key or "default", duration, new_connections)
+
+
+def record(stats_key: str, duration: float, new_connections: int = 0):
+	with _lock:
+		stats = _stats.setdefault(
+			stats_key,
+			{"requests": 0, "new_connections": 0, "total_time": 0.0, "new_connection_time": 0.0},
+		)
+		stats["requests"] += 1
+		stats["total_time"] += duration
+		if new_connections > 0:
+			stats["new_connections"] += new_connections
+			stats["new_connection_time"] += duration
+
+	if time.monotonic() - _last_flush > STATS_FLUSH_INTERVAL:
+		flush_stats()
+
+
+def flush_stats():
+	"""Add in-process stats to the shared redis hash and reset them"""
+	global _last_flush
+
+	with _lock:
+		stats = dict(_stats)
+		_stats.clear()
+		_last_flush = time.monotonic()
+
+	if not stats:
+		return
+
+	try:
+		key = frappe.cache.make_key(STATS_KEY)
+		pipeline = frappe.cache.pipeline()
+		for stats_key, values in stats.items():
+			for field, value in values.items():
+				pipeline.hincrbyfloat(key, f"{stats_key}:{field}", value)
+		pipeline.execute()
+	except Exception:
+		# Stats are best effort, never fail the request because of them
+		pass
+
+
+def get_stats(local: bool = False) -> dict[str, dict[str, float]]:
+	"""
+	Aggregated request stats grouped by stats key.
+
+	By default these are read from redis (all workers), pass `local=True` for
+	the stats of the current process that haven't been flushed yet.
+	"""
+	if local:
+		with _lock:
+			return {key: dict(values) for key, values in _stats.items()}
+
+	flush_stats()
+	raw = frappe.cache.hgetall(frappe.cache.make_key(STATS_KEY)) or {}
+	stats: dict[str, dict[str, float]] = {}
+	for field, value in raw.items():
+		field = frappe.safe_decode(field)
+		stats_key, _, name = field.rpartition(":")
+		stats.setdefault(stats_key, {})[name] = float(value)
+
+	for values in stats.values():
+		requests_count = values.get("requests") or 0
+		new_connections = values.get("new_connections") or 0
+		values["average_time"] = values.get("total_time", 0) / requests_count if requests_count else 0
+		values["average_new_connection_time"] = (
+			values.get("new_connection_time", 0) / new_connections if new_connections else 0
+		)
+	return stats
+
+
+def reset_stats():
+	with _lock:
+		_stats.clear()
+	frappe.cache.delete(frappe.cache.make_key(STATS_KEY))